@@ -0,0 +1,286 @@
+#
+# Purpose: Reprocess an archive of historical ARGOS raw files and write one NEAD file per station.
+#
+# The archive is processed in two steps that are both sharded across worker processes:
+#   1. Each raw file is parsed and decoded once, the decoded transmissions are saved in the state directory.
+#   2. Each station is cleaned from the decoded files in chronological order, chunk by chunk with bounded memory,
+#      and its NEAD file is written to the state directory then moved to the output directory when complete.
+# Decoded files and completed stations are kept in the state directory, so an interrupted backfill resumes where it
+# stopped when it is run again with the same arguments.
+#
+# Example commands (make sure virtual environment is activated):
+#
+#   python backfill.py archive/
+#   python backfill.py "archive/2021*.raw" --startDate 2021-03-01 --endDate 2021-06-30 --stations 107282,135797
+#
+
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import hashlib
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy
+import pandas
+
+from process_argos import ARGOS_COLUMNS_NAMES, parse_argos, decode_argos, remove_seen_transmissions, \
+    get_satellite_time, compact_argos_array, widen_argos_array
+from main import read_config, get_cleaner
+from columnar import get_columnar_path, get_part_paths
+
+import logging
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+# Name of the file with the arguments of the backfill in the state directory
+RUN_NAME = 'run.json'
+
+# Transmissions received up to this number of days outside the date range are cleaned to pair the table parts
+# and detect pressure jumps of the first and last records
+MARGIN_DAYS = 2
+
+
+def get_parser():
+    parser = argparse.ArgumentParser("ArgosBackfill")
+    parser.add_argument('input', help='Directory or glob pattern of the ARGOS raw files to reprocess')
+    parser.add_argument('--startDate', help='First date (YYYY-MM-DD) of the records written, default no limit')
+    parser.add_argument('--endDate', help='Last date (YYYY-MM-DD) of the records written, default no limit')
+    parser.add_argument('--stations', help='Comma separated IDs of the stations written, default all active '
+                                           'stations of the config')
+    parser.add_argument('--workers', '-w', type=int, default=os.cpu_count(),
+                        help='Number of worker processes, default number of CPUs')
+    parser.add_argument('--stateDir', default='backfill',
+                        help='Directory of the decoded files and progress, default backfill')
+    parser.add_argument('--outputDir', help='Directory of the NEAD files, default output_dir of the config')
+    return parser
+
+
+def get_archive_files(input_path):
+    """
+    :param input_path: directory or glob pattern
+    :return: sorted list of the files in the directory (and its subdirectories) or matching the pattern
+    """
+    if os.path.isdir(input_path):
+        files = [str(path) for path in Path(input_path).rglob('*') if path.is_file()]
+    else:
+        files = [path for path in glob.glob(input_path, recursive=True) if os.path.isfile(path)]
+
+    return sorted(files)
+
+
+def get_file_key(file):
+    """
+    :param file: path to a file
+    :return: hexadecimal key of the absolute path, size and modification time of the file
+    """
+    stat = os.stat(file)
+    return hashlib.sha256(f'{os.path.abspath(file)}|{stat.st_size}|{stat.st_mtime_ns}'.encode()).hexdigest()[:32]
+
+
+def decode_file(file, decoded_path, compact=False):
+    """
+    Parse and decode an Argos raw file, the decoded transmissions are saved as a numpy .npy file.
+    The file is written under a temporary name first so an interrupted backfill never leaves a truncated file.
+    :param file: path to the Argos raw file
+    :param decoded_path: path of the .npy file
+    :param compact: whether to save the decoded transmissions with `compact_argos_array`
+    :return: number of decoded transmissions
+    """
+    argos_dataframe = pandas.DataFrame(parse_argos(file), columns=ARGOS_COLUMNS_NAMES)
+    data = decode_argos(argos_dataframe, remove_duplicate=True, sort=True).to_numpy(dtype='float')
+    if compact:
+        data = compact_argos_array(data)
+
+    temporary_path = Path(decoded_path).with_suffix('.tmp.npy')
+    numpy.save(temporary_path, data)
+    os.replace(temporary_path, decoded_path)
+
+    return len(data)
+
+
+def clean_station(section, decoded_paths, station_dir, chunk_rows, dedup_days, time_range):
+    """
+    Clean one station from the decoded files and write its NEAD file '{station_id}_NEAD.csv' in station_dir.
+    Only the transmissions of the station (and in the time range with a margin) of one decoded file are in memory.
+    :param section: section of the station in the stations config
+    :param decoded_paths: paths of the decoded .npy files in chronological order
+    :param station_dir: directory of the NEAD file
+    :param chunk_rows: maximum number of transmissions cleaned at once
+    :param dedup_days: number of days a transmission is remembered to remove its duplicates from later files
+    :param time_range: (start, end) tuple of numpy datetime64 of the records written, None writes all records
+    """
+    station_id = int(section)
+
+    def get_chunks():
+        for decoded_path in decoded_paths:
+            # Decoded files may be compact, rows are widened so transmissions of all files are compared as float64
+            data = numpy.load(decoded_path, mmap_mode='r')
+            data = widen_argos_array(numpy.array(data[data[:, 7] == station_id, :]))
+
+            if time_range is not None:
+                satellite_time = get_satellite_time(data)
+                start, end = [(limit - numpy.datetime64(0, 's')).astype('int64') for limit in time_range]
+                margin = MARGIN_DAYS * 86400
+                data = data[(satellite_time >= start - margin) & (satellite_time < end + margin), :]
+
+            for start_row in range(0, len(data), chunk_rows):
+                yield data[start_row:start_row + chunk_rows, :]
+
+    cleaner = get_cleaner()
+    cleaner.clean_chunks(remove_seen_transmissions(get_chunks(), dedup_days), sections=[section],
+                         output_dir=station_dir, time_range=time_range)
+
+
+def log_progress(step, done, total, start_time):
+    elapsed = time.time() - start_time
+    remaining = elapsed / done * (total - done) if done else 0
+    logger.info(f' {step} {done}/{total} ({100 * done / total:.0f}%), {int(elapsed)} seconds elapsed, '
+                f'about {int(remaining)} seconds remaining')
+
+
+def backfill(config, files, state_dir, output_dir, sections, time_range=None, workers=1):
+    """
+    Reprocess files and write the NEAD file '{station_id}_NEAD_backfill.csv' of each station in output_dir.
+    :param config: stations config
+    :param files: paths to the Argos raw files
+    :param state_dir: directory of the decoded files and progress
+    :param output_dir: directory of the NEAD files
+    :param sections: sections of the stations to clean
+    :param time_range: (start, end) tuple of numpy datetime64 of the records written, None writes all records
+    :param workers: number of worker processes
+    """
+    decoded_dir = Path(state_dir, 'decoded')
+    station_dir = Path(state_dir, 'stations')
+    decoded_dir.mkdir(parents=True, exist_ok=True)
+
+    # Results of a previous run with other arguments can not be resumed, decoded files do not depend on them
+    run = {'files': [get_file_key(file) for file in files], 'sections': sections,
+           'time_range': None if time_range is None else [str(limit) for limit in time_range]}
+    run_path = Path(state_dir, RUN_NAME)
+    if run_path.is_file() and json.loads(run_path.read_text()) != run:
+        logger.info(f' Arguments changed since the last backfill, cleaning all stations again')
+        shutil.rmtree(station_dir, ignore_errors=True)
+    run_path.write_text(json.dumps(run))
+    station_dir.mkdir(parents=True, exist_ok=True)
+
+    # Step 1: decode the files that were not decoded yet, with compact dtype if 'compact_dtypes' (from config)
+    compact = config.getboolean('DEFAULT', 'compact_dtypes', fallback=False)
+    decoded_paths = {file: Path(decoded_dir, f'{key}.npy') for file, key in zip(files, run['files'])}
+    pending_files = [file for file in files if not decoded_paths[file].is_file()]
+    logger.info(f' Decoding {len(pending_files)} files, {len(files) - len(pending_files)} files already decoded')
+
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(decode_file, file, decoded_paths[file], compact): file for file in pending_files}
+        for done, future in enumerate(as_completed(futures), 1):
+            logger.info(f' Decoded {future.result()} transmissions from {futures[future]}')
+            log_progress('Decoded files', done, len(pending_files), start_time)
+
+    # Order the decoded files by their first satellite timestamp, decoded transmissions are sorted by time
+    def get_first_time(path):
+        data = numpy.load(path, mmap_mode='r')
+        return numpy.nanmin(get_satellite_time(numpy.array(data[:1, :])), initial=numpy.inf)
+
+    ordered_paths = sorted(decoded_paths.values(), key=lambda path: (get_first_time(path), path.name))
+
+    # Step 2: clean the stations that were not completed yet
+    pending_sections = [section for section in sections if not Path(station_dir, f'{section}.done').is_file()]
+    logger.info(f' Cleaning {len(pending_sections)} stations, '
+                f'{len(sections) - len(pending_sections)} stations already completed')
+
+    # Assign get_station_files to function returning the NEAD file (and columnar file if 'columnar_format' is set)
+    # of a station in station_dir and their paths in output_dir
+    columnar_format = config.get('DEFAULT', 'columnar_format', fallback='')
+
+    def get_station_files(section):
+        station_files = [(Path(station_dir, f'{section}_NEAD.csv'), Path(output_dir, f'{section}_NEAD_backfill.csv'))]
+        if columnar_format:
+            station_files += [(get_columnar_path(station_file, columnar_format),
+                               get_columnar_path(output_file, columnar_format))
+                              for station_file, output_file in station_files]
+        return station_files
+
+    chunk_rows = config.getint('DEFAULT', 'stream_chunk_rows', fallback=0) or 10000
+    dedup_days = config.getfloat('DEFAULT', 'stream_dedup_days', fallback=30)
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for section in pending_sections:
+            # NEAD file of an interrupted station is written again from the start
+            for station_file, output_file in get_station_files(section):
+                station_file.unlink(missing_ok=True)
+                for part_path in get_part_paths(station_file):
+                    part_path.unlink()
+            futures[executor.submit(clean_station, section, ordered_paths, station_dir, chunk_rows, dedup_days,
+                                    time_range)] = section
+
+        for done, future in enumerate(as_completed(futures), 1):
+            future.result()
+            section = futures[future]
+
+            # Move the complete NEAD file to the output directory and mark the station as completed
+            for station_file, output_file in get_station_files(section):
+                if station_file.is_file():
+                    os.replace(station_file, output_file)
+            Path(station_dir, f'{section}.done').touch()
+
+            logger.info(f' Completed Station {section}')
+            log_progress('Cleaned stations', done, len(pending_sections), start_time)
+
+    logger.info(f' FINISHED backfill of {len(files)} files, NEAD files are in {output_dir}')
+
+
+def main(args=None):
+    """
+    Main entry point for reprocessing an archive of ARGOS satellite transmissions.
+    """
+
+    # Access arguments passed in command line
+    parser = get_parser()
+    args = parser.parse_args(args)
+
+    # Read config file
+    config_path = 'config/stations.ini'
+    config = read_config(config_path)
+
+    files = get_archive_files(args.input)
+    if not files:
+        logger.error(f' No input files found: {args.input}')
+        return -1
+
+    # Assign sections to the active stations of the config, optionally only the stations of the argument
+    sections = [section for section in config.sections() if config.get(section, 'active') == 'True']
+    if args.stations:
+        stations = [station.strip() for station in args.stations.split(',')]
+        for station in stations:
+            if station not in sections:
+                logger.warning(f' Station {station} is not an active station of {config_path}, skipping it')
+        sections = [section for section in sections if section in stations]
+
+    # Assign time_range to the start of the start date and the end of the end date
+    time_range = None
+    if args.startDate or args.endDate:
+        start = numpy.datetime64(args.startDate, 's') if args.startDate else numpy.datetime64('0001-01-01', 's')
+        end = numpy.datetime64(args.endDate, 's') + numpy.timedelta64(1, 'D') if args.endDate \
+            else numpy.datetime64('9999-01-01', 's')
+        time_range = (start, end)
+
+    output_dir = args.outputDir or config.get('DEFAULT', 'output_dir')
+
+    backfill(config, files, args.stateDir, output_dir, sections, time_range, max(args.workers, 1))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
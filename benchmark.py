@@ -0,0 +1,287 @@
+#
+# Purpose: Benchmark the processing stages on synthetic ARGOS raw files and compare the results with a baseline.
+#
+# For each scale (number of days of the active stations of config/stations.ini) a synthetic raw file is generated
+# once with `synthetic_argos` (same file for the same scale and seed) and each stage is run on the output of the
+# previous one: read_argos, decode_argos, get_station_array, filter_station_array, get_timestamp_iso and write_nead.
+# The wall time of a stage is the best of several repeats, its peak memory is measured by tracemalloc in a separate
+# run so tracing does not slow the timed repeats. Throughput is the number of input rows of the stage per second.
+#
+# Results are compared with the baseline file if it exists, a stage slower or using more memory than the baseline
+# by more than the tolerance is reported as a regression and the exit code is 1. Baselines depend on the machine,
+# save a baseline with --saveBaseline on the machine the benchmark is compared on.
+#
+# Example commands (make sure virtual environment is activated):
+#
+#   python benchmark.py --saveBaseline
+#   python benchmark.py --scales 1d,1y,10y --repeat 5
+#
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import numpy
+import pandas
+
+from process_argos import read_argos, decode_argos
+from cleaner import ArgosCleaner
+from synthetic_argos import write_argos_file, get_active_stations
+
+import logging
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+# Number of days of each scale
+BENCHMARK_SCALES = {'1d': 1, '30d': 30, '1y': 365, '10y': 3650}
+
+# Arguments of `write_argos_file` of the synthetic raw files, except the number of days and the seed
+BENCHMARK_FILE_ARGS = {'start_date': '2015-01-01', 'transmissions_per_day': 8, 'duplicate_rate': 0.3,
+                       'ready_rate': 0.01, 'corrupt_rate': 0.01}
+
+# Increases of time (seconds) and peak memory (MiB) smaller than these are not regressions, they are within the noise
+# of short stages
+BENCHMARK_MIN_INCREASES = {'seconds': 0.005, 'peak_mib': 1}
+
+
+def get_parser():
+    parser = argparse.ArgumentParser("ArgosBenchmark")
+    parser.add_argument('--scales', default='1d,1y,10y',
+                        help=f'Comma separated scales of {", ".join(BENCHMARK_SCALES)}, default 1d,1y,10y')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs of each stage, default 3')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic raw files, default 0')
+    parser.add_argument('--workDir', default=os.path.join(tempfile.gettempdir(), 'argos_benchmark'),
+                        help='Directory of the synthetic raw files and NEAD files, default temporary directory')
+    parser.add_argument('--baseline', default='benchmark_baseline.json',
+                        help='Path of the baseline file, default benchmark_baseline.json')
+    parser.add_argument('--saveBaseline', action='store_true', help='Save the results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Relative increase of time or peak memory reported as a regression, default 0.2')
+    return parser
+
+
+def get_benchmark_file(work_dir, stations, days, seed):
+    """
+    :param work_dir: directory of the synthetic raw files
+    :param stations: list of station IDs
+    :param days: number of days
+    :param seed: seed of the random generator
+    :return: path of the synthetic raw file, generated if it does not exist yet
+    """
+    file = Path(work_dir, f'argos_{"_".join(map(str, stations))}_{days}d_seed{seed}.raw')
+
+    if not file.is_file():
+        file.parent.mkdir(parents=True, exist_ok=True)
+        temporary_file = file.with_suffix('.tmp')
+        lines_num = write_argos_file(temporary_file, stations, days=days, seed=seed, **BENCHMARK_FILE_ARGS)
+        os.replace(temporary_file, file)
+        logger.info(f' Generated {lines_num} lines in {file}')
+
+    return file
+
+
+def run_stage(function, repeat):
+    """
+    Run function repeat times and once more with tracemalloc.
+    :param function: function without arguments returning the number of output rows and the output of the stage
+    :param repeat: number of timed runs
+    :return: best time in seconds, peak memory in bytes, number of output rows and output of the last timed run
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows_out, output = function()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return min(seconds), peak, rows_out, output
+
+
+def benchmark_file(file, cleaner, sections, output_dir, repeat=3):
+    """
+    Benchmark the processing stages on an ARGOS raw file.
+    Stations are processed one after another, the results of a station stage are the totals of all stations.
+    :param file: path of the ARGOS raw file
+    :param cleaner: ArgosCleaner of the stations config
+    :param sections: sections of the stations cleaned
+    :param output_dir: directory of the NEAD files
+    :param repeat: number of timed runs of each stage
+    :return: dictionary with stage names as keys and dictionaries of the results as values
+    """
+    results = {}
+
+    def add_result(stage, rows_in, function):
+        seconds, peak, rows_out, output = run_stage(function, repeat)
+        results[stage] = {'seconds': round(seconds, 6), 'peak_mib': round(peak / 2 ** 20, 3), 'rows_in': rows_in,
+                          'rows_out': rows_out, 'rows_per_second': round(rows_in / seconds) if seconds else None}
+        return output
+
+    # Parse the raw file, rows in are the lines of the file
+    with open(file) as f:
+        lines_num = sum(1 for _ in f)
+
+    def read():
+        argos_dataframe = read_argos(file, None)
+        return len(argos_dataframe), argos_dataframe
+
+    argos_dataframe = add_result('read_argos', lines_num, read)
+
+    # decode_argos modifies its dataframe, each run decodes a copy (the copy is included in the time)
+    def decode():
+        data_array = decode_argos(argos_dataframe.copy(), remove_duplicate=True, sort=True).to_numpy()
+        return len(data_array), data_array
+
+    data_array = add_result('decode_argos', len(argos_dataframe), decode)
+
+    stations_data = cleaner.get_stations_data(data_array)
+    stations_data = {section: stations_data.get(int(section), data_array[:0]) for section in sections}
+
+    def get_station_arrays():
+        station_arrays = {section: cleaner.get_station_array(station_data, int(section))
+                          for section, station_data in stations_data.items() if len(station_data) != 0}
+        return sum(map(len, station_arrays.values())), station_arrays
+
+    station_arrays = add_result('get_station_array', sum(map(len, stations_data.values())), get_station_arrays)
+    station_arrays = {section: array for section, array in station_arrays.items() if len(array) != 0}
+
+    # filter_station_array modifies the station array, each run filters copies
+    def filter_stations():
+        filtered = {section: cleaner.filter_station_array(array.copy(), section)
+                    for section, array in station_arrays.items()}
+        return sum(len(data_filtered) for timestamp_iso, data_filtered, last_pressure in filtered.values()), filtered
+
+    filtered = add_result('filter_station_array', sum(map(len, station_arrays.values())), filter_stations)
+
+    def get_timestamps():
+        timestamps = [cleaner.get_timestamp_iso(array[:, 1], array[:, 2], array[:, 3] / 24)
+                      for array in station_arrays.values()]
+        return sum(map(len, timestamps)), timestamps
+
+    add_result('get_timestamp_iso', sum(map(len, station_arrays.values())), get_timestamps)
+
+    # Each run overwrites the NEAD files written by the previous run
+    def write():
+        for section, (timestamp_iso, data_filtered, last_pressure) in filtered.items():
+            nead_header, nodata = cleaner.get_nead_header(int(section))
+            if nead_header is not None:
+                cleaner.write_nead(timestamp_iso, data_filtered, output_dir, int(section), nead_header, nodata,
+                                   cleaner.no_data)
+        return sum(len(data_filtered) for timestamp_iso, data_filtered, last_pressure in filtered.values()), None
+
+    add_result('write_nead', sum(len(data_filtered) for timestamp_iso, data_filtered, last_pressure
+                                 in filtered.values()), write)
+
+    return results
+
+
+def compare_results(results, baseline, tolerance):
+    """
+    :param results: dictionary of the results of each scale and stage, as returned by `benchmark_file`
+    :param baseline: dictionary of the baseline results, same structure as results
+    :param tolerance: relative increase of time or peak memory reported as a regression, if the increase is larger
+        than BENCHMARK_MIN_INCREASES
+    :return: list of (scale, stage, measure, ratio) tuples of the regressions
+    """
+    regressions = []
+
+    for scale, stages in results.items():
+        for stage, result in stages.items():
+            base = baseline.get(scale, {}).get(stage)
+            if base is None:
+                continue
+            for measure, min_increase in BENCHMARK_MIN_INCREASES.items():
+                if base[measure] and result[measure] / base[measure] > 1 + tolerance and \
+                        result[measure] - base[measure] > min_increase:
+                    regressions.append((scale, stage, measure, result[measure] / base[measure]))
+
+    return regressions
+
+
+def log_results(scale, results, baseline=None):
+    logger.info(f' Scale {scale}:')
+    logger.info(f'   {"stage":<22}{"rows in":>10}{"rows out":>10}{"seconds":>10}{"rows/s":>12}{"peak MiB":>10}'
+                f'{"time vs base":>14}')
+
+    for stage, result in results.items():
+        base = (baseline or {}).get(scale, {}).get(stage)
+        ratio = f'{result["seconds"] / base["seconds"]:.2f}x' if base and base['seconds'] else '-'
+        logger.info(f'   {stage:<22}{result["rows_in"]:>10}{result["rows_out"]:>10}{result["seconds"]:>10.4f}'
+                    f'{result["rows_per_second"] or 0:>12}{result["peak_mib"]:>10.1f}{ratio:>14}')
+
+
+def main(args=None):
+    """
+    Main entry point for benchmarking the processing stages.
+    """
+
+    # Access arguments passed in command line
+    parser = get_parser()
+    args = parser.parse_args(args)
+
+    scales = args.scales.split(',')
+    for scale in scales:
+        if scale not in BENCHMARK_SCALES:
+            logger.error(f' Unknown scale {scale}, scales are {", ".join(BENCHMARK_SCALES)}')
+            return -1
+
+    cleaner = ArgosCleaner('config/stations.ini')
+    sections = [section for section in cleaner.stations_config.sections()
+                if cleaner.stations_config.get(section, 'active') == 'True']
+    stations = get_active_stations()
+
+    baseline = None
+    if Path(args.baseline).is_file() and not args.saveBaseline:
+        baseline = json.loads(Path(args.baseline).read_text())['results']
+
+    # Log lines of each station and run, and warnings of the corrupt records, would hide the results
+    logging.getLogger('cleaner').setLevel(logging.ERROR)
+    logging.getLogger('process_argos').setLevel(logging.ERROR)
+
+    results = {}
+    for scale in scales:
+        file = get_benchmark_file(args.workDir, stations, BENCHMARK_SCALES[scale], args.seed)
+        output_dir = Path(args.workDir, f'output_{scale}')
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        results[scale] = benchmark_file(file, cleaner, sections, output_dir, max(args.repeat, 1))
+        log_results(scale, results[scale], baseline)
+
+    if args.saveBaseline:
+        Path(args.baseline).write_text(json.dumps({'versions': {'python': sys.version.split()[0],
+                                                                'numpy': numpy.__version__,
+                                                                'pandas': pandas.__version__},
+                                                   'seed': args.seed, 'results': results}, indent=2))
+        logger.info(f' Saved baseline to {args.baseline}')
+        return 0
+
+    if baseline is None:
+        logger.info(f' No baseline {args.baseline} to compare with, save one with --saveBaseline')
+        return 0
+
+    regressions = compare_results(results, baseline, args.tolerance)
+    for scale, stage, measure, ratio in regressions:
+        logger.warning(f' REGRESSION {scale} {stage}: {measure} is {ratio:.2f}x the baseline')
+
+    if regressions:
+        return 1
+
+    logger.info(f' No regression compared with {args.baseline} (tolerance {args.tolerance:.0%})')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
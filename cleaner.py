@@ -1,9 +1,17 @@
 
+import os
 from pathlib import Path
 import numpy as np
 import configparser
 from datetime import datetime
 import math
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+from process_argos import get_unique_rows, widen_argos_array
+from metrics import measure, Metrics
+from columnar import get_columnar_path, get_part_paths, write_columnar, compact_columnar
+from config_cache import file_cache, parse_config
 
 
 import logging
@@ -12,48 +20,155 @@ logging.basicConfig()
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# Number of rows formatted and written at once to NEAD files
+NEAD_CHUNK_ROWS = 10000
+
+# Maximum number of rows of a station carried to the next chunk while waiting for a second table part
+MAX_PENDING_ROWS = 100
+
+# Number of bytes read from the end of a NEAD file to find its last timestamps before appending records
+NEAD_TAIL_BYTES = 1048576
+
+# Number of the most recent timestamps of a NEAD file kept in memory between appends
+NEAD_RECENT_ROWS = 10000
+
+# Filter rules of the cleaned ARGOS columns, in the order of the NEAD files:
+# (name, column of the station array, options), options are config keys except 'low_value', 'symmetric' and 'clamp'
+#   'calibration': values are multiplied by this calibration factor
+#   'calibration_negative': negative values are multiplied by this calibration factor instead, empty values are
+#       replaced by the no_data value
+#   'offset': added to the values after calibration
+#   'minimum', 'maximum': values lower than minimum or greater than maximum are replaced by the no_data value
+#   'low_value': replaces values lower than minimum instead of the no_data value
+#   'symmetric': minimum is the negative of maximum
+#   'clamp': values greater than clamp and lower than maximum are replaced by clamp
+ARGOS_FILTER_RULES = [
+    ('swin', 4, {'calibration': 'swin', 'minimum': 'swmin', 'maximum': 'swmax'}),
+    ('s_winmax', 31, {'calibration': 'swin', 'minimum': 'swmin', 'maximum': 'swmax'}),
+    ('swout', 5, {'calibration': 'swout', 'minimum': 'swmin', 'maximum': 'swmax'}),
+    ('s_woutmax', 32, {'calibration': 'swout', 'minimum': 'swmin', 'maximum': 'swmax', 'low_value': 0.0}),
+    ('swnet', 6, {'calibration': 'swnet_pos', 'calibration_negative': 'swnet_neg', 'maximum': 'swmax',
+                  'symmetric': True}),
+    ('s_wnetmax', 33, {'calibration': 'swnet_pos', 'calibration_negative': 'swnet_neg', 'maximum': 'swmax',
+                       'symmetric': True}),
+    ('tc1', 7, {'minimum': 'tcmin', 'maximum': 'tcmax'}),
+    ('tc1max', 34, {'minimum': 'tcmin', 'maximum': 'tcmax'}),
+    ('tc1min', 36, {'minimum': 'tcmin', 'maximum': 'tcmax'}),
+    ('tc2', 8, {'minimum': 'tcmin', 'maximum': 'tcmax'}),
+    ('tc2max', 35, {'minimum': 'tcmin', 'maximum': 'tcmax'}),
+    ('tc2min', 37, {'minimum': 'tcmin', 'maximum': 'tcmax'}),
+    ('hmp1', 9, {'minimum': 'hmpmin', 'maximum': 'hmpmax'}),
+    ('hmp2', 10, {'minimum': 'hmpmin', 'maximum': 'hmpmax'}),
+    ('rh1', 11, {'minimum': 'rhmin', 'maximum': 'rhmax', 'clamp': 100}),
+    ('rh2', 12, {'minimum': 'rhmin', 'maximum': 'rhmax', 'clamp': 100}),
+    ('ws1', 13, {'minimum': 'wmin', 'maximum': 'wmax'}),
+    ('ws1max', 38, {}),
+    ('ws1std', 40, {}),
+    ('ws2', 14, {'minimum': 'wmin', 'maximum': 'wmax'}),
+    ('ws2max', 39, {}),
+    ('ws2std', 41, {}),
+    ('wd1', 15, {'minimum': 'wdmin', 'maximum': 'wdmax'}),
+    ('wd2', 16, {'minimum': 'wdmin', 'maximum': 'wdmax'}),
+    ('pres', 17, {'offset': 'pressure_offset', 'minimum': 'pmin', 'maximum': 'pmax'}),
+    ('sh1', 18, {'minimum': 'shmin', 'maximum': 'shmax'}),
+    ('sh2', 19, {'minimum': 'shmin', 'maximum': 'shmax'}),
+    ('volts', 30, {'minimum': 'battmin', 'maximum': 'battmax'}),
+    ('tref', 42, {}),
+]
+
+
+class FilterPlan(object):
+
+    # Reads and validates the calibration factors and limits of the rules from a section of the stations config,
+    # each option is stored as a float numpy array with one value per rule
+    def __init__(self, stations_config, section, rules, no_data):
+
+        self.names = [name for name, column, options in rules]
+        self.columns = np.array([column for name, column, options in rules])
+
+        def get_values(key, default, convert=None):
+            values = []
+            for name, column, options in rules:
+                if key not in options:
+                    values.append(default)
+                elif convert is not None:
+                    values.append(convert(options[key]))
+                else:
+                    values.append(self._get_float(stations_config, section, options[key]))
+            return np.array(values, dtype='float')
+
+        self.calibration = get_values('calibration', 1.0)
+        self.calibration_negative = np.where([('calibration_negative' in options) for _, _, options in rules],
+                                             get_values('calibration_negative', 1.0), self.calibration)
+        self.empty_value = np.where([('calibration_negative' in options) for _, _, options in rules],
+                                    no_data, np.nan)
+        self.offset = get_values('offset', 0.0)
+        self.maximum = get_values('maximum', np.inf)
+        self.minimum = np.where([options.get('symmetric', False) for _, _, options in rules],
+                                -self.maximum, get_values('minimum', -np.inf))
+        self.low_value = get_values('low_value', no_data, float)
+        self.high_value = np.full(len(rules), float(no_data))
+        self.clamp = get_values('clamp', np.nan, float)
+
+    @staticmethod
+    def _get_float(stations_config, section, key):
+        try:
+            return stations_config.getfloat(section, key)
+        except (configparser.Error, ValueError) as e:
+            logger.error(f' Invalid value of {key} for station {section}: {e}')
+            raise ValueError(f'Invalid value of {key} for station {section}: {e}')
+
+    # Returns the filtered columns of station_array, one column per rule
+    # The columns are copied once into the returned block, which is then calibrated and filtered in place
+    def apply(self, station_array: np.ndarray):
+
+        # Assign values to the columns of the rules and masks of empty and negative values
+        values = station_array[:, self.columns]
+        empty = np.isnan(values)
+        negative = values < 0
+
+        # Calibrate values, empty values are replaced by empty_value
+        np.multiply(values, self.calibration_negative, out=values, where=negative)
+        np.multiply(values, self.calibration, out=values, where=~negative)
+        np.copyto(values, self.empty_value, where=empty)
+        np.add(values, self.offset, out=values, where=self.offset != 0)
+
+        # Filter out low and high values
+        np.copyto(values, self.low_value, where=values < self.minimum)
+        np.copyto(values, self.high_value, where=values > self.maximum)
+
+        # Assign values greater than clamp and less than maximum to clamp
+        np.copyto(values, self.clamp, where=(values > self.clamp) & (values < self.maximum))
+
+        return values
+
 
 class Cleaner(object):
 
-    def __init__(self, init_file_path: str, station_type: str):
+    # stations_config is the config already parsed from init_file_path, if None the file is parsed
+    def __init__(self, init_file_path: str, station_type: str, filter_rules=(), stations_config=None):
         self.init_file_path = init_file_path
-        self.stations_config = self._get_config()
+        self.stations_config = stations_config if stations_config is not None else self._get_config()
         # TODO investigate eliminating no_data value in stations.ini and using a variable instead in cleaner.py
         # self.no_data = float(self.stations_config.get("DEFAULT", "no_data"))
         self.no_data = 999
         self.station_type = station_type
+        self.filter_plans = self._get_filter_plans(filter_rules)
+        # Dictionary with sections as keys and the states of their NEAD files updated by append_nead() as values
+        self.nead_states = {}
 
+    # Returns stations config parsed from the file
     def _get_config(self):
-        # Set relative path to stations config file
-        stations_config_file = Path(self.init_file_path)
-
-        # Load stations configuration file and assign it to self.stations_config
-        stations_config = configparser.ConfigParser()
-        stations_config.read(stations_config_file)
-
-        return stations_config
-
-    # Function to filter values
-    def _filter_values(self, unfiltered_values, sect, minimum, maximum):
-        # Filter out low and high values
-        array = unfiltered_values
-        array[array < float(self.stations_config.get(sect, minimum))] = self.no_data
-        array[array > float(self.stations_config.get(sect, maximum))] = self.no_data
-
-        return array
+        return parse_config(self.init_file_path)
 
-    # Function to filter values with calibration factor
-    def _filter_values_calibrate(self, unfiltered_values, sect, minimum, maximum, calibration,
-                                 no_data_min, no_data_max):
-        # Multiply values by calibration factor, filter out low and high values
-        array = unfiltered_values * float(self.stations_config.get(sect, calibration))
-        array[array < float(self.stations_config.get(sect, minimum))] = no_data_min
-        array[array > float(self.stations_config.get(sect, maximum))] = no_data_max
-
-        return array
-
-        # Function to return current date number
+    # Returns dictionary with the sections of active stations as keys and their FilterPlan as values
+    # The config values are read and validated once, an invalid or missing value raises a ValueError
+    def _get_filter_plans(self, filter_rules):
+        return {section: FilterPlan(self.stations_config, section, filter_rules, self.no_data)
+                for section in self.stations_config.sections()
+                if self.stations_config.get(section, "active") == 'True'}
 
+    # Function to return current date number
     @staticmethod
     def _get_date_num():
         # Get current date
@@ -71,389 +186,716 @@ class Cleaner(object):
 
 class ArgosCleaner(Cleaner):
 
-    def __init__(self, init_file_path: str):
-        Cleaner.__init__(self, init_file_path, 'Argos')
+    def __init__(self, init_file_path: str, stations_config=None):
+        Cleaner.__init__(self, init_file_path, 'Argos', ARGOS_FILTER_RULES, stations_config)
 
     # Function to process ARGOS numpy array
-    def clean(self, input_data: np.ndarray):
+    # Active stations are cleaned and written in a pool of 'workers' processes if workers is greater than 1
+    # metrics is an optional Metrics of the iteration recording the stages of each station
+    def clean(self, input_data: np.ndarray, workers=1, metrics=None):
+
+        # Assign active_sections to sections of active Argos stations
+        active_sections = [section for section in self.stations_config.sections()
+                           if self.stations_config.get(section, "active") == 'True']
+
+        # Assign stations_data to data associated with each station, grouped once for all stations
+        with measure(metrics, 'group', rows_in=len(input_data)) as record:
+            stations_data = self.get_stations_data(input_data)
+            record['rows_out'] = len(stations_data)
+
+        # Iterate through each station and write json and csv file
+        # Stations without records get an empty view of input_data
+        with self.get_executor(workers) or nullcontext() as executor:
+            results = self.map_sections('clean_station', [(stations_data.get(int(section), input_data[:0]), section,
+                                                           self.nead_states.get(section, {}))
+                                                          for section in active_sections], executor, metrics)
+            self.nead_states.update(zip(active_sections, results))
+
+            self.compact_columnar_stations(active_sections, executor, metrics)
+
+    # Function to process a stream of decoded ARGOS numpy arrays chunk by chunk, for example from
+    # `decode_argos_chunks` or `TransmissionStore.iter_pending`, each chunk is cleaned and written before the next one
+    # Rows of each station that may be paired with a table part of a later chunk are carried to the next chunk,
+    # pressure jumps are detected from the last pressure of the previous chunk
+    # NEAD files are updated with append_nead(), in 'snapshot' nead_mode (from config) one file per station and run
+    # sections are the stations to clean (default all active stations), if output_dir is given the NEAD files are
+    # '{station_id}_NEAD.csv' in output_dir, time_range is an optional (start, end) tuple of numpy datetime64,
+    # only records with start <= timestamp < end are written, metrics is an optional Metrics of the iteration
+    def clean_chunks(self, chunks, workers=1, sections=None, output_dir=None, time_range=None, metrics=None):
+
+        # Assign active_sections to sections of active Argos stations
+        active_sections = [section for section in self.stations_config.sections()
+                           if self.stations_config.get(section, "active") == 'True']
+        if sections is not None:
+            active_sections = [section for section in active_sections if section in sections]
+
+        # Assign file_names to NEAD file names of the run in 'snapshot' nead_mode, same names as write_nead()
+        if output_dir is not None or \
+                self.stations_config.get('DEFAULT', 'nead_mode', fallback='snapshot') == 'append':
+            file_names = {}
+        else:
+            current_datetime_string = datetime.now().strftime("%Y-%m-%d_%H%M")
+            file_names = {section: f'{section}_NEAD_{current_datetime_string}.csv' for section in active_sections}
+            columnar_format = self.stations_config.get('DEFAULT', 'columnar_format', fallback='')
+            for file_name in file_names.values():
+                nead_filename = Path(self.stations_config.get('DEFAULT', 'output_dir'), file_name)
+                nead_filename.unlink(missing_ok=True)
+                if columnar_format:
+                    columnar_filename = get_columnar_path(nead_filename, columnar_format)
+                    columnar_filename.unlink(missing_ok=True)
+                    for part_path in get_part_paths(columnar_filename):
+                        part_path.unlink()
+
+        # Assign state carried between chunks: rows waiting for their second table part and last pressure
+        pending_rows = {}
+        last_pressures = {}
+        records_num = dict.fromkeys(active_sections, 0)
+
+        with self.get_executor(workers) or nullcontext() as executor:
+
+            for chunk in chunks:
+
+                # Assign stations_data to data associated with each station, grouped once for all stations
+                with measure(metrics, 'group', rows_in=len(chunk)) as record:
+                    stations_data = self.get_stations_data(chunk)
+                    record['rows_out'] = len(stations_data)
+
+                # Rows of the station are appended to the rows pending from the previous chunk
+                arguments = [(np.concatenate((pending_rows.get(section, chunk[:0]),
+                                              stations_data.get(int(section), chunk[:0]))),
+                              section, last_pressures.get(section), self.nead_states.get(section, {}),
+                              file_names.get(section), output_dir, time_range)
+                             for section in active_sections]
+                results = self.map_sections('clean_station_chunk', arguments, executor, metrics)
+
+                for section, (pending_rows[section], last_pressures[section], self.nead_states[section],
+                              written_num) in zip(active_sections, results):
+                    records_num[section] += written_num
+
+            self.compact_columnar_stations(active_sections, executor, metrics)
+
+        for section in active_sections:
+            if records_num[section] == 0:
+                logger.warning(f'\t{self.station_type} Station {section} does not have usable data')
+
+    # Merges the columnar files of the sections appended during the run, in executor if it is not None
+    # The columnar files are next to the NEAD files of self.nead_states, nothing is done if 'columnar_format' (from
+    # config) is not set
+    def compact_columnar_stations(self, sections, executor=None, metrics=None):
+
+        columnar_format = self.stations_config.get('DEFAULT', 'columnar_format', fallback='')
+        if not columnar_format:
+            return
+
+        arguments = [(section, get_columnar_path(self.nead_states[section]['filename'], columnar_format))
+                     for section in sections if 'filename' in self.nead_states.get(section, {})]
+        self.map_sections('compact_columnar_station', arguments, executor, metrics)
+
+    # Merges the part files of the columnar file of a station into the file
+    def compact_columnar_station(self, section, columnar_filename, metrics=None):
+
+        with measure(metrics, 'compact_columnar', int(section)) as record:
+            compact_columnar(columnar_filename)
+            record['bytes'] = columnar_filename.stat().st_size if columnar_filename.is_file() else 0
+
+    # Function to clean the rows of one station of a chunk of `clean_chunks` and update its NEAD file
+    # nead_state is the state of the NEAD file of the station updated by append_nead() (see write_station())
+    # Returns rows carried to the next chunk, last pressure (None if no record was filtered yet), nead_state and
+    # number of records written
+    def clean_station_chunk(self, station_data, section, last_pressure=None, nead_state=None, file_name=None,
+                            output_dir=None, time_range=None, metrics=None):
+
+        # Assign station_id
+        station_id = int(section)
+
+        station_data, pending_rows = self.split_pending_rows(station_data)
+        written_num = 0
+
+        if len(station_data) != 0:
+            with measure(metrics, 'station_array', station_id, len(station_data)) as record:
+                station_array = self.get_station_array(station_data, station_id)
+                record['rows_out'] = len(station_array)
+
+            if len(station_array) != 0:
+                with measure(metrics, 'filter', station_id, len(station_array)) as record:
+                    timestamp_iso, data_filtered, last_pressure = \
+                        self.filter_station_array(station_array, section, last_pressure, metrics)
+                    record['rows_out'] = len(data_filtered)
+
+                if time_range is not None:
+                    in_range = (timestamp_iso >= time_range[0]) & (timestamp_iso < time_range[1])
+                    timestamp_iso, data_filtered = timestamp_iso[in_range], data_filtered[in_range, :]
+
+                if len(data_filtered) != 0:
+                    self.write_station(timestamp_iso, data_filtered, station_id, file_name, output_dir, nead_state,
+                                       metrics)
+                    written_num = len(data_filtered)
+
+        return pending_rows, last_pressure, nead_state, written_num
+
+    # Returns a pool of workers processes cleaning stations with a copy of this cleaner, None if workers is 1
+    # Formatting the NEAD rows holds the GIL, separate processes clean stations on several cores at the same time
+    def get_executor(self, workers=1):
+        if workers <= 1:
+            return None
+
+        return ProcessPoolExecutor(max_workers=workers, initializer=_set_worker_cleaner, initargs=(self,))
+
+    # Calls the cleaner method named method_name with each tuple of arguments and metrics, returns the results in the
+    # order of arguments, in the worker processes of executor (from get_executor()) if given
+    # Station data are copied to the worker processes, the records of their metrics are added to metrics
+    def map_sections(self, method_name, arguments, executor=None, metrics=None):
+        if executor is None:
+            return [getattr(self, method_name)(*method_arguments, metrics=metrics)
+                    for method_arguments in arguments]
+
+        futures = [executor.submit(_call_worker_cleaner, method_name, method_arguments, metrics is not None)
+                   for method_arguments in arguments]
+
+        results = []
+        for future in futures:
+            # Raise exceptions of the stations
+            result, records = future.result()
+            for record in records:
+                metrics.add(record)
+            results.append(result)
+
+        return results
+
+    # Returns dictionary with station IDs as keys and the rows of input_data of each station as values
+    # Rows are grouped with one stable sort so the order of the rows of each station is kept
+    @staticmethod
+    def get_stations_data(input_data: np.ndarray):
 
         # Assign constant for column index in input numpy array
         INPUT_STATION_ID_COL = 7
 
+        if input_data.size == 0:
+            return {}
+
+        # Assign sorted_data to input_data sorted by station ID
+        sorted_data = input_data[np.argsort(input_data[:, INPUT_STATION_ID_COL], kind='stable'), :]
+
+        # Assign station_ids to the IDs of the stations and station_starts to the first row of each station
+        station_ids, station_starts = np.unique(sorted_data[:, INPUT_STATION_ID_COL], return_index=True)
+        station_ends = np.append(station_starts[1:], len(sorted_data))
+
+        # Each station gets a view of sorted_data
+        return {station_id: sorted_data[start:end, :]
+                for station_id, start, end in zip(station_ids, station_starts, station_ends)}
+
+    # Function to clean ARGOS numpy array data of one station and write its NEAD file
+    # nead_state is the state of the NEAD file of the station updated by append_nead() (see write_station())
+    # metrics is an optional Metrics of the iteration recording the stages of the station
+    # Returns nead_state
+    def clean_station(self, station_data: np.ndarray, section: str, nead_state=None, metrics=None):
+
+        # Assign station_id
+        station_id = int(section)
+
+        logger.info(f' Cleaning {self.station_type} Station {station_id}...')
+
+        if len(station_data) != 0:
+
+            # Assign station_array to array returns from get_station_array()
+            with measure(metrics, 'station_array', station_id, len(station_data)) as record:
+                station_array = self.get_station_array(station_data, station_id)
+                record['rows_out'] = len(station_array)
+
+            # Filter and process station_array
+            # Assign variables used to create new array that will be used to write csv files and json files
+            if len(station_array) != 0:
+                with measure(metrics, 'filter', station_id, len(station_array)) as record:
+                    timestamp_iso, data_filtered, last_pressure = \
+                        self.filter_station_array(station_array, section, metrics=metrics)
+                    record['rows_out'] = len(data_filtered)
+                self.write_station(timestamp_iso, data_filtered, station_id, nead_state=nead_state, metrics=metrics)
+
+            # Else station_array is empty after removing bad dates
+            else:
+                logger.warning(f'\t{self.station_type} Station {station_id} does not have usable data')
+
+        else:
+            logger.warning(f'\t{self.station_type} Station {station_id} does not have usable data')
+
+        return nead_state
+
+    # Returns timestamps, filtered data sorted by time without duplicate timestamps and last pressure
+    # (julian day and pressure before removing jumps) of the station_array of a station, station_array is not empty
+    # last_pressure is the last pressure returned for the previous chunk of the same station, None for the first
+    # metrics is an optional Metrics of the iteration recording the creation of the timestamps
+    def filter_station_array(self, station_array: np.ndarray, section: str, last_pressure=None, metrics=None):
+
         # Assign constants for column indices and other constants used in station_array processing
+        # Columns of the measurements are in ARGOS_FILTER_RULES
         STATION_NO_DATA1 = -8190
         STATION_NO_DATA2 = 2080
         STATION_NUM_COL = 0
         STATION_YEAR_COL = 1
         STATION_JULIAN_DAY_COL = 2
         STATION_HOUR_COL = 3
-        STATION_SWIN_COL = 4
-        STATION_SWOUT_COL = 5
-        STATION_SWNET_COL = 6
-        STATION_TC1_COL = 7
-        STATION_TC2_COL = 8
-        STATION_HMP1_COL = 9
-        STATION_HMP2_COL = 10
-        STATION_RH1_COL = 11
-        STATION_RH2_COL = 12
-        STATION_WS1_COL = 13
-        STATION_WS2_COL = 14
-        STATION_WD1_COL = 15
-        STATION_WD2_COL = 16
-        STATION_PRESSURE_COL = 17
-        STATION_SH1_COL = 18
-        STATION_SH2_COL = 19
-        STATION_VOLTS_COL = 30
-        STATION_S_WINMAX_COL = 31
-        STATION_S_WOUTMAX_COL = 32
-        STATION_S_WNETMAX_COL = 33
-        STATION_TC1MAX_COL = 34
-        STATION_TC2MAX_COL = 35
-        STATION_TC1MIN_COL = 36
-        STATION_TC2MIN_COL = 37
-        STATION_WS1MAX_COL = 38
-        STATION_WS2MAX_COL = 39
-        STATION_WS1STD_COL = 40
-        STATION_WS2STD_COL = 41
-        STATION_TREF_COL = 42
 
         # Assign other constants
         HOURS_IN_DAY = 24
-        MAX_HUMIDITY = 100
-        INITIALIZER_VAL = 999
 
-        # Iterate through each station and write json and csv file
-        for section in self.stations_config.sections():
+        # Assign station_id
+        station_id = int(section)
+
+        # Assign no_data values to self.no_data
+        station_array[station_array == STATION_NO_DATA1] = self.no_data
+        station_array[station_array == STATION_NO_DATA2] = self.no_data
+
+        # Assign date_number to year * 1000 + julian day plus fractional julian day
+        date_num = station_array[:, STATION_YEAR_COL] * 1.e3 \
+                   + (station_array[:, STATION_JULIAN_DAY_COL]
+                      + station_array[:, STATION_HOUR_COL] / HOURS_IN_DAY)
+
+        # Assign raw_num to number of records before duplicate filtering
+        raw_num = int(len(date_num))
+
+        # Find only unique timestamps and their indices from date_num
+        unique_date_num_array, unique_date_num_indices = np.unique(date_num, axis=0,
+                                                                   return_index=True)
+
+        # Log how many records removed because of duplicate time stamps
+        if len(unique_date_num_indices) < raw_num:
+            duplicate_timestamps_num = raw_num - len(unique_date_num_indices)
+            logger.info(f' Removed {duplicate_timestamps_num} entries out of'
+                        f' {raw_num} records from Station {station_id} '
+                        f'because of duplicate timestamps')
+
+        # Assign unique_timestamp_indices to indices of the records with unique timestamps sorted along time
+        unique_timestamp_indices = unique_date_num_indices[np.argsort(unique_date_num_array)]
+
+        # Crop data array to unique and sorted times, with a single copy of the records
+        station_array = station_array[unique_timestamp_indices, :]
+
+        # Assign variables used for timestamp_iso creation
+        year = station_array[:, STATION_YEAR_COL]
+        julian_dy = station_array[:, STATION_JULIAN_DAY_COL]
+        hours = station_array[:, STATION_HOUR_COL] / HOURS_IN_DAY
+
+        # Assign julian_day to julian day plus fractional julian day
+        julian_day = julian_dy + hours
+
+        # Assign station_number
+        # station_number = station_array[:, STATION_NUM_COL]
+
+        # Assign data_filtered to the calibrated and filtered columns in the order of the NEAD file
+        filter_plan = self.filter_plans[section]
+        data_filtered = filter_plan.apply(station_array)
+
+        # Eliminate single point jumps of barometric pressure
+        # The first pressure is compared to last_pressure (julian day and pressure) of the previous chunk if given
+        pres = data_filtered[:, filter_plan.names.index('pres')]
+        pres_series, julian_day_series = pres, julian_day
+        if last_pressure is not None:
+            julian_day_series = np.concatenate(([last_pressure[0]], julian_day))
+            pres_series = np.concatenate(([last_pressure[1]], pres))
+        last_pressure = (julian_day[-1], pres[-1])
+        pres_diff = np.diff(pres_series)  # Find difference of subsequent pressure measurements
+        hr_diff = np.diff(julian_day_series) * 24.  # Time difference in hours
+        mb_per_hr = np.absolute(
+            np.divide(pres_diff, hr_diff, out=np.zeros_like(pres_diff), where=hr_diff != 0)
+        )
+        press_jumps = np.argwhere(mb_per_hr > 10)  # Find jumps > 10mb/hr (quite unnatural)
+        pres[press_jumps + len(pres) - len(pres_diff)] = self.no_data  # Eliminate these single point jumps
+
+        # Create 1d array of timestamp_iso datetime64 values from existing time data
+        with measure(metrics, 'timestamps', station_id, len(year)) as record:
+            timestamp_iso = self.get_timestamp_iso(year, julian_dy, hours)
+            record['rows_out'] = len(timestamp_iso)
+
+        # Remove records without a valid hour (empty value), they can not be dated
+        valid_timestamps = ~np.isnat(timestamp_iso)
+        if not valid_timestamps.all():
+            logger.info(f' Removed {len(valid_timestamps) - valid_timestamps.sum()} entries from Station {station_id} '
+                        f'because of invalid timestamps')
+            timestamp_iso, data_filtered = timestamp_iso[valid_timestamps], data_filtered[valid_timestamps, :]
+
+        return timestamp_iso, data_filtered, last_pressure
+
+    # Writes cleaned data of a station to its NEAD file if the station has a NEAD header
+    # file_name is the name of the NEAD file updated by append_nead(), by default depends on 'nead_mode' (from config)
+    # output_dir is the directory of the NEAD files updated by append_nead(), by default 'output_dir' (from config)
+    # nead_state is an optional dictionary passed to append_nead() and updated in place, the same dictionary should be
+    # passed for each write of the station so the NEAD file is only read again if it was modified by another writer
+    # If 'columnar_format' (from config) is set the data are also written to a columnar file next to the NEAD file,
+    # updated the same way as the NEAD file, appended records are merged into the file by compact_columnar_station()
+    # metrics is an optional Metrics of the iteration recording the rows written and the size of the NEAD file
+    def write_station(self, timestamp_iso, data_filtered, station_id, file_name=None, output_dir=None,
+                      nead_state=None, metrics=None):
+
+        # 'nead_mode' (from config) append updates one NEAD file per station, else a new file is written
+        append = file_name is not None or output_dir is not None or \
+            self.stations_config.get('DEFAULT', 'nead_mode', fallback='snapshot') == 'append'
+        output_dir = output_dir or self.stations_config.get('DEFAULT', 'output_dir')
+
+        # If nead_header exists write NEAD file with cleaned data
+        # self.no_data values are written as nodata value from NEAD header
+        nead_header, nodata = self.get_nead_header(station_id)
+        if nead_header is not None:
+            with measure(metrics, 'write', station_id, len(data_filtered)) as record:
+                if append:
+                    filename = self.append_nead(timestamp_iso, data_filtered, output_dir, station_id, nead_header,
+                                                nodata, self.no_data, file_name, nead_state)
+                else:
+                    filename = self.write_nead(timestamp_iso, data_filtered, output_dir, station_id, nead_header,
+                                               nodata, self.no_data)
+                record['rows_out'] = len(data_filtered)
+                record['bytes'] = filename.stat().st_size if filename.is_file() else 0
+
+            # Write columnar file with the NEAD fields as column names and the NEAD header as metadata,
+            # self.no_data values are written as NaN, in append mode the records are written to a part file
+            columnar_format = self.stations_config.get('DEFAULT', 'columnar_format', fallback='')
+            if columnar_format:
+                with measure(metrics, 'write_columnar', station_id, len(data_filtered)) as record:
+                    columnar_filename = write_columnar(get_columnar_path(filename, columnar_format), timestamp_iso,
+                                                       data_filtered, self.get_nead_config(station_id)['fields'][1:],
+                                                       {'station_id': str(station_id), 'nead_header': nead_header},
+                                                       self.no_data, append)
+                    record['rows_out'] = len(data_filtered)
+                    record['bytes'] = columnar_filename.stat().st_size if columnar_filename.is_file() else 0
+
+    # Writes NEAD file for cleaned station data, one row per timestamp
+    # Data values equal to no_data are written as nodata (from NEAD header), other values as the shortest
+    # representation of the float (same as str())
+    # Returns the path of the NEAD file
+    @staticmethod
+    def write_nead(timestamps, data, output_dir, station_id, nead_header, nodata, no_data=999):
+
+        current_datetime = datetime.now()
+        current_datetime_string = current_datetime.strftime("%Y-%m-%d_%H%M")
+
+        filename = Path(f'{output_dir}/{str(station_id)}_NEAD_{current_datetime_string}.csv')
+
+        with open(filename, 'w') as file:
+            if len(data) != 0:
+                try:
+                    file.write(ArgosCleaner.format_nead_header(nead_header))
+                    ArgosCleaner.write_nead_rows(file, timestamps, data, nodata, no_data)
+                    logger.info(" Wrote {0} entries for Station {1} to file: {2}"
+                                .format(len(data), station_id, filename))
+                except Exception as e:
+                    logger.error(f' ERROR COULD NOT WRITE CSV, EXCEPTION: {e}')
+            # TODO test with no data
+            # Else file is left empty
+
+        return filename
+
+    # Writes or updates the canonical NEAD file of a station '{station_id}_NEAD.csv' (or file_name) in output_dir
+    # Only records with timestamps that are not in the file yet are written (existing records are never modified):
+    # records newer than the last timestamp of the file are appended, late records are merged in timestamp order
+    # If the header of the existing file is not nead_header the existing file is kept with the suffix '_{datetime}'
+    # and a new file is started
+    # state is an optional dictionary kept by the caller between the calls for the same file, filled with the header,
+    # last timestamp and recent timestamps of the file (see read_nead_tail()): an existing file is only read from its
+    # end (NEAD_TAIL_BYTES) on the first call or if another writer modified it, the whole file is only read if
+    # records older than the recent timestamps are written and only rewritten if they are not in the file yet
+    # Returns the path of the NEAD file
+    @staticmethod
+    def append_nead(timestamps, data, output_dir, station_id, nead_header, nodata, no_data=999, file_name=None,
+                    state=None):
+
+        filename = Path(f'{output_dir}/{file_name or str(station_id) + "_NEAD.csv"}')
+        header = ArgosCleaner.format_nead_header(nead_header)
+        state = {} if state is None else state
+
+        # Assign state to the tail of the file if the file is not the file of state or changed since the last call
+        if state.get('filename') != str(filename) or \
+                state.get('signature') != ArgosCleaner.get_file_signature(filename):
+            state.clear()
+            state.update(ArgosCleaner.read_nead_tail(filename))
+
+        if state['header'] is not None and state['header'] != header:
+            current_datetime_string = datetime.now().strftime("%Y-%m-%d_%H%M")
+            renamed_filename = filename.with_name(f'{filename.stem}_{current_datetime_string}{filename.suffix}')
+            logger.warning(f' NEAD header of {filename} changed, existing file renamed to {renamed_filename}')
+            os.replace(filename, renamed_filename)
+            state.update(ArgosCleaner.read_nead_tail(filename))
+
+        # Assign existing_timestamps to the timestamps of the file known to state, all timestamps of the file if
+        # records are older than the first recent timestamp (existing_rows is then the list of rows of the file)
+        timestamps_iso = ArgosCleaner.format_timestamp_iso(timestamps)
+        existing_rows = None
+        existing_timestamps = state['timestamps']
+        if state['header'] is not None and (timestamps_iso < state['tail_start']).any():
+            existing_header, existing_rows = ArgosCleaner.read_nead_file(filename)
+            existing_timestamps = {timestamp for timestamp, line in existing_rows}
+
+        # Keep only records with timestamps that are not in the existing file
+        new_records = np.array([timestamp not in existing_timestamps for timestamp in timestamps_iso], dtype=bool)
+
+        if not new_records.any():
+            logger.info(f' No new entries for Station {station_id} in file: {filename}')
+            return filename
+
+        timestamps, data, timestamps_iso = timestamps[new_records], data[new_records, :], timestamps_iso[new_records]
+
+        try:
+            # Append records newer than the last timestamp of the existing file
+            if state['header'] is not None and min(timestamps_iso) > state['last_timestamp']:
+                with open(filename, 'a') as file:
+                    ArgosCleaner.write_nead_rows(file, timestamps, data, nodata, no_data)
+                logger.info(f' Appended {len(data)} entries for Station {station_id} to file: {filename}')
+
+                state['timestamps'].update(timestamps_iso.tolist())
+                state['last_timestamp'] = str(max(timestamps_iso))
+
+                # Keep the NEAD_RECENT_ROWS most recent timestamps
+                if len(state['timestamps']) > 2 * NEAD_RECENT_ROWS:
+                    recent_timestamps = sorted(state['timestamps'])[-NEAD_RECENT_ROWS:]
+                    state['timestamps'], state['tail_start'] = set(recent_timestamps), recent_timestamps[0]
+
+            # Else merge late records into the existing records, the file is replaced at once when complete
+            else:
+                if existing_rows is None:
+                    existing_header, existing_rows = ArgosCleaner.read_nead_file(filename)
 
-            # Assign station config variables
-            is_active = self.stations_config.get(section, "active")
+                new_lines = ArgosCleaner.format_nead_rows(timestamps, data, nodata, no_data).splitlines(True)
+                new_rows = [(line[:line.index(',')], line) for line in new_lines]
+                merged_rows = sorted(existing_rows + new_rows, key=lambda row: row[0])
 
-            # Process active Argos stations
-            if is_active == 'True':
+                temporary_filename = filename.with_suffix('.tmp')
+                with open(temporary_filename, 'w') as file:
+                    file.write(header)
+                    file.writelines(line for timestamp, line in merged_rows)
+                os.replace(temporary_filename, filename)
 
-                # Assign station_id
-                station_id = int(section)
+                if state['header'] is None:
+                    logger.info(f' Wrote {len(data)} entries for Station {station_id} to file: {filename}')
+                else:
+                    logger.info(f' Merged {len(data)} entries for Station {station_id} into file: {filename}')
 
-                logger.info(f' Cleaning {self.station_type} Station {station_id}...')
+                recent_timestamps = [timestamp for timestamp, line in merged_rows[-NEAD_RECENT_ROWS:]]
+                state.update({'header': header, 'last_timestamp': recent_timestamps[-1],
+                              'timestamps': set(recent_timestamps),
+                              'tail_start': recent_timestamps[0] if len(merged_rows) > NEAD_RECENT_ROWS else ''})
 
-                if input_data.size != 0:
+            state['signature'] = ArgosCleaner.get_file_signature(filename)
 
-                    # Assign station_data to data associated with each station
-                    station_data = np.array(input_data[input_data[:, INPUT_STATION_ID_COL] == station_id, :])
+        except Exception as e:
+            logger.error(f' ERROR COULD NOT WRITE CSV, EXCEPTION: {e}')
+            # The file is read again by the next call
+            state.clear()
 
-                    if len(station_data) != 0:
+        return filename
 
-                        # Assign station_array to array returns from get_station_array()
-                        station_array = self.get_station_array(station_data, station_id)
+    # Returns state of a NEAD file for append_nead() from its header and the rows in its last NEAD_TAIL_BYTES:
+    # dictionary with 'filename', 'signature' (see get_file_signature()), 'header' (None if the file does not exist),
+    # 'last_timestamp' ('' if the file has no rows), 'timestamps' (set of the timestamps of the rows read) and
+    # 'tail_start' (all timestamps of the file greater than or equal to tail_start are in 'timestamps')
+    @staticmethod
+    def read_nead_tail(filename):
 
-                        # Filter and process station_array
-                        # Assign variables used to create new array that will be used to write csv files and json files
-                        if len(station_array) != 0:
+        state = {'filename': str(filename), 'signature': ArgosCleaner.get_file_signature(filename), 'header': None,
+                 'last_timestamp': '', 'timestamps': set(), 'tail_start': ''}
 
-                            # Assign no_data values to self.no_data
-                            station_array[station_array == STATION_NO_DATA1] = self.no_data
-                            station_array[station_array == STATION_NO_DATA2] = self.no_data
+        if state['signature'] is None:
+            return state
 
-                            # Assign year to year data
-                            year = station_array[:, STATION_YEAR_COL]
+        with open(filename, 'rb') as file:
 
-                            # Assign julian_day to julian day plus fractional julian day
-                            julian_day = station_array[:, STATION_JULIAN_DAY_COL] \
-                                         + station_array[:, STATION_HOUR_COL] / HOURS_IN_DAY
+            # Assign header_lines to the commented lines at the start of the file and header_end to their end
+            header_lines = []
+            header_end = file.tell()
+            line = file.readline()
+            while line.startswith(b'#'):
+                header_lines.append(line.decode())
+                header_end = file.tell()
+                line = file.readline()
 
-                            # Assign date_number to year * 1000 + julian_day
-                            date_num = year * 1.e3 + julian_day
+            # Assign lines to the complete lines of the last NEAD_TAIL_BYTES of the file
+            tail_start_position = max(header_end, state['signature'][0] - NEAD_TAIL_BYTES)
+            file.seek(tail_start_position)
+            lines = file.read().decode().splitlines()
+            if tail_start_position > header_end:
+                lines = lines[1:]
 
-                            # Assign raw_num to number of records before duplicate filtering
-                            raw_num = int(len(date_num))
+        timestamps = [line[:line.find(',')] for line in lines if line.strip()]
 
-                            # Find only unique timestamps and their indices from date_num
-                            unique_date_num_array, unique_date_num_indices = np.unique(date_num, axis=0,
-                                                                                       return_index=True)
+        # A tail without complete rows does not tell which timestamps are in the file, the whole file is read
+        if tail_start_position > header_end and not timestamps:
+            existing_header, existing_rows = ArgosCleaner.read_nead_file(filename)
+            timestamps = [timestamp for timestamp, line in existing_rows]
+            tail_start_position = header_end
 
-                            # Reassign station_array to records with unique timestamps
-                            station_array = station_array[unique_date_num_indices, :]
+        state.update({'header': ''.join(header_lines), 'timestamps': set(timestamps),
+                      'last_timestamp': max(timestamps, default=''),
+                      'tail_start': timestamps[0] if tail_start_position > header_end else ''})
 
-                            # Reassign year data
-                            year = station_array[:, STATION_YEAR_COL]
+        return state
 
-                            # Reassign julian_day to julian day plus fractional julian day
-                            julian_day = station_array[:, STATION_JULIAN_DAY_COL] \
-                                         + station_array[:, STATION_HOUR_COL] / HOURS_IN_DAY
+    # Returns (size, modification time in nanoseconds) of a file, None if the file does not exist
+    @staticmethod
+    def get_file_signature(filename):
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            return None
 
-                            # Reassign date_number to year * 1000 + julian_day
-                            date_num = year * 1.e3 + julian_day
+        return stat.st_size, stat.st_mtime_ns
 
-                            # Log how many records removed because of duplicate time stamps
-                            if len(unique_date_num_indices) < raw_num:
-                                duplicate_timestamps_num = raw_num - len(unique_date_num_indices)
-                                logger.info(f' Removed {duplicate_timestamps_num} entries out of'
-                                            f' {raw_num} records from Station {station_id} '
-                                            f'because of duplicate timestamps')
+    # Returns header (commented lines) and list of (timestamp, line) tuples of data rows of a NEAD file
+    # written by write_nead() or append_nead(), returns None, [] if the file does not exist
+    @staticmethod
+    def read_nead_file(filename):
+
+        if not Path(filename).is_file():
+            return None, []
 
-                            # Assign variables used to create timestamp_iso
-                            julian_dy = station_array[:, STATION_JULIAN_DAY_COL]
-                            hours = station_array[:, STATION_HOUR_COL] / HOURS_IN_DAY
+        header_lines = []
+        rows = []
 
-                            # Assign unique_timestamp_indices to indices of a sort of unique datetime values along time
-                            unique_timestamp_indices = np.argsort(unique_date_num_array)
+        with open(filename, 'r') as file:
+            for line in file:
+                if line.startswith('#'):
+                    header_lines.append(line)
+                elif line.strip():
+                    rows.append((line[:line.find(',')], line))
 
-                            # Crop data array to unique times
-                            station_array = station_array[unique_timestamp_indices, :]
-                            julian_day = julian_day[unique_timestamp_indices]  # crop julian_day vector to unique times
-                            year = year[unique_timestamp_indices]
-                            date_num = date_num[unique_timestamp_indices]  # leave only unique and sorted date_nums
+        return ''.join(header_lines), rows
 
-                            # Assign variables used for timestamp_iso creation
-                            julian_dy = julian_dy[unique_timestamp_indices]
-                            hours = hours[unique_timestamp_indices]
+    # Returns NEAD header with each line commented, as written by numpy.savetxt()
+    @staticmethod
+    def format_nead_header(nead_header):
+        return '# ' + nead_header.replace('\n', '\n# ') + '\n'
 
-                            # Assign station_number
-                            # station_number = station_array[:, STATION_NUM_COL]
+    # Writes NEAD data rows to an open file in chunks of NEAD_CHUNK_ROWS rows
+    @staticmethod
+    def write_nead_rows(file, timestamps, data, nodata, no_data=999):
+        for start in range(0, len(data), NEAD_CHUNK_ROWS):
+            end = start + NEAD_CHUNK_ROWS
+            file.write(ArgosCleaner.format_nead_rows(timestamps[start:end], data[start:end, :],
+                                                     nodata, no_data))
+
+    # Returns NEAD data rows as a string, each value is followed by the field delimiter
+    # Data values equal to no_data are replaced by nodata
+    @staticmethod
+    def format_nead_rows(timestamps, data, nodata, no_data=999):
 
-                            # Assign and calibrate incoming shortwave
-                            swin = self._filter_values_calibrate(station_array[:, STATION_SWIN_COL], section,
-                                                                 "swmin", "swmax", "swin",
-                                                                 self.no_data, self.no_data)
+        # Assign columns to list of 1d arrays of strings, first column is timestamps in ISO format
+        columns = [ArgosCleaner.format_timestamp_iso(timestamps)]
 
-                            # Assign and calibrate outgoing shortwave
-                            swout = self._filter_values_calibrate(station_array[:, STATION_SWOUT_COL], section,
-                                                                  "swmin", "swmax", "swout",
-                                                                  self.no_data, self.no_data)
-
-                            # Assign and calibrate net shortwave, negative and positive values
-                            # Different stations have different calibration coefficients according to QC code
-                            swnet = INITIALIZER_VAL * np.ones(np.size(swout, 0))
-                            swnet[station_array[:, STATION_SWNET_COL] >= 0] = \
-                                station_array[station_array[:, STATION_SWNET_COL] >= 0, STATION_SWNET_COL] \
-                                * float(self.stations_config.get(section, "swnet_pos"))
-                            swnet[station_array[:, STATION_SWNET_COL] < 0] = \
-                                station_array[station_array[:, STATION_SWNET_COL] < 0, STATION_SWNET_COL] \
-                                * float(self.stations_config.get(section, "swnet_neg"))
-
-                            # Filter low net shortwave
-                            swnet[swnet < -float(self.stations_config.get(section, "swmax"))] = self.no_data
-
-                            # Filter high net shortwave
-                            swnet[swnet > float(self.stations_config.get(section, "swmax"))] = self.no_data
-
-                            # Filter thermocouple 1
-                            tc1 = self._filter_values(station_array[:, STATION_TC1_COL], section, "tcmin", "tcmax")
-
-                            # Filter thermocouple 2
-                            tc2 = self._filter_values(station_array[:, STATION_TC2_COL], section, "tcmin", "tcmax")
-
-                            # Filter hmp1 temp
-                            hmp1 = self._filter_values(station_array[:, STATION_HMP1_COL], section, "hmpmin", "hmpmax")
-
-                            # Filter hmp2 temp
-                            hmp2 = self._filter_values(station_array[:, STATION_HMP2_COL], section, "hmpmin", "hmpmax")
-
-                            # Assign and calibrate relative humidity 1
-                            rh1 = station_array[:, STATION_RH1_COL]
-                            rh1[rh1 < float(self.stations_config.get(section, "rhmin"))] = self.no_data  # filter low
-                            rh1[rh1 > float(self.stations_config.get(section, "rhmax"))] = self.no_data  # filter high
-                            # Assign values greater than MAX_HUMIDITY and less than rhmax to MAX_HUMIDITY
-                            rh1[(rh1 > MAX_HUMIDITY) & (rh1 < float(self.stations_config.get(section, "rhmax")))] \
-                                = MAX_HUMIDITY
-
-                            # Assign and calibrate relative humidity 2
-                            rh2 = station_array[:, STATION_RH2_COL]
-                            rh2[rh2 < float(self.stations_config.get(section, "rhmin"))] = self.no_data  # filter low
-                            rh2[rh2 > float(self.stations_config.get(section, "rhmax"))] = self.no_data  # filter high
-                            # Assign values greater than MAX_HUMIDITY and less than rhmax to MAX_HUMIDITY
-                            rh2[(rh2 > MAX_HUMIDITY) & (
-                                    rh2 < float(self.stations_config.get(section, "rhmax")))] = MAX_HUMIDITY
-
-                            # Filter wind speed 1
-                            ws1 = self._filter_values(station_array[:, STATION_WS1_COL], section, "wmin", "wmax")
-
-                            # Filter wind speed 2
-                            ws2 = self._filter_values(station_array[:, STATION_WS2_COL], section, "wmin", "wmax")
-
-                            # Filter wind direction 1
-                            wd1 = self._filter_values(station_array[:, STATION_WD1_COL], section, "wdmin", "wdmax")
-
-                            # Filter wind direction 2
-                            wd2 = self._filter_values(station_array[:, STATION_WD2_COL], section, "wdmin", "wdmax")
-
-                            # Assign and calibrate barometric pressure
-                            pres = station_array[:, STATION_PRESSURE_COL] \
-                                   + float(self.stations_config.get(section, "pressure_offset"))
-                            pres[pres < float(self.stations_config.get(section, "pmin"))] = self.no_data  # filter low
-                            pres[pres > float(self.stations_config.get(section, "pmax"))] = self.no_data  # filter low
-                            pres_diff = np.diff(pres)  # Find difference of subsequent pressure measurements
-                            hr_diff = np.diff(julian_day) * 24.  # Time difference in hours
-                            mb_per_hr = np.absolute(
-                                np.divide(pres_diff, hr_diff, out=np.zeros_like(pres_diff), where=hr_diff != 0)
-                            )
-                            press_jumps = np.argwhere(mb_per_hr > 10)  # Find jumps > 10mb/hr (quite unnatural)
-                            pres[press_jumps + 1] = self.no_data  # Eliminate these single point jumps
-
-                            # Filter height above snow 1
-                            sh1 = self._filter_values(station_array[:, STATION_SH1_COL], section, "shmin", "shmax")
-
-                            # Filter height above snow 2
-                            sh2 = self._filter_values(station_array[:, STATION_SH2_COL], section, "shmin", "shmax")
-
-                            # 10m snow temperature (many of these are non functional or not connected)
-                            snow_temp10 = station_array[:, 20:30]
-
-                            # Filter battery voltage
-                            volts = self._filter_values(station_array[:, STATION_VOLTS_COL], section,
-                                                        "battmin", "battmax")
-
-                            s_winmax = self._filter_values_calibrate(station_array[:, STATION_S_WINMAX_COL], section,
-                                                                     "swmin", "swmax", "swin",
-                                                                     self.no_data, self.no_data)
-
-                            s_woutmax = self._filter_values_calibrate(station_array[:, STATION_S_WOUTMAX_COL], section,
-                                                                      "swmin", "swmax", "swout", 0.00, self.no_data)
-
-                            # Assign and calibrate net radiation max
-                            s_wnetmax = INITIALIZER_VAL * np.ones_like(s_woutmax)
-                            s_wnetmax[station_array[:, STATION_S_WNETMAX_COL] >= 0] \
-                                = station_array[station_array[:, STATION_S_WNETMAX_COL] >= 0, STATION_S_WNETMAX_COL] \
-                                  * float(self.stations_config.get(section, "swnet_pos"))
-                            s_wnetmax[station_array[:, STATION_S_WNETMAX_COL] < 0] \
-                                = station_array[station_array[:, STATION_S_WNETMAX_COL] < 0, STATION_S_WNETMAX_COL] \
-                                  * float(self.stations_config.get(section, "swnet_neg"))
-                            # Filter low
-                            s_wnetmax[s_wnetmax < -(float(self.stations_config.get(section, "swmax")))] = self.no_data
-                            # Filter high
-                            s_wnetmax[s_wnetmax > float(self.stations_config.get(section, "swmax"))] = self.no_data
-
-                            # Filter other measurements
-                            tc1max = self._filter_values(station_array[:, STATION_TC1MAX_COL], section,
-                                                         "tcmin", "tcmax")
-
-                            tc2max = self._filter_values(station_array[:, STATION_TC2MAX_COL], section,
-                                                         "tcmin", "tcmax")
-
-                            tc1min = self._filter_values(station_array[:, STATION_TC1MIN_COL], section,
-                                                         "tcmin", "tcmax")
-
-                            tc2min = self._filter_values(station_array[:, STATION_TC2MIN_COL], section,
-                                                         "tcmin", "tcmax")
-
-                            # Assign statistics
-                            ws1max = station_array[:, STATION_WS1MAX_COL]
-                            ws2max = station_array[:, STATION_WS2MAX_COL]
-                            ws1std = station_array[:, STATION_WS1STD_COL]
-                            ws2std = station_array[:, STATION_WS2STD_COL]
-                            tref = station_array[:, STATION_TREF_COL]
-
-                            # Assemble filtered data into data_filtered 2d array
-                            data_filtered = np.column_stack(
-                                (swin, s_winmax,
-                                 swout, s_woutmax,
-                                 swnet, s_wnetmax,
-                                 tc1, tc1max, tc1min,
-                                 tc2, tc2max, tc2min,
-                                 hmp1, hmp2,
-                                 rh1, rh2,
-                                 ws1, ws1max, ws1std,
-                                 ws2, ws2max, ws2std,
-                                 wd1, wd2,
-                                 pres,
-                                 sh1, sh2,
-                                 volts,
-                                 tref)
-                            )
-
-                            # Create 1d array of timestamp_iso datetime objects from existing time data
-                            timestamp_iso = self.get_timestamp_iso(year, julian_dy, hours)
-
-                            # Combine timestamp_iso and data_filtered arrays into timestamped_data 2d array
-                            timestamped_data = np.column_stack((timestamp_iso, data_filtered))
-
-                            # If nead_header exists write NEAD file with cleaned data
-                            nead_header, nodata = self.get_nead_header(station_id)
-                            output_dir = self.stations_config.get('DEFAULT', 'output_dir')
-                            if nead_header is not None:
-                                # Assign self.no_data values to nodata value from NEAD header
-                                timestamped_data[timestamped_data == self.no_data] = nodata
-                                self.write_nead(timestamped_data, output_dir, station_id, nead_header)
-
-                        # Else station_array is empty after removing bad dates
-                        else:
-                            logger.warning(f'\t{self.station_type} Station {station_id} does not have usable data')
+        for column_index in range(data.shape[1]):
+            values = data[:, column_index]
+            column = ArgosCleaner.format_nead_column(values)
+            column[values == no_data] = nodata
+            columns.append(column)
 
-                else:
-                    logger.warning(f'\t{self.station_type} Station {station_id} does not have usable data')
+        return ''.join([','.join(row) + ',\n' for row in zip(*columns)])
 
-    # Writes NEAD file for cleaned station data
+    # Returns 1d object array of values formatted as str()
+    # Measurements repeat a lot so each distinct value is formatted only once
     @staticmethod
-    def write_nead(cleaned_data, output_dir, station_id, nead_header):
+    def format_nead_column(values):
 
-        current_datetime = datetime.now()
-        current_datetime_string = current_datetime.strftime("%Y-%m-%d_%H%M")
+        unique_values, unique_inverse = np.unique(values, return_inverse=True)
+        column = unique_values.astype(str).astype(object)[unique_inverse.ravel()]
 
-        filename = Path(f'{output_dir}/{str(station_id)}_NEAD_{current_datetime_string}.csv')
+        # 0.0 and -0.0 are the same unique value but are not written the same way
+        zeros = values == 0
+        column[zeros] = values[zeros].astype(str)
 
-        with open(filename, 'w') as file:
-            if len(cleaned_data) != 0:
-                # Create format_string from number of columns of cleaned_data
-                cleaned_data_columns_num = cleaned_data.shape[1]
-                format_string = '%s,'*cleaned_data_columns_num
-                try:
-                    np.savetxt(file, cleaned_data, fmt=format_string, header=nead_header)
-                    logger.info(" Wrote {0} entries for Station {1} to file: {2}"
-                                .format(len(cleaned_data[:, 1]), station_id, filename))
-                except Exception as e:
-                    logger.error(f' ERROR COULD NOT WRITE CSV, EXCEPTION: {e}')
-            # TODO test with no data
-            else:
-                np.savetxt(file, cleaned_data)
+        return column
 
     # Returns NEAD header as a string if it exists and nodata value from NEAD heaer, else returns None, None
     @staticmethod
     def get_nead_header(station_id):
 
-        nead_header_path = Path(f'nead_config/{station_id}.ini')
+        nead_config = ArgosCleaner.get_nead_config(station_id)
 
-        if nead_header_path.is_file():
-            with open(nead_header_path, 'r') as file:
-                nead_header = file.read()
-                nead_header_config = configparser.ConfigParser()
-                nead_header_config.read(nead_header_path)
-                nodata = nead_header_config.get('METADATA', 'nodata')
-            return nead_header, nodata
+        if nead_config is None or not nead_config['valid']:
+            return None, None
 
-        else:
+        return nead_config['header'], nead_config['nodata']
+
+    # Returns dictionary of the NEAD header 'nead_config/{station_id}.ini' of a station, None if it does not exist
+    # Headers are cached, a file is only read and parsed again when it changed
+    @staticmethod
+    def get_nead_config(station_id):
+
+        nead_header_path = Path(f'nead_config/{station_id}.ini')
+        nead_config = file_cache.get(nead_header_path, ArgosCleaner.parse_nead_config)
+
+        if nead_config is None:
             logger.error(f' ERROR CAN NOT WRITE NEAD FILE FOR STATION {station_id}: {nead_header_path} does not exist')
-            return None, None
 
-    # Returns timestamp in ISO UTC format, for example '2020-11-03 00:00:00+00:00'
-    # Returns unix timestamp
+        return nead_config
+
+    # Returns dictionary of a NEAD header file: 'header' (text of the file), 'nodata' (value written for no_data),
+    # 'fields' (list of display_description) and 'valid' (fields match the columns of the NEAD files: timestamp and
+    # filter rules), the number of fields is checked once when the file is parsed
+    @staticmethod
+    def parse_nead_config(nead_header_path):
+
+        with open(nead_header_path, 'r') as file:
+            nead_header = file.read()
+
+        # Units may contain '%', values are read without interpolation
+        nead_header_config = configparser.ConfigParser(interpolation=None)
+        nead_header_config.read_string(nead_header)
+        nodata = nead_header_config.get('METADATA', 'nodata')
+        field_delimiter = nead_header_config.get('METADATA', 'field_delimiter', fallback=',')
+        fields = [field.strip() for field in
+                  nead_header_config.get('FIELDS', 'display_description', fallback='').split(field_delimiter)]
+
+        # Assign valid to True if display_description has the timestamp and one field per filter rule
+        columns_num = len(ARGOS_FILTER_RULES) + 1
+        valid = len(fields) == columns_num
+        if not valid:
+            logger.error(f' ERROR CAN NOT WRITE NEAD FILE WITH {nead_header_path}: display_description has '
+                         f'{len(fields)} fields instead of {columns_num}')
+
+        return {'header': nead_header, 'nodata': nodata, 'fields': fields, 'valid': valid}
+
+    # Returns numpy datetime64 array of UTC timestamps, computed as start of year + julian day + hours
+    # Timestamps are formatted in ISO format by format_timestamp_iso() when they are written
+    @staticmethod
+    def get_timestamp_iso(year, julian_day, hours):
+
+        # Assign year_start to the first second of each year
+        year_start = (year.astype(int) - 1970).astype('datetime64[Y]').astype('datetime64[s]')
+
+        # Assign days and hours to time since the start of the year, julian day 1 is the first day of the year
+        days = (julian_day.astype(int) - 1).astype('timedelta64[D]')
+        hours = (hours * 24).astype(int).astype('timedelta64[h]')
+
+        return year_start + days + hours
+
+    # Returns timestamps in ISO UTC format, for example '2020-11-03 00:00:00+00:00'
     @staticmethod
     # TODO make timezone configurable
-    def get_timestamp_iso(year, julian_day, hours, timezone='+0000'):
+    def format_timestamp_iso(timestamps, timezone='+0000'):
 
-        year = year.astype(int).astype(str)
-        julian_day = julian_day.astype(int).astype(str)
-        hours = (hours * 24).astype(int).astype(str)
+        # Assign timestamps_iso to timestamps formatted as '2020-11-03T00:00:00'
+        timestamps_iso = np.datetime_as_string(timestamps, unit='s')
 
-        # Combine year, julian_day, hours into timestamps
-        timestamps = np.stack((year, julian_day, hours), axis=1)
+        # Replace 'T' separator by a space and append timezone, for example '+00:00'
+        return np.char.add(np.char.replace(timestamps_iso, 'T', ' '), f'{timezone[:3]}:{timezone[3:]}')
 
-        # Assign timestamps_formatted to list of timestamps in ISO format
-        timestamps_formatted = []
-        for index in range(len(timestamps)):
+    # Returns rows of station_data up to the last second table part and the rows after it (at most MAX_PENDING_ROWS),
+    # the rows after the last second table part can only be paired by get_station_array() with rows of a later chunk,
+    # they are copied so the chunk they come from can be released
+    @staticmethod
+    def split_pending_rows(station_data):
 
-            timestamp = f'{timestamps[index][0]}-' \
-                        f'{(timestamps[index][1]).zfill(3)}-' \
-                        f'{(timestamps[index][2]).zfill(2)} ' \
-                        f'{timezone}'
+        # Assign constants for column indices in input numpy array, same as get_station_array()
+        INPUT_YEAR1_COL = 0
+        INPUT_WIND_DIRECTION_COL = 9
 
-            # Convert timestamp string to datetime object and append to timestamps_formatted
-            dt_object = datetime.strptime(timestamp, '%Y-%j-%H %z')
-            timestamps_formatted.append(dt_object)
+        # Assign other constants
+        MAX_DEGREES_WIND = 360
 
-        # Convert timestamps_formattted into Numpy 1d array timestamps_iso
-        timestamps_iso = np.array(timestamps_formatted)
+        # Assign table_2_indices to indices of rows that are the second part of the two part table
+        table_2_indices = np.flatnonzero(
+            (station_data[:, INPUT_YEAR1_COL] != station_data[:, INPUT_WIND_DIRECTION_COL]) &
+            (station_data[:, INPUT_WIND_DIRECTION_COL] <= MAX_DEGREES_WIND))
 
-        return timestamps_iso
+        # Assign end to the row after the last second table part
+        end = table_2_indices[-1] + 1 if len(table_2_indices) != 0 else 0
+
+        return station_data[:end, :], station_data[end:, :][-MAX_PENDING_ROWS:, :].copy()
 
     # Returns station_array which is the array for the data from each station
     # created from the combined first and second parts of the input table
@@ -478,14 +920,23 @@ class ArgosCleaner(Cleaner):
         MAX_DEGREES_WIND = 360
         INITIALIZER_VAL = 999
 
-        # Assign unique_array to unique_rows after INPUT_STATION_NUM_COL
-        # Assign unique_indices to indices of unique rows after INPUT_STATION_NUM_COL
-        # because data may repeat with different time signature
-        unique_array, unique_indices = np.unique(station_data[:, INPUT_STATION_NUM_COL:],
-                                                 axis=0, return_index=True)
+        # Assign station_data to float64 rows, rows of compact arrays are widened for this station only
+        station_data = widen_argos_array(station_data)
 
-        # Assign station_data to station_data sorted by unique_indcies
-        station_data = station_data[np.sort(unique_indices), :]
+        # Assign unique_rows to first occurrences of rows after INPUT_STATION_NUM_COL
+        # because data may repeat with different time signature
+        # decode_argos already removed these duplicates from its output, this pass is kept for the rows that did not
+        # go through it together: rows carried from the previous chunk with the rows of the next chunk (the keys of
+        # remove_seen_transmissions are forgotten after 'stream_dedup_days') and compact rows, which can become equal
+        # when converted to float32. It keeps the first row in time order, as the pairing below expects, and does not
+        # copy station_data when there is no duplicate
+        unique_rows = get_unique_rows(station_data[:, INPUT_STATION_NUM_COL:])
+
+        # Assign station_data to unique rows, in the same order
+        if not unique_rows.all():
+            logger.info(f' Removed {len(unique_rows) - unique_rows.sum()} duplicated transmissions '
+                        f'from Station {station_id}')
+            station_data = station_data[unique_rows, :]
 
         # Assign table_1_indices to indices of rows that are the first part of the two part table
         # and have integer Julian day (records with decimal julian day are erroneous)
@@ -527,22 +978,18 @@ class ArgosCleaner(Cleaner):
         # Assign table_2_columns to columns in table 2 raw
         table_2_columns = np.concatenate((np.arange(9, 14), np.array([22]), np.arange(14, 22)))
 
-        # Loop through records
-        for j in range(num_records):
-            # Find second table parts occurring after associated first part
-            table_2_current_indices = np.argwhere(
-                station_data[table_1_indices[j]:, 0] != station_data[table_1_indices[j]:, 9])
-
-            table_1_index = table_1_indices[j]
+        # Assign table_2_rows to rows that can be second table parts (year columns are different)
+        table_2_rows = np.flatnonzero(station_data[:, INPUT_YEAR1_COL] != station_data[:, INPUT_YEAR2_COL])
 
-            # Assign table_2_index to the closest table 2 line
-            table_2_index = table_1_indices[j] + table_2_current_indices[INPUT_YEAR1_COL]
+        # Assign table_2_paired_indices to the closest table 2 line occurring after each table 1 line,
+        # table 1 lines are never in table_2_rows so all records are paired in one search
+        table_2_paired_indices = table_2_rows[np.searchsorted(table_2_rows, table_1_indices)]
 
-            # Combine corresponding parts of table 1 and table 2 into an array within combined_array
-            combined_array[j, combined_array_columns] = np.concatenate(
-                (np.array([station_id]),
-                 station_data[table_1_index, table_1_columns],
-                 station_data[table_2_index, table_2_columns]))
+        # Combine corresponding parts of table 1 and table 2 into the rows of combined_array
+        combined_array[:, combined_array_columns] = np.column_stack(
+            (np.full(num_records, station_id),
+             station_data[np.ix_(table_1_indices, table_1_columns)],
+             station_data[np.ix_(table_2_paired_indices, table_2_columns)]))
 
         # Assign station_array to combined_array filtered for realistic years and Julian days
         station_array = combined_array[(combined_array[:, COMBINED_YEAR_COL] > COMBINED_YEAR_MIN) &
@@ -551,3 +998,30 @@ class ArgosCleaner(Cleaner):
                                        (combined_array[:, COMBINED_JULIAN_DAY_COL] < MAX_DAYS_YEAR), :]
 
         return station_array
+
+
+# Cleaner of the worker processes of the pools of `Cleaner.get_executor`
+_worker_cleaner = None
+
+
+def _set_worker_cleaner(cleaner):
+    """
+    Initializer of the worker processes of `Cleaner.get_executor`.
+    :param cleaner: Cleaner copied to the worker process
+    """
+    global _worker_cleaner
+    _worker_cleaner = cleaner
+
+
+def _call_worker_cleaner(method_name, arguments, measured=False):
+    """
+    Call a method of the cleaner of the worker process, used by `Cleaner.map_sections`.
+    :param method_name: name of the cleaner method
+    :param arguments: tuple of the arguments of the method, metrics is passed as keyword argument
+    :param measured: measure the stages of the method with a Metrics of the worker process
+    :return: return value of the method and list of the records of the metrics (empty if measured is False)
+    """
+    metrics = Metrics() if measured else None
+    result = getattr(_worker_cleaner, method_name)(*arguments, metrics=metrics)
+
+    return result, metrics.records if measured else []
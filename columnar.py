@@ -0,0 +1,257 @@
+#
+# Columnar binary files of the cleaned station data, written alongside the NEAD files.
+#
+# A file has a 'timestamp' column (datetime64[s], UTC) and one float64 column per data field of the NEAD file
+# (display_description of the NEAD header without the timestamp), no_data values are NaN. The NEAD header of the
+# station is stored as file metadata.
+#   npz: uncompressed numpy archive, numpy.load() reads the columns lazily so single columns can be selected
+#   parquet: Apache Parquet file (requires pyarrow), can be memory-mapped and read by column
+# Files are replaced at once when complete. In append mode each write only writes the new records to a part file next
+# to the file ('{stem}.part{number}.npz' with the timestamps and one 2d array of the values, whatever the format of the
+# file), `compact_columnar` merges the parts into the file once, for example at the end of a run, so the file is not
+# read and rewritten for every chunk.
+
+import os
+import glob
+from datetime import datetime
+from pathlib import Path
+
+import numpy
+
+import logging
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# Suffixes of the files of each format
+COLUMNAR_FORMATS = {'npz': '.npz', 'parquet': '.parquet'}
+
+# Name of the timestamp column
+TIMESTAMP_COLUMN = 'timestamp'
+
+# Prefix of the metadata arrays of npz files
+NPZ_METADATA_PREFIX = '__metadata__'
+
+# Infix of the names of the part files written in append mode, followed by the number of the part, and their suffix
+PART_INFIX = '.part'
+PART_SUFFIX = '.npz'
+
+
+def get_columnar_path(nead_filename, columnar_format):
+    """
+    :param nead_filename: path of the NEAD file of the station data
+    :param columnar_format: 'npz' or 'parquet'
+    :return: path of the columnar file, the NEAD file path with the suffix of the format
+    """
+    if columnar_format not in COLUMNAR_FORMATS:
+        raise ValueError(f'Unknown columnar format {columnar_format!r}, formats are {", ".join(COLUMNAR_FORMATS)}')
+    if columnar_format == 'parquet' and pyarrow is None:
+        raise ValueError('Columnar format parquet requires pyarrow, install pyarrow or use npz')
+
+    return Path(nead_filename).with_suffix(COLUMNAR_FORMATS[columnar_format])
+
+
+def write_columnar(path, timestamps, data, names, metadata, no_data=999, append=False):
+    """
+    Write the cleaned data of a station to a columnar file, the format depends on the suffix of path.
+    :param path: path of the file, as returned by `get_columnar_path`
+    :param timestamps: numpy datetime64 array of the timestamps
+    :param data: 2d float numpy array of the filtered values, one column per name
+    :param names: list of the column names
+    :param metadata: dictionary of strings stored with the file, for example {'nead_header': ...}
+    :param no_data: value of data written as NaN
+    :param append: write the records to the next part file of path, merged into path by `compact_columnar`, else the
+        file is replaced. If the names or metadata of the existing file (or of its last part) are not names and
+        metadata, the existing file is compacted and kept with the suffix '_{datetime}' and a new file is started
+    :return: path of the file written, a part file in append mode
+    """
+    path = Path(path)
+    timestamps = timestamps.astype('datetime64[s]')
+    values = numpy.where(data == no_data, numpy.nan, data)
+
+    if append:
+        # Assign schema to the column names and metadata of the last part, or of the file if it has no parts
+        part_paths = get_part_paths(path)
+        schema = None
+        if part_paths:
+            schema = _read_part(part_paths[-1], schema_only=True)
+        elif path.is_file():
+            schema = read_columnar_schema(path)
+
+        if schema is not None and schema != (list(names), metadata):
+            compact_columnar(path)
+            current_datetime_string = datetime.now().strftime("%Y-%m-%d_%H%M")
+            renamed_path = path.with_name(f'{path.stem}_{current_datetime_string}{path.suffix}')
+            logger.warning(f' Metadata of {path} changed, existing file renamed to {renamed_path}')
+            os.replace(path, renamed_path)
+            part_paths = []
+
+        part_number = int(part_paths[-1].stem[len(path.stem) + len(PART_INFIX):]) + 1 if part_paths else 1
+        part_path = path.with_name(f'{path.stem}{PART_INFIX}{part_number:06d}{PART_SUFFIX}')
+        _write_part(part_path, timestamps, names, values, metadata)
+
+        return part_path
+
+    _write_columns(path, timestamps, {name: values[:, i] for i, name in enumerate(names)}, metadata)
+
+    return path
+
+
+def compact_columnar(path):
+    """
+    Merge the part files of path written by `write_columnar` in append mode into path and remove them. Records whose
+    timestamps are already in the file or in an earlier part are not merged, the records are in timestamp order.
+    :param path: path of the file, as returned by `get_columnar_path`
+    :return: path of the file
+    """
+    path = Path(path)
+    part_paths = get_part_paths(path)
+    if not part_paths:
+        return path
+
+    # Assign timestamps and values to the records of the file and of the parts, in the order they were written
+    timestamps, values = [], []
+    if path.is_file():
+        file_timestamps, file_columns, metadata = read_columnar(path)
+        timestamps.append(file_timestamps)
+        values.append(numpy.column_stack(list(file_columns.values())).reshape(len(file_timestamps), -1))
+    for part_path in part_paths:
+        part_timestamps, names, part_values, metadata = _read_part(part_path)
+        timestamps.append(part_timestamps)
+        values.append(part_values)
+
+    # Assign first_records to the first record of each timestamp, in timestamp order
+    timestamps, first_records = numpy.unique(numpy.concatenate(timestamps), return_index=True)
+    values = numpy.concatenate(values)[first_records]
+
+    _write_columns(path, timestamps, {name: values[:, i] for i, name in enumerate(names)}, metadata)
+    for part_path in part_paths:
+        part_path.unlink()
+    logger.info(f' Merged {len(part_paths)} parts into {path}')
+
+    return path
+
+
+def get_part_paths(path):
+    """
+    :param path: path of a columnar file
+    :return: list of the paths of the part files of path written in append mode, in the order they were written
+    """
+    path = Path(path)
+
+    return sorted(path.parent.glob(f'{glob.escape(path.stem)}{PART_INFIX}*{PART_SUFFIX}'))
+
+
+# Writes the columns to a temporary file replacing path once complete
+def _write_columns(path, timestamps, columns, metadata):
+    temporary_path = path.with_name(path.name + '.tmp')
+    if path.suffix == COLUMNAR_FORMATS['parquet']:
+        _write_parquet(temporary_path, timestamps, columns, metadata)
+    else:
+        _write_npz(temporary_path, timestamps, columns, metadata)
+    os.replace(temporary_path, path)
+
+
+def read_columnar(path, columns=None):
+    """
+    :param path: path of a file written by `write_columnar`
+    :param columns: list of the names of the columns read, None reads all columns
+    :return: numpy datetime64 array of the timestamps, dictionary with column names as keys and float numpy arrays as
+        values (in the order of the file) and dictionary of the metadata
+    """
+    if Path(path).suffix == COLUMNAR_FORMATS['parquet']:
+        return _read_parquet(path, columns)
+
+    return _read_npz(path, columns)
+
+
+def read_columnar_schema(path):
+    """
+    :param path: path of a file written by `write_columnar`
+    :return: list of the column names (without timestamp) and dictionary of the metadata, the columns are not read
+    """
+    if Path(path).suffix == COLUMNAR_FORMATS['parquet']:
+        if pyarrow is None:
+            raise ValueError('Reading parquet files requires pyarrow')
+        schema = pyarrow.parquet.read_schema(path)
+        return [name for name in schema.names if name != TIMESTAMP_COLUMN], \
+            {key.decode(): value.decode() for key, value in (schema.metadata or {}).items()}
+
+    with numpy.load(path, allow_pickle=False) as npz:
+        return [key for key in npz.files if key != TIMESTAMP_COLUMN and not key.startswith(NPZ_METADATA_PREFIX)], \
+            {key[len(NPZ_METADATA_PREFIX):]: str(npz[key]) for key in npz.files if key.startswith(NPZ_METADATA_PREFIX)}
+
+
+def _write_part(path, timestamps, names, values, metadata):
+    arrays = {TIMESTAMP_COLUMN: timestamps, 'names': numpy.array(names), 'values': values}
+    arrays.update({f'{NPZ_METADATA_PREFIX}{key}': numpy.array(value) for key, value in metadata.items()})
+
+    # Written to a temporary file so an interrupted write does not leave an incomplete part
+    temporary_path = path.with_name(path.name + '.tmp')
+    with open(temporary_path, 'wb') as file:
+        numpy.savez(file, **arrays)
+    os.replace(temporary_path, path)
+
+
+# Returns timestamps, column names, 2d array of the values and metadata of a part file,
+# or column names and metadata if schema_only
+def _read_part(path, schema_only=False):
+    with numpy.load(path, allow_pickle=False) as npz:
+        names = npz['names'].tolist()
+        metadata = {key[len(NPZ_METADATA_PREFIX):]: str(npz[key]) for key in npz.files
+                    if key.startswith(NPZ_METADATA_PREFIX)}
+        if schema_only:
+            return names, metadata
+
+        return npz[TIMESTAMP_COLUMN], names, npz['values'], metadata
+
+
+def _write_npz(path, timestamps, columns, metadata):
+    arrays = {TIMESTAMP_COLUMN: timestamps, **columns}
+    arrays.update({f'{NPZ_METADATA_PREFIX}{key}': numpy.array(value) for key, value in metadata.items()})
+
+    # A file object keeps numpy from appending '.npz' to the temporary path
+    with open(path, 'wb') as file:
+        numpy.savez(file, **arrays)
+
+
+def _read_npz(path, columns=None):
+    with numpy.load(path, allow_pickle=False) as npz:
+        metadata = {key[len(NPZ_METADATA_PREFIX):]: str(npz[key]) for key in npz.files
+                    if key.startswith(NPZ_METADATA_PREFIX)}
+        names = [key for key in npz.files if key != TIMESTAMP_COLUMN and not key.startswith(NPZ_METADATA_PREFIX)]
+        if columns is not None:
+            names = [name for name in names if name in columns]
+
+        return npz[TIMESTAMP_COLUMN], {name: npz[name] for name in names}, metadata
+
+
+def _write_parquet(path, timestamps, columns, metadata):
+    table = pyarrow.table({TIMESTAMP_COLUMN: pyarrow.array(timestamps, type=pyarrow.timestamp('s', tz='UTC')),
+                           **{name: pyarrow.array(values, from_pandas=True) for name, values in columns.items()}})
+    table = table.replace_schema_metadata({key.encode(): value.encode() for key, value in metadata.items()})
+
+    pyarrow.parquet.write_table(table, path)
+
+
+def _read_parquet(path, columns=None):
+    if pyarrow is None:
+        raise ValueError('Reading parquet files requires pyarrow')
+
+    read_columns = None if columns is None else [TIMESTAMP_COLUMN] + [name for name in columns
+                                                                        if name != TIMESTAMP_COLUMN]
+    table = pyarrow.parquet.read_table(path, columns=read_columns, memory_map=True)
+    metadata = {key.decode(): value.decode() for key, value in (table.schema.metadata or {}).items()}
+
+    timestamps = table.column(TIMESTAMP_COLUMN).to_numpy().astype('datetime64[s]')
+    names = [name for name in table.column_names if name != TIMESTAMP_COLUMN]
+
+    return timestamps, {name: table.column(name).to_numpy() for name in names}, metadata
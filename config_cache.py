@@ -0,0 +1,71 @@
+#
+# Cache of the files read by every iteration and station: the NEAD headers and the cleaner of the daemon.
+#
+# The value parsed from a file is kept with the modification time (nanoseconds) and size of the file, the file is only
+# read and parsed again when one of them changes. Unchanged files cost a stat() per lookup and edited files are picked
+# up by the next lookup, also between the iterations of the daemon.
+
+import threading
+import configparser
+from pathlib import Path
+
+import logging
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+class FileCache(object):
+
+    def __init__(self):
+        self._entries = {}
+        # Reentrant so parse functions can get other files from the cache
+        self._lock = threading.RLock()
+
+    # Returns parse(path), parsed again only if the modification time or size of the file changed since the last call
+    # with the same path and parse function, returns None if the file does not exist
+    # Cached values are shared by all callers and must not be modified
+    def get(self, path, parse):
+        key = (str(Path(path).absolute()), parse)
+
+        try:
+            stat = Path(path).stat()
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        # A file is parsed once even if several threads need it at the same time
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != signature:
+                entry = (signature, parse(path))
+                self._entries[key] = entry
+
+        return entry[1]
+
+    # Removes all cached values
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Cache shared by the modules of the process
+file_cache = FileCache()
+
+
+def parse_config(path):
+    """
+    Parse a config file, each call reads the file and returns a new ConfigParser the caller can modify.
+    Config files are small, parsing them costs less than keeping a copy of a cached ConfigParser for each caller.
+    :param path: path of a config file
+    :return: ConfigParser of the file, empty if the file does not exist
+    """
+    config = configparser.ConfigParser()
+    config.read(Path(path))
+
+    return config
+
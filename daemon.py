@@ -0,0 +1,113 @@
+#
+# Asyncio scheduler running the stages of a processing iteration at a fixed interval.
+#
+# Iterations start every interval from the start of the daemon, so slow iterations do not shift the next ones.
+# Each stage runs in a thread and processes one iteration at a time, so a stage never overlaps itself, but a stage
+# can process the next iteration while the following stages still process the previous one.
+# An iteration is skipped if the first stage is still busy with two iterations when it should start.
+# SIGINT and SIGTERM stop the scheduler, iterations already started go through all stages before the daemon exits.
+
+import asyncio
+import signal
+import time
+from datetime import datetime
+
+import logging
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+class Daemon(object):
+
+    # interval is the number of seconds between the starts of two iterations
+    # stages is a list of (name, function) tuples, the first function gets the start time of the iteration,
+    # the next functions get the return value of the previous stage
+    def __init__(self, interval, stages):
+        self.interval = interval
+        self.stages = stages
+        self._loop = None
+        self._stop_event = None
+
+    # Runs the daemon until stop() is called or a SIGINT or SIGTERM signal is received
+    def run(self):
+        asyncio.run(self._run())
+
+    # Stops scheduling new iterations, can be called from any thread
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+
+    async def _run(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self._loop.add_signal_handler(signal_number, self._stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                # Signal handlers can only be added in the main thread on Unix
+                pass
+
+        # Queues between the stages hold at most one iteration, None stops the stage
+        queues = [asyncio.Queue(maxsize=1) for _ in self.stages] + [None]
+
+        await asyncio.gather(self._schedule(queues[0]),
+                             *[self._run_stage(name, function, queues[i], queues[i + 1])
+                               for i, (name, function) in enumerate(self.stages)])
+
+        logger.info(' Daemon stopped')
+
+    # Puts the start time of an iteration into queue every self.interval seconds until the daemon is stopped
+    async def _schedule(self, queue):
+        start = self._loop.time()
+        iteration = 0
+
+        while not self._stop_event.is_set():
+
+            start_time = time.time()
+            if queue.full():
+                logger.warning(f' Skipping iteration {iteration}, previous iterations are still running')
+            else:
+                logger.info(" **************************** START DATA PROCESSING ITERATION (start time: {0}) "
+                            "**************************** "
+                            .format(datetime.fromtimestamp(start_time).strftime('%Y-%m-%d %H:%M:%S')))
+                queue.put_nowait(start_time)
+
+            # Next iteration starts at a multiple of the interval from the start, missed iterations are skipped
+            iteration = int((self._loop.time() - start) // self.interval) + 1
+            wait_time = start + iteration * self.interval - self._loop.time()
+            logger.info(f' SLEEPING {int(wait_time)} seconds before next iteration...\n')
+
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=wait_time)
+            except asyncio.TimeoutError:
+                pass
+
+        await queue.put(None)
+
+    # Runs function in a thread on each item of input_queue and puts the result into output_queue,
+    # a failed iteration is logged and dropped so the daemon keeps running
+    @staticmethod
+    async def _run_stage(name, function, input_queue, output_queue):
+        while True:
+            item = await input_queue.get()
+
+            if item is None:
+                break
+
+            stage_start = time.time()
+            try:
+                result = await asyncio.to_thread(function, item)
+            except Exception:
+                logger.exception(f' Stage {name} failed, iteration is dropped')
+                continue
+
+            logger.info(f' Stage {name} took {time.time() - stage_start:.1f} seconds')
+
+            if output_queue is not None:
+                await output_queue.put(result)
+
+        if output_queue is not None:
+            await output_queue.put(None)
@@ -0,0 +1,329 @@
+#
+# FTP synchronization functions for ARGOS satellite raw files.
+#
+# Files downloaded from the FTP server are kept in a content-addressed cache (file name is the SHA-256 of the
+# content) and a manifest records the name, size, modification timestamp and digest of each file.
+# A file is only downloaded again if its size or timestamp on the FTP server changed.
+# Metadata queries and downloads run concurrently on a small pool of FTP connections.
+
+import os
+import json
+import time
+import queue
+import hashlib
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ftplib import FTP, error_perm, all_errors
+from operator import itemgetter
+
+import logging
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+# Name of the manifest file in the cache directory
+MANIFEST_NAME = 'manifest.json'
+
+# Name of the directory with the content-addressed files in the cache directory
+BLOBS_DIR = 'blobs'
+
+# Size of the chunks used to hash and transfer files
+CHUNK_SIZE = 65536
+
+
+def read_manifest(cache_dir):
+    """
+    Read the manifest of the files downloaded from the FTP server.
+    :param cache_dir: path to the cache directory
+    :return: dictionary with the file names as keys and dictionaries with 'size', 'timestamp' and 'digest' as values,
+        empty if the manifest does not exist or can not be read
+    """
+    manifest_path = Path(cache_dir, MANIFEST_NAME)
+
+    if not manifest_path.is_file():
+        return {}
+
+    try:
+        with open(manifest_path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        logger.warning(f' Could not read FTP manifest {manifest_path}, all files will be downloaded again: {e}')
+        return {}
+
+
+def write_manifest(manifest, cache_dir):
+    """
+    Write the manifest of the files downloaded from the FTP server.
+    The manifest is written to a temporary file first so an interrupted run never leaves a truncated manifest.
+    :param manifest: dictionary returned by `read_manifest`
+    :param cache_dir: path to the cache directory
+    """
+    manifest_path = Path(cache_dir, MANIFEST_NAME)
+    temporary_path = manifest_path.with_suffix('.tmp')
+
+    with open(temporary_path, 'w') as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+
+    os.replace(temporary_path, manifest_path)
+
+
+def get_blob_path(cache_dir, digest):
+    """
+    :param cache_dir: path to the cache directory
+    :param digest: SHA-256 hexadecimal digest of the file content
+    :return: path of the cached file with this content
+    """
+    return Path(cache_dir, BLOBS_DIR, digest)
+
+
+class FtpConnectionPool(object):
+
+    def __init__(self, host, user, password, port=21, size=1, timeout=60):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.port = port
+        self.size = size
+        self.timeout = timeout
+        self._idle_connections = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        ftp_server = FTP(timeout=self.timeout)
+        ftp_server.connect(self.host, self.port)
+        ftp_server.login(self.user, self.password)
+        return ftp_server
+
+    # Yields a connected ftplib.FTP object, at most self.size connections are used at the same time
+    # Connections are reused, a connection that raised an exception is closed and not reused
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                ftp_server = self._idle_connections.get_nowait()
+            except queue.Empty:
+                ftp_server = self._connect()
+
+            try:
+                yield ftp_server
+            except error_perm:
+                # Permanent errors are replies of the FTP server, the connection can still be used
+                self._idle_connections.put(ftp_server)
+                raise
+            except BaseException:
+                ftp_server.close()
+                raise
+
+            self._idle_connections.put(ftp_server)
+
+    # Closes all idle connections
+    def close(self):
+        while True:
+            try:
+                ftp_server = self._idle_connections.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                ftp_server.quit()
+            except all_errors:
+                ftp_server.close()
+
+
+def run_with_retries(pool, function, retries, retry_delay=1.0):
+    """
+    Call function with a connection of the pool, retry with a new connection if a temporary FTP error occurs.
+    Permanent errors (error_perm, for example a missing file or an unsupported command) are raised immediately.
+    :param pool: FtpConnectionPool
+    :param function: function with a connected ftplib.FTP object as single argument
+    :param retries: number of times the call is repeated after an FTP error
+    :param retry_delay: seconds to wait before the first retry, doubled after each retry
+    :return: the return value of function
+    """
+    for attempt in range(retries + 1):
+        try:
+            with pool.connection() as ftp_server:
+                return function(ftp_server)
+        except error_perm:
+            raise
+        except all_errors as e:
+            if attempt == retries:
+                raise
+            logger.warning(f' FTP error, retrying ({attempt + 1}/{retries}): {e}')
+            time.sleep(retry_delay * 2 ** attempt)
+
+
+def get_ftp_file_info(ftp_server, name):
+    """
+    :param ftp_server: connected ftplib.FTP object
+    :param name: name of the file on the FTP server
+    :return: dictionary with 'name', 'size' (None if unknown) and 'timestamp' (YYYYMMDDHHMMSS string)
+    """
+    timestamp = ftp_server.voidcmd(f'MDTM {name}')[4:].strip()
+    try:
+        ftp_server.voidcmd('TYPE I')
+        size = ftp_server.size(name)
+    except error_perm:
+        size = None
+
+    return {'name': name, 'size': size, 'timestamp': timestamp}
+
+
+def list_ftp_files(pool, retries=3):
+    """
+    List the files on the FTP server with their size and modification timestamp.
+    Uses a single MLSD command if the server supports it, else NLST and concurrent MDTM and SIZE commands per file.
+    :param pool: FtpConnectionPool
+    :param retries: number of times an FTP command is repeated after an FTP error
+    :return: list of dictionaries with 'name', 'size' (None if unknown) and 'timestamp' (YYYYMMDDHHMMSS string)
+    """
+    def mlsd(ftp_server):
+        return list(ftp_server.mlsd(facts=['type', 'size', 'modify']))
+
+    try:
+        ftp_list = []
+        for name, facts in run_with_retries(pool, mlsd, retries):
+            if facts.get('type', 'file') == 'file':
+                size = int(facts['size']) if 'size' in facts else None
+                ftp_list.append({'name': name, 'size': size, 'timestamp': facts.get('modify', '')[:14]})
+        return ftp_list
+
+    except error_perm:
+        logger.info(' FTP server does not support MLSD, listing files with NLST and MDTM')
+
+    names = run_with_retries(pool, lambda ftp_server: ftp_server.nlst(), retries)
+
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        ftp_list = list(executor.map(
+            lambda name: run_with_retries(pool, lambda ftp_server: get_ftp_file_info(ftp_server, name), retries),
+            names))
+
+    return ftp_list
+
+
+def get_latest_ftp_files(ftp_list, downloads_number):
+    """
+    :param ftp_list: list returned by `list_ftp_files`
+    :param downloads_number: number of files to return
+    :return: the downloads_number most recently modified files of ftp_list, most recent first
+    """
+    return sorted(ftp_list, key=itemgetter('timestamp'), reverse=True)[:downloads_number]
+
+
+def is_cached(ftp_file, manifest, cache_dir):
+    """
+    :param ftp_file: dictionary with 'name', 'size' and 'timestamp' of the file on the FTP server
+    :param manifest: dictionary returned by `read_manifest`
+    :param cache_dir: path to the cache directory
+    :return: True if the file did not change since it was downloaded and its content is still in the cache
+    """
+    entry = manifest.get(ftp_file['name'])
+
+    return entry is not None \
+        and entry['timestamp'] == ftp_file['timestamp'] \
+        and entry['size'] == ftp_file['size'] \
+        and get_blob_path(cache_dir, entry['digest']).is_file()
+
+
+def download_to_cache(ftp_server, name, cache_dir):
+    """
+    Download a file from the FTP server to the content-addressed cache.
+    :param ftp_server: connected ftplib.FTP object
+    :param name: name of the file on the FTP server
+    :param cache_dir: path to the cache directory
+    :return: SHA-256 hexadecimal digest of the downloaded file
+    """
+    blobs_dir = Path(cache_dir, BLOBS_DIR)
+    blobs_dir.mkdir(parents=True, exist_ok=True)
+    temporary_path = Path(blobs_dir, f'{name}.part')
+
+    sha256 = hashlib.sha256()
+
+    with open(temporary_path, 'wb') as file:
+
+        def write(chunk):
+            sha256.update(chunk)
+            file.write(chunk)
+
+        ftp_server.retrbinary(f'RETR {name}', write, blocksize=CHUNK_SIZE)
+
+    digest = sha256.hexdigest()
+    os.replace(temporary_path, get_blob_path(cache_dir, digest))
+
+    return digest
+
+
+def sync_ftp_files(pool, ftp_files, cache_dir, retries=3):
+    """
+    Download the new or changed files concurrently to the cache, yield each file as soon as it is available.
+    Files already in the cache are yielded first, downloaded files in the order the downloads finish.
+    Once all files are available the manifest is updated, entries and cached files of files not in ftp_files
+    are removed.
+    :param pool: FtpConnectionPool, the number of concurrent downloads is the size of the pool
+    :param ftp_files: list of dictionaries with 'name', 'size' and 'timestamp' of the files to synchronize
+    :param cache_dir: path to the cache directory
+    :param retries: number of times a download is repeated after an FTP error
+    :return: generator of (index in ftp_files, path to the cached file) tuples
+    """
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(cache_dir)
+
+    downloads = []
+    for index, ftp_file in enumerate(ftp_files):
+        if is_cached(ftp_file, manifest, cache_dir):
+            yield index, get_blob_path(cache_dir, manifest[ftp_file['name']]['digest'])
+        else:
+            downloads.append(index)
+
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+
+        futures = {}
+        for index in downloads:
+            name = ftp_files[index]['name']
+            future = executor.submit(run_with_retries, pool,
+                                     lambda ftp_server, name=name: download_to_cache(ftp_server, name, cache_dir),
+                                     retries)
+            futures[future] = index
+
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                ftp_file = ftp_files[index]
+                digest = future.result()
+                manifest[ftp_file['name']] = {'size': ftp_file['size'], 'timestamp': ftp_file['timestamp'],
+                                              'digest': digest}
+                yield index, get_blob_path(cache_dir, digest)
+
+        finally:
+            # Do not start pending downloads if the consumer stopped or a download failed
+            for future in futures:
+                future.cancel()
+
+    logger.info(f' Downloaded {len(downloads)} new or changed files from FTP server, '
+                f'{len(ftp_files) - len(downloads)} files already in cache')
+
+    # Only keep files that are still synchronized
+    names = {ftp_file['name'] for ftp_file in ftp_files}
+    manifest = {name: entry for name, entry in manifest.items() if name in names}
+    write_manifest(manifest, cache_dir)
+    prune_cache(manifest, cache_dir)
+
+
+def prune_cache(manifest, cache_dir):
+    """
+    Remove the cached files that are not referenced by the manifest.
+    :param manifest: dictionary returned by `read_manifest`
+    :param cache_dir: path to the cache directory
+    """
+    blobs_dir = Path(cache_dir, BLOBS_DIR)
+
+    if not blobs_dir.is_dir():
+        return
+
+    digests = {entry['digest'] for entry in manifest.values()}
+    for blob in blobs_dir.iterdir():
+        if blob.name not in digests:
+            blob.unlink()
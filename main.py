@@ -24,21 +24,27 @@
 # repeatInterval and localInput:
 #   main(['-r 10', '-l True'])
 #
+# cProfile profile of one iteration written to profile.prof:
+#   main(['-p', 'cprofile'])
+#
 
 
 import time
 import argparse
-from pathlib import Path
-import configparser
 from datetime import datetime
 import os
 from dotenv import load_dotenv
-from ftplib import FTP
-from operator import itemgetter
 import pandas
 
-from process_argos import read_argos, decode_argos
+from process_argos import ARGOS_COLUMNS_NAMES, parse_argos_files, decode_argos, parse_argos_chunks, \
+    decode_argos_chunks, compact_argos_array
 from cleaner import ArgosCleaner
+from store import TransmissionStore, get_file_digest
+from ftp_sync import FtpConnectionPool, list_ftp_files, get_latest_ftp_files, sync_ftp_files
+from daemon import Daemon
+from metrics import Metrics, measure, measure_iter, profile_iteration
+from config_cache import parse_config, file_cache
+from concurrent.futures import ProcessPoolExecutor
 
 import logging
 
@@ -49,16 +55,21 @@ logger.setLevel(logging.DEBUG)
 
 def get_parser():
     parser = argparse.ArgumentParser("ArgosProcessing")
-    parser.add_argument('--repeatInterval', '-r', help='Run continuously every <interval> minutes')
+    parser.add_argument('--repeatInterval', '-r', help='Run continuously as a daemon every <interval> minutes, '
+                                                       'stop with SIGINT or SIGTERM')
     parser.add_argument('--localInput', '-l', help='Any string used in this argument will load local input files '
                                                    'designated in config and skip downloading files from web')
+    parser.add_argument('--profile', '-p', choices=['cprofile', 'tracemalloc'],
+                        help='Profile a single iteration (first run of each stage in daemon mode) with '
+                             'cProfile or tracemalloc')
+    parser.add_argument('--profileOutput', default='profile',
+                        help='Path of the profile without suffix, default profile (.prof or .txt)')
     return parser
 
 
+# Returns config parsed from the file, each call reads the file again
 def read_config(config_path: str):
-    config_file = Path(config_path)
-    config = configparser.ConfigParser()
-    config.read(config_file)
+    config = parse_config(config_path)
     logger.info(f' Read configuration file: {config_path}')
 
     if len(config.sections()) < 1:
@@ -68,108 +79,291 @@ def read_config(config_path: str):
     return config
 
 
-# Returns list of file paths to local or downloaded input data file(s)
-def get_input_data(config, local_input):
+# Yields (index, path) tuples of local or downloaded input data file(s) as soon as each file is available,
+# index is the position of the file in the list of input files, most recent file first
+# ftp_pool is an FtpConnectionPool kept open by the caller, if None a pool is created and closed for this call
+def get_input_data(config, local_input, ftp_pool=None):
 
     # If command line localInput argument passed (with any string) assign data_file to 'data_local' from config
     if local_input:
         # TODO test this option
         data_files = config.get('DEFAULT', 'data_local')
         logger.info(f' Skipping downloading input data, using local file(s): {data_files}')
+        yield from enumerate([data_files])
 
     # Else retreive data from FTP server
     else:
 
-        # Load and assign FTP server credentials from .env file
-        load_dotenv('.env')
-        ftp_host = os.getenv('FTP_HOST')
-        ftp_user = os.getenv('FTP_USER')
-        ftp_password = os.getenv('FTP_PASSWORD')
+        # Assign number of retries of failed FTP commands
+        ftp_retries = config.getint('DEFAULT', 'ftp_retries', fallback=0)
+
+        # Create pool of connections to FTP server
+        own_pool = ftp_pool is None
+        if own_pool:
+            ftp_pool = get_ftp_pool(config)
 
-        # Connect to FTP server
-        ftp_server = FTP(ftp_host, ftp_user, ftp_password)
+        try:
+            # Assign ftp_source_list to dictionaries of names, sizes and timestamps of FTP server files
+            ftp_source_list = list_ftp_files(ftp_pool, ftp_retries)
 
-        # Get a list of names of files on FTP server
-        ftp_names = ftp_server.nlst()
+            # TODO add validator that makes sure 'ftp_downloads_number' can be converted to integer
+            # Assign list of 'ftp_downloads_number' (from config) recently modified files on FTP server
+            ftp_downloads_number = int(config.get('DEFAULT', 'ftp_downloads_number'))
+            ftp_list = get_latest_ftp_files(ftp_source_list, ftp_downloads_number)
 
-        # Assign ftp_source_list to dictionaries of names and timestamps of FTP server files
-        ftp_source_list = []
-        for name in ftp_names:
-            timestamp = ftp_server.voidcmd(f'MDTM {name}')[4:].strip()
-            ftp_source_list.append({'name': name, 'timestamp': timestamp})
+            # Exclude files with name 'log.txt'
+            ftp_list = [dict_item for dict_item in ftp_list if not dict_item['name'] == 'log.txt']
 
-        # Sort list in descending order by timestamp
-        ftp_list_sorted_desc = sorted(ftp_source_list, key=itemgetter('timestamp'), reverse=True)
+            # Download new or changed FTP files to the cache directory,
+            # yield (index, path) of each cached file as soon as it is available
+            ftp_cache_dir = config.get('DEFAULT', 'ftp_cache_dir', fallback='input_ftp')
+            yield from sync_ftp_files(ftp_pool, ftp_list, ftp_cache_dir, ftp_retries)
 
-        # TODO add validator that makes sure 'ftp_downloads_number' can be converted to integer
-        # Assign list of 'ftp_downloads_number' (from config) recently modified files on FTP server
-        ftp_downloads_number = int(config.get('DEFAULT', 'ftp_downloads_number'))
-        ftp_list = ftp_list_sorted_desc[:ftp_downloads_number]
+        finally:
+            if own_pool:
+                ftp_pool.close()
 
-        # Assign list of file names to download
-        download_list = []
-        for dict_item in ftp_list:
-            download_list.append(dict_item['name'])
+        logger.info(f' Synchronized input data from FTP server')
 
-        # Download FTP files and write to input_ftp directory
-        for download in download_list:
-            with open(f'input_ftp/{download}', "wb") as file:
-                ftp_server.retrbinary(f'RETR {download}', file.write)
 
-        logger.info(f' Downloaded input data from FTP server')
+# Returns FtpConnectionPool to the FTP server of the .env file
+def get_ftp_pool(config):
 
-        # Append file directory 'input_ftp' to downloaded files, exclude files with name 'log.txt'
-        # Assign downloaded file paths to data_files
-        data_files = [f'input_ftp/{i}' for i in download_list if not i == 'log.txt']
+    # Load and assign FTP server credentials from .env file
+    load_dotenv('.env')
+    ftp_host = os.getenv('FTP_HOST')
+    ftp_user = os.getenv('FTP_USER')
+    ftp_password = os.getenv('FTP_PASSWORD')
+    ftp_port = int(os.getenv('FTP_PORT', 21))
 
-    return data_files
+    # Assign number of concurrent FTP connections
+    ftp_connections = config.getint('DEFAULT', 'ftp_connections', fallback=1)
 
+    return FtpConnectionPool(ftp_host, ftp_user, ftp_password, port=ftp_port, size=ftp_connections)
 
-# Removes downloaded FTP files in 'input_ftp' directory except for .gitkeep
-def remove_downloaded_ftp_files():
-    ftp_list = [file for file in os.listdir('input_ftp') if not file.endswith('.gitkeep')]
-    for file in ftp_list:
-        os.remove(os.path.join('input_ftp', file))
 
+# metrics is an optional Metrics of the iteration recording the stages
+def process_argos_data(config, local_input=None, metrics=None):
 
-def process_argos_data(config, local_input=None):
+    # If 'store_path' (from config) is set transmissions are added to a persistent store and only new transmissions
+    # are cleaned, input files already added to the store are not read again
+    store = open_store(config)
 
-    # Get input data
-    data = get_input_data(config, local_input)
+    try:
+        # Get input data
+        data = get_input_data(config, local_input)
 
-    # Assign frames to list of pandas dataframes produced for each file in data by calling read_argos()
-    frames = []
-    for file in data:
-        file_dataframe = read_argos(file, nrows=None)
-        frames.append(file_dataframe)
+        # If 'stream_chunk_rows' (from config) is set process input data chunk by chunk with bounded memory
+        if config.getint('DEFAULT', 'stream_chunk_rows', fallback=0) > 0:
+            stream_data(config, get_cleaner(config), data, store, metrics=metrics)
 
-    # Remove downloaded FTP files
-    # TODO test with local_input option
-    if local_input is None:
-        remove_downloaded_ftp_files()
+        else:
+            # Parse and decode input data as soon as each file is available
+            data_array = decode_input_data(config, data, store, metrics=metrics)
 
-    # Assign argos_dataframe to concatenated dataframes produced from individual files
-    argos_dataframe = pandas.concat(frames)
+            # Clean data and write csv and json files
+            clean_data(config, get_cleaner(config), data_array, store, metrics)
 
-    # Convert argos_dataframe from bits to numbers and assign output dataframe to data_decode
-    data_decode = decode_argos(argos_dataframe, remove_duplicate=True, sort=True)
+    finally:
+        if store is not None:
+            store.close()
 
-    # Convert decoded data pandas dataframe to Numpy array
-    data_array = data_decode.to_numpy()
+    return
 
-    # Clean data and write csv and json files
+
+# Returns ArgosCleaner of the stations config, stations_config is the config already parsed from the file by
+# read_config, if None the cleaner parses the file
+def get_cleaner(stations_config=None):
     stations_config_path = 'config/stations.ini'
-    cleaner = ArgosCleaner(stations_config_path)
+    cleaner = ArgosCleaner(stations_config_path, stations_config)
 
     if not cleaner:
         logger.error(f'Could not load ArgosCleaner')
         raise ValueError(f'Could not load ArgosCleaner')
 
-    # Clean Numpy array data by applying basic filters
-    # Cleaner also writes NEAD files
-    cleaner.clean(data_array)
+    return cleaner
 
-    return
+
+# Returns Metrics of an iteration if 'metrics_log' or 'metrics_file' (from config) is set, else None
+def get_metrics(config):
+    metrics_log = config.getboolean('DEFAULT', 'metrics_log', fallback=False)
+
+    if not metrics_log and not config.get('DEFAULT', 'metrics_file', fallback=''):
+        return None
+
+    return Metrics(log_records=metrics_log)
+
+
+# Logs the summary of the stages of an iteration if 'metrics_log' (from config) is set and appends it to
+# 'metrics_file' (from config) if set
+def write_metrics(config, metrics):
+
+    if metrics is None:
+        return
+
+    if config.getboolean('DEFAULT', 'metrics_log', fallback=False):
+        metrics.log_summary()
+
+    metrics_file = config.get('DEFAULT', 'metrics_file', fallback='')
+    if metrics_file:
+        metrics.write(metrics_file)
+
+
+# Returns TransmissionStore at 'store_path' (from config), None if 'store_path' is not set
+def open_store(config):
+    store_path = config.get('DEFAULT', 'store_path', fallback='')
+
+    if not store_path:
+        return None
+
+    if config.get('DEFAULT', 'nead_mode', fallback='snapshot') != 'append':
+        logger.warning(' Store is used without nead_mode = append, NEAD files only contain new transmissions')
+
+    return TransmissionStore(store_path)
+
+
+# Returns decoded Numpy array of the (index, path) tuples of data,
+# transmissions are added to the store if it is not None, metrics is an optional Metrics of the iteration
+def decode_input_data(config, data, store=None, parse_executor=None, metrics=None):
+
+    # Assign data to the input files measured as they become available, 'input' includes the FTP synchronization
+    data = measure_iter(metrics, 'input', data, get_bytes=lambda item: os.path.getsize(item[1]))
+
+    new_digests = []
+    if store is not None:
+        data = skip_stored_files(data, store, new_digests)
+
+    # Assign argos_array to the parsed rows of all files, in the order of the input files
+    # Files are parsed in 'parse_workers' (from config) processes as soon as they are downloaded,
+    # so 'parse' includes the time waiting for the input files
+    parse_workers = config.getint('DEFAULT', 'parse_workers', fallback=1)
+    with measure(metrics, 'parse') as record:
+        argos_array = parse_argos_files(data, workers=parse_workers, executor=parse_executor)
+        record['rows_out'], record['bytes'] = len(argos_array), argos_array.nbytes
+
+    with measure(metrics, 'decode', rows_in=len(argos_array)) as record:
+        # Assign argos_dataframe to the pandas dataframe of argos_array
+        argos_dataframe = pandas.DataFrame(argos_array, columns=ARGOS_COLUMNS_NAMES)
+
+        # Convert argos_dataframe from bits to numbers and assign output dataframe to data_decode
+        data_decode = decode_argos(argos_dataframe, remove_duplicate=True, sort=True)
+
+        # Convert decoded data pandas dataframe to Numpy array, with compact dtype if 'compact_dtypes' (from config)
+        data_array = data_decode.to_numpy()
+        if config.getboolean('DEFAULT', 'compact_dtypes', fallback=False):
+            data_array = compact_argos_array(data_array)
+        record['rows_out'], record['bytes'] = len(data_array), data_array.nbytes
+
+    # Add decoded transmissions to the store
+    if store is not None:
+        with measure(metrics, 'store_add', rows_in=len(data_array)) as record:
+            new_num = store.add(data_array)
+            store.add_files(new_digests)
+            record['rows_out'] = new_num
+        logger.info(f' Added {new_num} new transmissions from {len(new_digests)} files to store {store.path}')
+
+    return data_array
+
+
+# Cleans decoded Numpy array data_array and writes NEAD files,
+# if store is not None the transmissions of the store that were not cleaned yet are cleaned instead
+# metrics is an optional Metrics of the iteration
+def clean_data(config, cleaner, data_array, store=None, metrics=None):
+
+    # Assign data_array to the transmissions that were not cleaned yet,
+    # 'store_overlap_days' (from config) of older transmissions are included to pair the two part tables
+    if store is not None:
+        with measure(metrics, 'store_pending') as record:
+            data_array = store.get_pending(config.getfloat('DEFAULT', 'store_overlap_days', fallback=2))
+            record['rows_out'], record['bytes'] = len(data_array), data_array.nbytes
+
+    # Clean Numpy array data by applying basic filters
+    # Cleaner also writes NEAD files, 'clean_workers' (from config) stations are cleaned concurrently
+    clean_workers = config.getint('DEFAULT', 'clean_workers', fallback=1)
+    if len(data_array) != 0 or store is None:
+        cleaner.clean(data_array, workers=clean_workers, metrics=metrics)
+
+    # Move high-water mark of the store once the NEAD files are written
+    if store is not None:
+        store.set_cleaned()
+
+
+# Parses, decodes, cleans and writes the (index, path) tuples of data in chunks of 'stream_chunk_rows' (from config)
+# transmissions, so the memory used depends on the size of the largest input file and of the chunks, not on the number
+# of input files. Files are processed from the largest to the smallest index (oldest file first, get_input_data lists
+# the most recent file first), whatever the order they become available in, so the rows carried between chunks are
+# paired with their neighbours in time.
+# If store is not None the chunks are added to the store and the transmissions not cleaned yet are cleaned in chunks
+# metrics is an optional Metrics of the iteration, the stages of the chunks overlap: 'decode' includes 'parse' which
+# includes 'input'
+def stream_data(config, cleaner, data, store=None, parse_executor=None, metrics=None):
+
+    chunk_rows = config.getint('DEFAULT', 'stream_chunk_rows')
+    parse_workers = config.getint('DEFAULT', 'parse_workers', fallback=1)
+    clean_workers = config.getint('DEFAULT', 'clean_workers', fallback=1)
+
+    data = measure_iter(metrics, 'input', data, get_bytes=lambda item: os.path.getsize(item[1]))
+    data = order_oldest_first(data)
+
+    new_digests = []
+    if store is not None:
+        data = skip_stored_files(data, store, new_digests)
+
+    # Assign chunks to the decoded chunks of the parsed files, transmissions of previous chunks received in the last
+    # 'stream_dedup_days' (from config) days are removed, chunks have compact dtype if 'compact_dtypes' (from config)
+    chunks = measure_iter(metrics, 'parse',
+                          parse_argos_chunks(data, chunk_rows, workers=parse_workers, executor=parse_executor))
+    chunks = measure_iter(metrics, 'decode',
+                          decode_argos_chunks(chunks, config.getfloat('DEFAULT', 'stream_dedup_days', fallback=30),
+                                              config.getboolean('DEFAULT', 'compact_dtypes', fallback=False)))
+
+    if store is not None:
+        new_num = sum(store.add(chunk) for chunk in chunks)
+        store.add_files(new_digests)
+        logger.info(f' Added {new_num} new transmissions from {len(new_digests)} files to store {store.path}')
+
+        # Assign chunks to the transmissions of the store that were not cleaned yet
+        chunks = measure_iter(metrics, 'store_pending',
+                              store.iter_pending(config.getfloat('DEFAULT', 'store_overlap_days', fallback=2),
+                                                 chunk_rows))
+
+    # Clean chunks and write NEAD files after each chunk
+    cleaner.clean_chunks(chunks, workers=clean_workers, metrics=metrics)
+
+    # Move high-water mark of the store once the NEAD files are written
+    if store is not None:
+        store.set_cleaned()
+
+
+# Returns function calling function, the first call is profiled with profile_iteration(profile, profile_path)
+def profile_first_run(function, profile, profile_path):
+    calls = []
+
+    def profiled_function(item):
+        if calls:
+            return function(item)
+        calls.append(item)
+        with profile_iteration(profile, profile_path):
+            return function(item)
+
+    return profiled_function
+
+
+# Yields (index, path) tuples of data from the largest to the smallest index, which is from the oldest to the most
+# recent file of get_input_data, once all the files of data are available
+def order_oldest_first(data):
+    yield from sorted(data, key=lambda item: item[0], reverse=True)
+
+
+# Yields (index, path) tuples of data that were not added to the store yet,
+# digests of the yielded files are appended to new_digests
+def skip_stored_files(data, store, new_digests):
+    for index, file in data:
+        digest = get_file_digest(file)
+        if store.has_file(digest):
+            continue
+        new_digests.append(digest)
+        yield index, file
 
 
 def main(args=None):
@@ -189,40 +383,105 @@ def main(args=None):
         logger.error(f'Not valid config file: {config_path}')
         return -1
 
-    repeat = True
-    while repeat:
+    local_input = None
+    # If commandline option localInput is passed assign local_input
+    if args.localInput:
+        local_input = args.localInput
 
-        # Do not repeat if the -r argument is not present
-        repeat = (args.repeatInterval is not None)
+    # If the -r argument is present run as a daemon
+    if args.repeatInterval is not None:
+        run_daemon(config, float(args.repeatInterval) * 60, local_input, args.profile, args.profileOutput, config_path)
+        return 0
 
-        start_time = time.time()
+    start_time = time.time()
 
-        logger.info(" **************************** START DATA PROCESSING ITERATION (start time: {0}) "
-                    "**************************** "
-                    .format(datetime.fromtimestamp(start_time)
-                            .strftime('%Y-%m-%d %H:%M:%S')))
+    logger.info(" **************************** START DATA PROCESSING ITERATION (start time: {0}) "
+                "**************************** "
+                .format(datetime.fromtimestamp(start_time)
+                        .strftime('%Y-%m-%d %H:%M:%S')))
 
-        local_input = None
-        # If commandline option localInput is passed assign local_input
-        if args.localInput:
-            local_input = args.localInput
+    # Process and clean ARGOS data, write NEAD files
+    # If commandline option profile is passed the iteration is profiled with cProfile or tracemalloc
+    metrics = get_metrics(config)
+    with profile_iteration(args.profile, args.profileOutput):
+        process_argos_data(config, local_input, metrics)
+    write_metrics(config, metrics)
 
-        # Process and clean ARGOS data, write NEAD files
-        process_argos_data(config, local_input)
+    # Finish data processing interation
+    exec_time = int(time.time() - start_time)
+    logger.info(f' FINISHED data processing iteration, that took {exec_time} seconds')
 
-        # Finish data processing interation
-        exec_time = int(time.time() - start_time)
-        logger.info(f' FINISHED data processing iteration, that took {exec_time} seconds')
+    return 0
 
-        # If repeat argument passed then set sleep interval
-        if repeat:
-            interval = int(args.repeatInterval) * 60
-            if interval > exec_time:
-                wait_time = interval - exec_time
-                logger.info(f' SLEEPING {wait_time} seconds before next iteration...\n')
-                time.sleep(wait_time)
 
-    return 0
+# Processes ARGOS data every interval seconds until a SIGINT or SIGTERM signal is received
+# The read (download, parse and decode) and clean (clean and write NEAD files) stages of consecutive iterations run
+# concurrently but never overlap themselves, the store, FTP connections and parsing processes are kept between
+# iterations
+# config_path (config of the daemon) is read again by each iteration, the cleaner is only created again when the
+# file changed so the states of the NEAD files (see ArgosCleaner.append_nead) are kept between iterations
+# If profile is 'cprofile' or 'tracemalloc' the first run of each stage is profiled to '{profile_path}_{stage}'
+def run_daemon(config, interval, local_input=None, profile=None, profile_path='profile',
+               config_path='config/stations.ini'):
+
+    store = open_store(config)
+
+    try:
+        # Assign FTP connections and parsing processes kept between iterations
+        ftp_pool = None if local_input else get_ftp_pool(config)
+        parse_workers = config.getint('DEFAULT', 'parse_workers', fallback=1)
+        parse_executor = ProcessPoolExecutor(max_workers=parse_workers) if parse_workers > 1 else None
+
+        # Returns config and cleaner of an iteration, cleaners are cached like the config files they are created from
+        def get_iteration_config():
+            return read_config(config_path), file_cache.get(config_path, ArgosCleaner)
+
+        # Input files are parsed as soon as they are downloaded, the next iteration is only synchronized with the
+        # FTP server once the files are parsed because the synchronization removes old files from the cache
+        # Each iteration has its own config, cleaner and metrics, passed from the read stage to the clean stage
+        def read(start_time):
+            iteration_config, cleaner = get_iteration_config()
+            metrics = get_metrics(iteration_config)
+            data = get_input_data(iteration_config, local_input, ftp_pool)
+            return decode_input_data(iteration_config, data, store, parse_executor, metrics), start_time, \
+                iteration_config, cleaner, metrics
+
+        def clean(decoded):
+            data_array, start_time, iteration_config, cleaner, metrics = decoded
+            clean_data(iteration_config, cleaner, data_array, store, metrics)
+            write_metrics(iteration_config, metrics)
+            logger.info(f' FINISHED data processing iteration, that took {int(time.time() - start_time)} seconds')
+
+        # Streaming processes each chunk through all steps, so an iteration is a single stage
+        def stream(start_time):
+            iteration_config, cleaner = get_iteration_config()
+            metrics = get_metrics(iteration_config)
+            stream_data(iteration_config, cleaner, get_input_data(iteration_config, local_input, ftp_pool), store,
+                        parse_executor, metrics)
+            write_metrics(iteration_config, metrics)
+            logger.info(f' FINISHED data processing iteration, that took {int(time.time() - start_time)} seconds')
+
+        if config.getint('DEFAULT', 'stream_chunk_rows', fallback=0) > 0:
+            stages = [('stream', stream)]
+        else:
+            stages = [('read', read), ('clean', clean)]
+
+        # Profile the first run of each stage, a profile can only trace the thread of its stage
+        if profile:
+            stages = [(name, profile_first_run(function, profile, f'{profile_path}_{name}'))
+                      for name, function in stages]
+
+        try:
+            Daemon(interval, stages).run()
+        finally:
+            if parse_executor is not None:
+                parse_executor.shutdown()
+            if ftp_pool is not None:
+                ftp_pool.close()
+
+    finally:
+        if store is not None:
+            store.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,193 @@
+#
+# Instrumentation of the processing stages of an iteration: wall time, rows in and out and bytes per stage and station.
+#
+# Each measured stage adds a record to the Metrics of the iteration, records are optionally logged as one JSON line
+# each (logger 'metrics') and the summary of the iteration (totals per stage) is optionally appended as one JSON line
+# to a metrics file. Stages can be nested or overlap (for example parsing while files download, or the stages of a
+# stream of chunks), so their wall times are not additive.
+#
+# profile_iteration() is an opt-in cProfile or tracemalloc hook dumping the profile of a single iteration.
+
+import cProfile
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+import logging
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+# Number of lines of the tracemalloc statistics written to the profile
+TRACEMALLOC_TOP_LINES = 50
+
+
+class Metrics(object):
+
+    # log_records logs each record as a JSON line when its stage ends
+    def __init__(self, log_records=False):
+        self.log_records = log_records
+        self.records = []
+        self.start_time = time.time()
+        self._lock = threading.Lock()
+
+    # Context manager measuring the wall time of a stage, yields the record of the stage as a dictionary,
+    # 'rows_out' and 'bytes' can be set in the record before the stage ends, can be used from any thread
+    @contextmanager
+    def stage(self, name, station=None, rows_in=None):
+        record = {'stage': name, 'station': station, 'rows_in': rows_in, 'rows_out': None, 'bytes': None}
+        start = time.perf_counter()
+
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 6)
+            self.add(record)
+
+    # Adds a record of a stage measured by the caller
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+        if self.log_records:
+            logger.info(json.dumps(record))
+
+    # Returns dictionary with stage names as keys and the totals of their records as values:
+    # number of calls, seconds, rows in and out, bytes and rows out per second
+    def summary(self):
+        with self._lock:
+            records = list(self.records)
+
+        stages = {}
+        for record in records:
+            totals = stages.setdefault(record['stage'], {'calls': 0, 'seconds': 0.0, 'rows_in': 0, 'rows_out': 0,
+                                                         'bytes': 0})
+            totals['calls'] += 1
+            totals['seconds'] += record['seconds']
+            for key in ('rows_in', 'rows_out', 'bytes'):
+                totals[key] += record[key] or 0
+
+        for totals in stages.values():
+            totals['seconds'] = round(totals['seconds'], 6)
+            totals['rows_per_second'] = round(totals['rows_out'] / totals['seconds']) if totals['seconds'] else None
+
+        return stages
+
+    # Logs the summary of the iteration, one JSON line per stage
+    def log_summary(self):
+        for name, totals in self.summary().items():
+            logger.info(json.dumps({'stage': name, **totals}))
+
+    # Appends the summary and records of the iteration as one JSON line to the file at path
+    def write(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            records = list(self.records)
+
+        line = {'start_time': datetime.fromtimestamp(self.start_time).isoformat(timespec='seconds'),
+                'seconds': round(time.time() - self.start_time, 3), 'stages': self.summary(), 'records': records}
+        with open(path, 'a') as file:
+            file.write(json.dumps(line) + '\n')
+
+
+def measure(metrics, name, station=None, rows_in=None):
+    """
+    :param metrics: Metrics of the iteration, None does not measure
+    :param name: name of the stage
+    :param station: station ID if the stage processes a single station
+    :param rows_in: number of input rows of the stage
+    :return: context manager of `Metrics.stage`, yields a record that is not kept if metrics is None
+    """
+    if metrics is None:
+        return nullcontext({})
+
+    return metrics.stage(name, station, rows_in)
+
+
+def measure_iter(metrics, name, iterable, get_bytes=None):
+    """
+    Measure the time spent waiting for the items of an iterable, for example files downloaded or chunks parsed
+    while the items are processed, as a single record of the stage.
+    :param metrics: Metrics of the iteration, None does not measure
+    :param name: name of the stage
+    :param iterable: iterable of items, numpy arrays are counted as rows
+    :param get_bytes: function returning the number of bytes of an item, by default nbytes of numpy arrays
+    :return: generator of the items of iterable
+    """
+    if metrics is None:
+        yield from iterable
+        return
+
+    iterator = iter(iterable)
+    seconds, rows, size = 0.0, 0, 0
+
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                seconds += time.perf_counter() - start
+
+            rows += len(item) if hasattr(item, 'nbytes') else 1
+            size += get_bytes(item) if get_bytes is not None else getattr(item, 'nbytes', 0)
+            yield item
+    finally:
+        metrics.add({'stage': name, 'station': None, 'rows_in': None, 'rows_out': rows, 'bytes': size,
+                     'seconds': round(seconds, 6)})
+
+
+@contextmanager
+def profile_iteration(mode, path):
+    """
+    Profile the code run in the context and write the profile when it ends.
+    'cprofile' profiles the calling thread and writes the pstats file '{path}.prof' (open with pstats or snakeviz),
+    'tracemalloc' traces the allocations of all threads of the process and writes the peak memory and the lines that
+    allocated the most memory to '{path}.txt'. Worker processes are not profiled.
+    :param mode: None (no profile), 'cprofile' or 'tracemalloc'
+    :param path: path of the profile without suffix
+    """
+    if not mode:
+        yield
+        return
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path.with_suffix('.prof'))
+            logger.info(f' Wrote cProfile profile to {path.with_suffix(".prof")}')
+
+    elif mode == 'tracemalloc':
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            statistics = snapshot.statistics('lineno')
+            with open(path.with_suffix('.txt'), 'w') as file:
+                file.write(f'Peak traced memory: {peak / 2 ** 20:.1f} MiB, current: {current / 2 ** 20:.1f} MiB\n')
+                file.write(f'Top {TRACEMALLOC_TOP_LINES} lines by memory allocated at the end of the iteration:\n')
+                file.writelines(f'{statistic}\n' for statistic in statistics[:TRACEMALLOC_TOP_LINES])
+            logger.info(f' Wrote tracemalloc profile to {path.with_suffix(".txt")}')
+
+    else:
+        raise ValueError(f'Unknown profile mode: {mode}')
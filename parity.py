@@ -0,0 +1,477 @@
+#
+# Purpose: Check that the optimized implementations and processing paths give the same results as the reference ones.
+#
+# The reference is the frozen copy of the baseline processing in baseline.py (pandas read_fwf, vectorized f_argos_bit,
+# row by row pairing, one filter per column, strptime timestamps, numpy savetxt), which shares no code with the
+# optimized implementations. Component checks compare an optimized function with the baseline on the same input:
+#   words: `decode_argos_words` (lookup table) and `f_argos_bit` for every 16-bit word and corrupt values
+#   compact: `widen_argos_array` of `compact_argos_array` and the decoded values of every 16-bit word
+#   unique_rows: `get_unique_rows` (64-bit row hashes) and pandas duplicated() on the rows of each station
+#   station_array: `ArgosCleaner.get_station_array` (vectorized pairing) and the row by row pairing of the baseline
+#   filter: `FilterPlan.apply` (in place on one block) and the filters of the baseline, pressure jumps excluded
+# Path checks run the baseline processing and each processing path of PARITY_PATHS (the batch path processes all input
+# data at once in one process, without store) on the same input files, and diff their decoded transmissions and their
+# NEAD files.
+# The paths remove duplicated transmissions differently (exact rows, key columns across chunks or in the store), so
+# the decoded arrays are compared as their sets of distinct transmissions (ARGOS_KEY_COLUMNS).
+# Numeric values are compared with numpy.isclose(rtol, atol), the default tolerances of 0 require equal values.
+#
+# Example commands (make sure virtual environment is activated):
+#
+#   python parity.py
+#   python parity.py input/*.raw --paths stream,parallel --atol 1e-9
+#
+
+import os
+import sys
+import glob
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import numpy
+import pandas
+
+import baseline
+from process_argos import ARGOS_COLUMNS_NAMES, ARGOS_KEY_COLUMNS, decode_argos_words, get_unique_rows, \
+    parse_argos_chunks, decode_argos_chunks, compact_argos_array, widen_argos_array
+from store import COLUMNS
+from synthetic_argos import write_argos_file, get_active_stations
+from main import read_config, get_cleaner, open_store, decode_input_data, clean_data, stream_data, order_oldest_first
+
+import logging
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+# Config values (DEFAULT section) of the processing paths, replaced by the values of each path
+PARITY_DEFAULTS = {'parse_workers': '1', 'clean_workers': '1', 'store_path': '', 'stream_chunk_rows': '0',
+                    'nead_mode': 'snapshot', 'compact_dtypes': 'False'}
+
+# Config values of the alternative processing paths, '{work_dir}' is replaced by the directory of the path,
+# 'input_order': 'reversed' passes the input files oldest first, the reverse of the order of get_input_data, as they can
+# arrive from the FTP server
+PARITY_PATHS = {
+    'batch': {},
+    'stream': {'stream_chunk_rows': '1000'},
+    'stream_reversed': {'stream_chunk_rows': '1000', 'input_order': 'reversed'},
+    'parallel': {'parse_workers': '2', 'clean_workers': '4'},
+    'store': {'store_path': '{work_dir}/store.sqlite', 'nead_mode': 'append'},
+    'stream_store': {'stream_chunk_rows': '1000', 'store_path': '{work_dir}/store.sqlite', 'nead_mode': 'append'},
+    'compact': {'compact_dtypes': 'True'},
+    'stream_compact': {'stream_chunk_rows': '1000', 'compact_dtypes': 'True'},
+    'stream_parallel': {'stream_chunk_rows': '1000', 'parse_workers': '2', 'clean_workers': '3'},
+}
+
+# Kinds of corrupt transmissions of the synthetic files, the baseline can not read tables with an extra line or an
+# invalid timestamp
+PARITY_CORRUPT_KINDS = ['truncated', 'invalid_word', 'fractional_day']
+
+# Component checks
+PARITY_CHECKS = ['words', 'compact', 'unique_rows', 'station_array', 'filter']
+
+# Maximum number of differences listed by a check
+MAX_DIFFERENCES = 10
+
+
+def get_parser():
+    parser = argparse.ArgumentParser("ArgosParity")
+    parser.add_argument('input', nargs='*', help='ARGOS raw files in chronological order, default synthetic files of '
+                                                 '--days days')
+    parser.add_argument('--days', type=int, default=30, help='Number of days of the synthetic files, default 30')
+    parser.add_argument('--files', type=int, default=3,
+                        help='Number of synthetic files the days are split in, default 3')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic files, default 0')
+    parser.add_argument('--checks', default=','.join(PARITY_CHECKS),
+                        help=f'Comma separated component checks, default {",".join(PARITY_CHECKS)}')
+    parser.add_argument('--paths', default=','.join(PARITY_PATHS),
+                        help=f'Comma separated processing paths compared with the reference, '
+                             f'default {",".join(PARITY_PATHS)}')
+    parser.add_argument('--rtol', type=float, default=0, help='Relative tolerance of numeric values, default 0')
+    parser.add_argument('--atol', type=float, default=0, help='Absolute tolerance of numeric values, default 0')
+    parser.add_argument('--workDir', help='Directory of the outputs of the paths, default a temporary directory')
+    return parser
+
+
+def write_synthetic_files(work_dir, days, files_num, seed):
+    """
+    :param work_dir: directory of the files
+    :param days: number of days of the files, starting on 2022-01-01
+    :param files_num: number of files the days are split in, each file has the next consecutive days
+    :param seed: seed of the first file, the next files have the next seeds
+    :return: list of the paths of the files, in chronological order
+    """
+    stations = get_active_stations()
+    files = []
+
+    for i in range(files_num):
+        first_day, last_day = i * days // files_num, (i + 1) * days // files_num
+        file = os.path.join(work_dir, f'synthetic_{days}d_{i + 1}of{files_num}_seed{seed}.raw')
+        write_argos_file(file, stations, start_date=(date(2022, 1, 1) + timedelta(days=first_day)).isoformat(),
+                         days=last_day - first_day, seed=seed + i, corrupt_kinds=PARITY_CORRUPT_KINDS)
+        files.append(file)
+
+    return files
+
+
+def compare_arrays(reference, candidate, rtol=0, atol=0, sort_rows=False):
+    """
+    :param reference: 2d numpy array
+    :param candidate: 2d numpy array
+    :param rtol: relative tolerance of numpy.isclose
+    :param atol: absolute tolerance of numpy.isclose
+    :param sort_rows: compare the rows in sorted order, for arrays whose row order is not significant
+    :return: list of the differences, empty if the arrays are equal within the tolerances (NaNs are equal)
+    """
+    reference, candidate = numpy.asarray(reference, dtype='float'), numpy.asarray(candidate, dtype='float')
+
+    if reference.shape != candidate.shape:
+        return [f'shape {candidate.shape} instead of {reference.shape}']
+
+    if sort_rows and reference.ndim == 2:
+        reference = reference[numpy.lexsort(reference.T[::-1])]
+        candidate = candidate[numpy.lexsort(candidate.T[::-1])]
+
+    different = ~numpy.isclose(candidate, reference, rtol=rtol, atol=atol, equal_nan=True)
+    if not different.any():
+        return []
+
+    differences = [f'{different.sum()} values differ, largest difference '
+                   f'{numpy.nanmax(numpy.abs(candidate[different] - reference[different]), initial=0)}']
+    for index in list(zip(*numpy.nonzero(different)))[:MAX_DIFFERENCES]:
+        differences.append(f'at {tuple(map(int, index))}: {candidate[index]} instead of {reference[index]}')
+
+    return differences
+
+
+def compare_nead_files(reference_file, candidate_file, rtol=0, atol=0):
+    """
+    :param reference_file: path of a NEAD file
+    :param candidate_file: path of a NEAD file
+    :param rtol: relative tolerance of numpy.isclose
+    :param atol: absolute tolerance of numpy.isclose
+    :return: list of the differences, empty if the headers and timestamps are equal and the values are equal within
+        the tolerances (empty values must be empty in both files)
+    """
+    def read(file):
+        with open(file) as f:
+            lines = f.read().splitlines()
+        header = [line for line in lines if line.startswith('#')]
+        rows = [line.rstrip(',').split(',') for line in lines if not line.startswith('#')]
+        return header, rows
+
+    reference_header, reference_rows = read(reference_file)
+    candidate_header, candidate_rows = read(candidate_file)
+
+    differences = []
+    if candidate_header != reference_header:
+        differences.append('headers differ')
+
+    reference_timestamps = [row[0] for row in reference_rows]
+    candidate_timestamps = [row[0] for row in candidate_rows]
+    if candidate_timestamps != reference_timestamps:
+        missing = sorted(set(reference_timestamps) - set(candidate_timestamps))
+        extra = sorted(set(candidate_timestamps) - set(reference_timestamps))
+        differences.append(f'timestamps differ: {len(missing)} missing {missing[:MAX_DIFFERENCES]}, '
+                           f'{len(extra)} extra {extra[:MAX_DIFFERENCES]}')
+        return differences
+
+    for reference_row, candidate_row in zip(reference_rows, candidate_rows):
+        if len(candidate_row) != len(reference_row):
+            differences.append(f'{reference_row[0]}: {len(candidate_row)} fields instead of {len(reference_row)}')
+            continue
+        for column, (reference_value, candidate_value) in enumerate(zip(reference_row[1:], candidate_row[1:]), 1):
+            if reference_value == candidate_value:
+                continue
+            if reference_value and candidate_value and \
+                    numpy.isclose(float(candidate_value), float(reference_value), rtol=rtol, atol=atol):
+                continue
+            differences.append(f'{reference_row[0]} column {column}: {candidate_value!r} instead of '
+                               f'{reference_value!r}')
+
+    if len(differences) > MAX_DIFFERENCES:
+        differences = [f'{len(differences)} values differ'] + differences[:MAX_DIFFERENCES]
+
+    return differences
+
+
+def check_words():
+    """
+    :return: list of the differences of `decode_argos_words` and `f_argos_bit` for every 16-bit word and corrupt values
+    """
+    words = numpy.concatenate((numpy.arange(2 ** 16, dtype='float'), [-1, -65535, 65536, 70000, 131071, 1.5]))
+    reference = numpy.array([baseline.f_argos_bit(word) for word in words], dtype='float')
+
+    return compare_arrays(reference[:, None], decode_argos_words(words)[:, None])
+
+
+def check_compact():
+    """
+    :return: list of the differences of the decoded values of every 16-bit word and corrupt values and the same values
+        converted by `compact_argos_array` and `widen_argos_array`
+    """
+    words = numpy.concatenate((numpy.arange(2 ** 16, dtype='float'), [-1, -65535, 65536, 70000, 131071, 1.5]))
+    decoded = numpy.zeros((len(words), len(ARGOS_COLUMNS_NAMES)))
+    decoded[:, 8:24] = decode_argos_words(words)[:, None]
+
+    return compare_arrays(decoded, widen_argos_array(compact_argos_array(decoded)))
+
+
+def check_stations(data_array, cleaner, checks, rtol=0, atol=0):
+    """
+    Run the component checks of the rows of each active station.
+    :param data_array: decoded rows of the baseline, 24 columns of ARGOS_COLUMNS_NAMES
+    :param cleaner: ArgosCleaner of the stations config
+    :param checks: names of the checks among 'unique_rows', 'station_array' and 'filter'
+    :return: dictionary with check names as keys and lists of the differences as values
+    """
+    baseline_cleaner = baseline.ArgosCleaner(cleaner.stations_config, None)
+    differences = {check: [] for check in checks}
+
+    for section in cleaner.filter_plans:
+        station_id = int(section)
+        station_data = data_array[data_array[:, 7] == station_id]
+
+        if 'unique_rows' in checks:
+            reference = ~pandas.DataFrame(station_data[:, 8:]).duplicated().to_numpy()
+            candidate = get_unique_rows(station_data[:, 8:])
+            differences['unique_rows'] += [f'Station {section} {difference}' for difference in
+                                           compare_arrays(reference[:, None], candidate[:, None])]
+
+        station_array = baseline_cleaner.get_station_array(station_data, station_id)
+
+        if 'station_array' in checks:
+            candidate = cleaner.get_station_array(station_data, station_id)
+            differences['station_array'] += [f'Station {section} {difference}' for difference in
+                                             compare_arrays(station_array, candidate, rtol, atol)]
+
+        if 'filter' in checks:
+            reference = baseline_cleaner.filter_station_array(station_array.copy(), section)
+            candidate = cleaner.filter_plans[section].apply(station_array)
+            differences['filter'] += [f'Station {section} {difference}' for difference in
+                                      compare_arrays(reference, candidate, rtol, atol)]
+
+    return differences
+
+
+def get_path_config(values, work_dir):
+    """
+    :param values: config values of a path, a value of PARITY_PATHS
+    :param work_dir: directory of the outputs of the path
+    :return: stations config with the values of the path and the reference, the NEAD files are written to
+        '{work_dir}/output'
+    """
+    config = read_config('config/stations.ini')
+    values = {**PARITY_DEFAULTS, **values, 'output_dir': os.path.join(work_dir, 'output')}
+    values.pop('input_order', None)
+
+    for key, value in values.items():
+        config.set('DEFAULT', key, value.replace('{work_dir}', work_dir))
+
+    return config
+
+
+@contextmanager
+def float_argos_bit():
+    """
+    Make the baseline decode every word to a float. The vectorized f_argos_bit of the baseline takes the dtype of its
+    output from the first decoded word, a first word without decimals (the logger ID of a first table 1 row) truncates
+    all the decoded values to integers, which depends on the order of the input files only. decode_argos_words always
+    returns floats.
+    """
+    f_argos_bit = baseline.f_argos_bit
+    baseline.f_argos_bit = lambda x: None if x is None else float(f_argos_bit(x))
+    try:
+        yield
+    finally:
+        baseline.f_argos_bit = f_argos_bit
+
+
+def run_baseline(files, work_dir):
+    """
+    Decode the files and write the NEAD files with the frozen baseline processing (baseline.py).
+    :param files: paths of the ARGOS raw files, in chronological order
+    :param work_dir: directory of the outputs of the baseline, it is emptied first
+    :return: decoded array of the baseline and directory of the NEAD files
+    """
+    shutil.rmtree(work_dir, ignore_errors=True)
+    output_dir = os.path.join(work_dir, 'output')
+    Path(output_dir).mkdir(parents=True)
+
+    # The baseline reads the files in the order of get_input_data, most recent file first
+    with float_argos_bit():
+        data_array = baseline.process_files(files[::-1], read_config('config/stations.ini'), output_dir)
+
+    return data_array.astype('float'), output_dir
+
+
+def run_path(files, values, work_dir):
+    """
+    Decode the files and write the NEAD files with the main processing functions and the config values of a path.
+    :param files: paths of the ARGOS raw files, in chronological order
+    :param values: config values of the path
+    :param work_dir: directory of the outputs of the path, it is emptied first
+    :return: decoded array of the path (rows of the store for paths with a store) and directory of the NEAD files
+    """
+    shutil.rmtree(work_dir, ignore_errors=True)
+    config = get_path_config(values, work_dir)
+    output_dir = config.get('DEFAULT', 'output_dir')
+    Path(output_dir).mkdir(parents=True)
+
+    # The cleaner reads the stations config file itself, it gets the values of the path as well
+    cleaner = get_cleaner()
+    for key in ('output_dir', 'nead_mode'):
+        cleaner.stations_config.set('DEFAULT', key, config.get('DEFAULT', key))
+
+    chunk_rows = config.getint('DEFAULT', 'stream_chunk_rows')
+    parse_workers = config.getint('DEFAULT', 'parse_workers')
+    store = open_store(config)
+
+    # Assign input_data to the (index, path) tuples of the files, index is the position of the file in the list of
+    # get_input_data, most recent file first
+    input_data = list(enumerate(reversed(files)))
+    if values.get('input_order') == 'reversed':
+        input_data.reverse()
+
+    try:
+        if chunk_rows > 0:
+            stream_data(config, cleaner, iter(input_data), store)
+            data_array = None
+        else:
+            data_array = decode_input_data(config, iter(input_data), store)
+            clean_data(config, cleaner, data_array, store)
+
+        # Assign data_array to the decoded rows of the path, all the transmissions of the store for paths with a store
+        if store is not None:
+            data_array = numpy.array(store.connection.execute(f'SELECT {", ".join(COLUMNS)} FROM transmissions')
+                                     .fetchall(), dtype='float').reshape(-1, len(COLUMNS))
+        elif data_array is None:
+            chunks = parse_argos_chunks(order_oldest_first(enumerate(reversed(files))), chunk_rows,
+                                        workers=parse_workers)
+            decoded = list(decode_argos_chunks(chunks, config.getfloat('DEFAULT', 'stream_dedup_days'),
+                                              config.getboolean('DEFAULT', 'compact_dtypes')))
+            data_array = numpy.concatenate(decoded) if decoded else numpy.empty((0, len(ARGOS_COLUMNS_NAMES)))
+
+    finally:
+        if store is not None:
+            store.close()
+
+    return widen_argos_array(numpy.asarray(data_array)), output_dir
+
+
+def get_transmissions(data_array):
+    """
+    :param data_array: decoded rows, 24 columns of ARGOS_COLUMNS_NAMES, compact or float64
+    :return: float numpy array of the distinct values of the ARGOS_KEY_COLUMNS columns (station and 16 words)
+    """
+    key_columns = [ARGOS_COLUMNS_NAMES.index(name) for name in ARGOS_KEY_COLUMNS]
+
+    return pandas.DataFrame(widen_argos_array(data_array)[:, key_columns]).drop_duplicates().to_numpy(dtype='float')
+
+
+def check_path(reference, candidate, rtol=0, atol=0):
+    """
+    :param reference: decoded array and directory of the NEAD files of the reference path, as returned by `run_path`
+    :param candidate: decoded array and directory of the NEAD files of the path checked
+    :return: list of the differences of the decoded transmissions (in sorted order) and of the NEAD file of each
+        station
+    """
+    (reference_array, reference_dir), (candidate_array, candidate_dir) = reference, candidate
+
+    differences = [f'decoded {difference}' for difference in
+                   compare_arrays(get_transmissions(reference_array), get_transmissions(candidate_array), rtol, atol,
+                                  sort_rows=True)]
+
+    def get_nead_files(output_dir):
+        return {Path(file).name.split('_')[0]: file for file in glob.glob(os.path.join(output_dir, '*_NEAD*.csv'))}
+
+    reference_files, candidate_files = get_nead_files(reference_dir), get_nead_files(candidate_dir)
+    for station in sorted(set(reference_files) | set(candidate_files)):
+        if station not in candidate_files or station not in reference_files:
+            differences.append(f'Station {station} NEAD file only written by the '
+                               f'{"reference" if station in reference_files else "path"}')
+            continue
+        differences += [f'Station {station} NEAD {difference}' for difference in
+                        compare_nead_files(reference_files[station], candidate_files[station], rtol, atol)]
+
+    return differences
+
+
+def log_check(name, differences):
+    if differences:
+        logger.error(f' FAIL {name}')
+        for difference in differences:
+            logger.error(f'   {difference}')
+    else:
+        logger.info(f' PASS {name}')
+
+
+def main(args=None):
+    """
+    Main entry point for checking the parity of the optimized and reference implementations.
+    """
+
+    # Access arguments passed in command line
+    parser = get_parser()
+    args = parser.parse_args(args)
+
+    checks = [check for check in args.checks.split(',') if check]
+    paths = [path for path in args.paths.split(',') if path]
+    for name in checks + paths:
+        if name not in PARITY_CHECKS and name not in PARITY_PATHS:
+            logger.error(f' Unknown check or path {name}')
+            return -1
+
+    work_dir = args.workDir or tempfile.mkdtemp(prefix='argos_parity_')
+    Path(work_dir).mkdir(parents=True, exist_ok=True)
+
+    station_checks = [check for check in checks if check not in ('words', 'compact')]
+    files = args.input
+    if not files and (paths or station_checks):
+        files = write_synthetic_files(work_dir, args.days, args.files, args.seed)
+        logger.info(f' Generated synthetic input files {", ".join(files)}')
+
+    # Log lines of each station and path would hide the results
+    for name in ('main', 'cleaner', 'process_argos', 'store', 'baseline'):
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+    failed = False
+
+    for check, check_function in (('words', check_words), ('compact', check_compact)):
+        if check in checks:
+            differences = check_function()
+            log_check(check, differences)
+            failed = failed or bool(differences)
+
+    if station_checks:
+        # Decode the files in the order of get_input_data, most recent file first, as the baseline does
+        with float_argos_bit():
+            data_array = baseline.decode_argos(pandas.concat([baseline.read_argos(file, nrows=None)
+                                                              for file in files[::-1]]),
+                                               remove_duplicate=True, sort=True).to_numpy(dtype='float')
+        for check, differences in check_stations(data_array, get_cleaner(), station_checks,
+                                                 args.rtol, args.atol).items():
+            log_check(check, differences)
+            failed = failed or bool(differences)
+
+    if paths:
+        reference = run_baseline(files, os.path.join(work_dir, 'baseline'))
+        for path in paths:
+            differences = check_path(reference, run_path(files, PARITY_PATHS[path], os.path.join(work_dir, path)),
+                                     args.rtol, args.atol)
+            log_check(f'path {path}', differences)
+            failed = failed or bool(differences)
+
+    if not args.workDir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,6 +3,8 @@
 
 import pandas
 import numpy
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 # TODO check if logging needs to be reestablished
 import logging
@@ -12,65 +14,205 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 
+# Column widths of the Argos raw file
+ARGOS_COLUMNS = [(0, 6), (6, 28), (28, 39), (39, 52), (52, 65), (65, -1)]
+
+# Positions of the year, month, day, hours, minutes, seconds and substation in the timestamp field
+ARGOS_TIMESTAMP_FIELDS = [(0, 4), (5, 7), (8, 10), (11, 13), (14, 16), (17, 19), (19, None)]
+
+# Number of lines (of 4 columns) of one transmission
+ARGOS_TRANSMISSION_LINES = 4
+
+# Column names of a parsed Argos raw file, one row per transmission
+ARGOS_COLUMNS_NAMES = ['Year', 'Month', 'Day', 'Hours', 'Minutes', 'Seconds', 'Substation', 'Station'] + \
+                      [f'v_{i}' for i in range(1, 17)]
+
+# Columns identifying a transmission, duplicated transmissions have the same station and 16 values
+ARGOS_KEY_COLUMNS = ['Station'] + [f'v_{i}' for i in range(1, 17)]
+
+# Odd 64-bit constant mixing the columns of a row into its hash
+ARGOS_HASH_MULTIPLIER = numpy.uint64(0x9E3779B97F4A7C15)
+
+# Dtype of compact decoded arrays, integers up to 2 ** 24 (timestamps, station IDs) are exact in float32
+ARGOS_COMPACT_DTYPE = 'float32'
+
+# Decimals of the decoded words, a decoded word is a 13-bit integer divided by 1, 10, 100 or 1000
+ARGOS_WORD_DECIMALS = 3
+
+# Number of rows of the blocks filled by `parse_argos`
+ARGOS_PARSE_BLOCK_ROWS = 8192
+
+# Lines of the Argos raw file containing one of these strings are skipped
+ARGOS_SKIP_STRINGS = ['/Invalid day of the month: {0}: begin date is posterior to the last day of the year',
+                      'ARGOS READY']
+
+
 def read_argos(file, nrows):
     """
-    Read the Argos raw file with Pandas.
-    Reshape it to the one row per transmission (from 4 columns) and return a pandas df.
+    Read the Argos raw file with `parse_argos`, one row per transmission (from 4 columns) and return a pandas df.
     :param file: path to the Argos raw file
-    :param nrows: number of rows to be read, default is 300000
+    :param nrows: number of rows to be read, None reads the whole file
     :return: a pandas dataframe, with 24 columns
     """
 
     # logger.info(f' Reading and processing {file}...')
 
-    # Set up the column width, column names and the timestamp split
-    columns = [(0, 6), (6, 28), (28, 39), (39, 52), (52, 65), (65, -1)]
-    columns_names = ['Station', 'Timestamp', 'Column1', 'Column2', 'Column3', 'Column4']
-    columns_timestamp = ['Year', 'Month', 'Day', 'Hours', 'Minutes', 'Seconds', 'Substation']
-
-    # Assign skip_rows to 0-indexed list of line numbers that should skipped and not read into the data frame
-    skip_rows = get_search_strings_line_numbers(
-        file,
-        ['/Invalid day of the month: {0}: begin date is posterior to the last day of the year', 'ARGOS READY']
-    )
-
-    # Read the raw file with predefined columns
-    df = pandas.read_fwf(file, names=columns_names, colspecs=columns, nrows=nrows, skiprows=skip_rows,
-                         converters={'Station': str, 'Timestamp': str,
-                                     'Column1': int, 'Column2': int, 'Column3': int, 'Column4': int})
-
-    # Copy the station down so the part one and part two have them
-    # Remove the rows where with the satelite information as it doesn't care any additional info
-    df.loc[df['Station'].notnull(), 'Station'] = df.loc[df['Station'].notnull(), 'Timestamp'].str[0:6]
-    df['Station'] = df['Station'].ffill()
-    df = df.dropna(subset=columns_names[2:], how='all', inplace=False)
-
-    # For each timestamp trunsmission create a separate group which later
-    # will be used to set the index to transform to wide format
-    df['timestamp_group'] = 0
-    df.loc[~df['Timestamp'].isnull(), 'timestamp_group'] = 1
-    df['timestamp_group'] = df['timestamp_group'].cumsum()
-
-    # Fill down the information about the timestamp
-    df['Timestamp'] = df['Timestamp'].ffill()
-
-    # Count the row for each group for the transformation
-    df["timestamp_row"] = df.groupby('timestamp_group').cumcount()
-
-    # Transform data.frame to the wide format
-    df = df.set_index(columns_names[:2] + ['timestamp_group'] + ['timestamp_row']).unstack()
-
-    # Set new names and drop index
-    df.columns = [f'v_{i}' for i in range(1, 17)]
-    df = df.reset_index()
-
-    # Rearange the data to correct order (same as fortran output) and set the names again
-    df[columns_timestamp] = df['Timestamp'].str.split('-|:| ', 6, expand=True)
-    df = df[columns_timestamp + ['Station', 'v_1', 'v_5', 'v_9', 'v_13', 'v_2', 'v_6', 'v_10',
-                                 'v_14', 'v_3', 'v_7', 'v_11', 'v_15', 'v_4', 'v_8', 'v_12', 'v_16']]
-    df.columns = columns_timestamp + ['Station'] + [f'v_{i}' for i in range(1, 17)]
+    return pandas.DataFrame(parse_argos(file, nrows), columns=ARGOS_COLUMNS_NAMES)
 
-    return df
+
+def parse_argos(file, nrows=None):
+    """
+    Parse the Argos raw file directly to the wide format, one row per transmission (from 4 lines of 4 columns).
+    Lines are read one by one and each transmission is written to a block of ARGOS_PARSE_BLOCK_ROWS rows when its
+    last line is read, so memory use is about twice the size of the output array.
+    Rows are ordered by station, timestamp and position in the file.
+    :param file: path to the Argos raw file
+    :param nrows: number of rows to be read, None reads the whole file
+    :return: a float numpy array with the 24 columns of ARGOS_COLUMNS_NAMES
+    """
+
+    blocks = []
+    stations = []
+    timestamps = []
+
+    # Assign station and timestamp to the transmission being read, lines is None before the first timestamp
+    station = None
+    transmission = (None, None, None)
+
+    def add_transmission(transmission_station, transmission_timestamp, lines):
+        # Drop transmissions without a station, they can not be assigned to any station
+        if lines is None or transmission_station is None:
+            return
+
+        if len(lines) > ARGOS_TRANSMISSION_LINES:
+            logger.warning(f' Transmission {transmission_station} {transmission_timestamp} in {file} has '
+                           f'{len(lines)} lines, only the first {ARGOS_TRANSMISSION_LINES} are used')
+            lines = lines[:ARGOS_TRANSMISSION_LINES]
+
+        if not blocks or len(stations) % ARGOS_PARSE_BLOCK_ROWS == 0:
+            blocks.append(numpy.full((ARGOS_PARSE_BLOCK_ROWS, len(ARGOS_COLUMNS_NAMES)), numpy.nan))
+        row = blocks[-1][len(stations) % ARGOS_PARSE_BLOCK_ROWS]
+
+        # Put the 4 lines of the transmission in one row (same order as fortran output), missing lines are empty
+        row[:7] = [to_float(transmission_timestamp[start:end]) for start, end in ARGOS_TIMESTAMP_FIELDS]
+        row[7] = to_float(transmission_station)
+        for i, words in enumerate(lines):
+            row[8 + 4 * i:12 + 4 * i] = [numpy.nan if word is None else word for word in words]
+
+        stations.append(transmission_station)
+        timestamps.append(transmission_timestamp)
+
+    for station_field, timestamp, *words in read_argos_fields(file, nrows, ARGOS_SKIP_STRINGS):
+
+        # Copy the station down so the part one and part two have them
+        if station_field is not None:
+            station = timestamp[0:6] if timestamp is not None else station
+
+        # Remove the rows with the satelite information as it doesn't carry any additional info
+        if all(word is None for word in words):
+            continue
+
+        # Each timestamp starts a new transmission, lines before the first timestamp can not be dated
+        if timestamp is not None:
+            add_transmission(*transmission)
+            transmission = (station, timestamp, [])
+        elif transmission[2] is None:
+            continue
+
+        transmission[2].append(words)
+
+    add_transmission(*transmission)
+
+    if not blocks:
+        return numpy.empty((0, len(ARGOS_COLUMNS_NAMES)))
+
+    data = numpy.concatenate(blocks)[:len(stations)]
+    del blocks[:]
+
+    # Sort by station, timestamp and transmission number
+    order = numpy.lexsort((numpy.arange(len(data)), numpy.array(timestamps, dtype='str'),
+                           numpy.array(stations, dtype='str')))
+
+    return data[order, :]
+
+
+def parse_argos_files(files, workers=1, nrows=None, executor=None):
+    """
+    Parse several Argos raw files with `parse_argos`, in a pool of worker processes if workers is greater than 1.
+    Each file is submitted to the pool as soon as it is yielded by files (for example while other files download).
+    :param files: iterable of (index, path) tuples, index is the position of the file in the output
+    :param workers: number of worker processes, 1 parses the files in the current process
+    :param nrows: number of rows to be read from each file, None reads the whole files
+    :param executor: process pool kept open by the caller, if given it is used instead of creating a pool of workers
+    :return: a float numpy array with the 24 columns of ARGOS_COLUMNS_NAMES, rows of the files in the order of index
+    """
+
+    if executor is None and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return parse_argos_files(files, nrows=nrows, executor=executor)
+
+    arrays = {}
+
+    if executor is not None:
+        futures = {index: executor.submit(parse_argos, file, nrows) for index, file in files}
+        for index, future in futures.items():
+            arrays[index] = future.result()
+    else:
+        for index, file in files:
+            arrays[index] = parse_argos(file, nrows)
+
+    if not arrays:
+        return numpy.empty((0, len(ARGOS_COLUMNS_NAMES)))
+
+    return numpy.concatenate([arrays[index] for index in sorted(arrays)])
+
+
+def parse_argos_chunks(files, chunk_rows, workers=1, nrows=None, executor=None):
+    """
+    Parse several Argos raw files with `parse_argos` and yield their rows in chunks, file by file.
+    Only the files being parsed (at most one per worker) and the current file are kept in memory.
+    :param files: iterable of (index, path) tuples, files are yielded in this order
+    :param chunk_rows: maximum number of rows of a chunk
+    :param workers: number of worker processes, 1 parses the files in the current process
+    :param nrows: number of rows to be read from each file, None reads the whole files
+    :param executor: process pool kept open by the caller, if given it is used instead of creating a pool of workers
+    :return: generator of float numpy arrays with the 24 columns of ARGOS_COLUMNS_NAMES
+    """
+
+    if executor is None and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from parse_argos_chunks(files, chunk_rows, workers, nrows, executor)
+        return
+
+    def parse_files():
+        if executor is None:
+            for index, file in files:
+                yield parse_argos(file, nrows)
+        else:
+            # Submit the next files while the previous ones are parsed, results are kept in the order of files
+            futures = deque()
+            for index, file in files:
+                futures.append(executor.submit(parse_argos, file, nrows))
+                if len(futures) >= workers:
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+
+    for array in parse_files():
+        for start in range(0, len(array), chunk_rows):
+            yield array[start:start + chunk_rows, :]
+
+
+def to_float(text):
+    """
+    Convert a field of the Argos raw file to a float
+    :param text: a string
+    :return: a float, NaN if the text is empty or not a number
+    """
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return numpy.nan
 
 
 def decode_argos(df, remove_duplicate=True, sort=True):
@@ -84,24 +226,26 @@ def decode_argos(df, remove_duplicate=True, sort=True):
 
     logger.info(f' Decoding data...')
 
-    # Drop duplicated rows, this substantially speeds up the process
-    if remove_duplicate:
-        df = df.drop_duplicates(subset=['Station'] + [f'v_{i}' for i in range(1, 17)], inplace=False)
-
     # Convert to the numpy array
+    key_columns = [ARGOS_COLUMNS_NAMES.index(name) for name in ARGOS_KEY_COLUMNS]
     df = df.to_numpy(dtype='float', na_value=numpy.nan)
 
+    # Drop duplicated rows before decoding, this substantially speeds up the process
+    # Most duplicates are identical receptions with the same raw words, removing them here means the words of each
+    # transmission are decoded once, the pass after decoding only finds the few rows left
+    if remove_duplicate:
+        unique_rows = get_unique_rows(df[:, key_columns])
+        df = df[unique_rows, :]
+        logger.info(f' Removed {len(unique_rows) - len(df)} duplicated transmissions before decoding')
+
     # Correct year
     df[:, 9] = correct_year(df[:, 0], df[:, 9])
 
-    # Vectorise the argos function and apply it to all columns
-    f_argos_bit_v = numpy.vectorize(f_argos_bit)
-    df[:, 8:24] = f_argos_bit_v(df[:, 8:24])
+    # Decode all the 16-bit words at once with the lookup table
+    df[:, 8:24] = decode_argos_words(df[:, 8:24])
 
     # Put it back to the pandas dataframe and sort
-    df = pandas.DataFrame(df)
-    df.columns = ['Year', 'Month', 'Day', 'Hours', 'Minutes', 'Seconds', 'Substation', 'Station'] + [f'v_{i}' for i in
-                                                                                                     range(1, 17)]
+    df = pandas.DataFrame(df, columns=ARGOS_COLUMNS_NAMES)
 
     # Convert Logger ID (v_1) into the integer. The fortran code truncated the values.
     df['v_1'] = df['v_1'].astype('int')
@@ -114,8 +258,13 @@ def decode_argos(df, remove_duplicate=True, sort=True):
     # df['v_2'] = df['v_2'].astype('int')
 
     # Again remove duplicates. It can hapend that some still remained
+    # (empty and zero values decode to 0, the logger ID is truncated and the year corrected)
+    # These rows have different raw words, so the pass before decoding can not find them and would have to decode
+    # every row first to replace this pass
     if remove_duplicate:
-        df = df.drop_duplicates(subset=['Station'] + [f'v_{i}' for i in range(1, 17)], inplace=False)
+        unique_rows = get_unique_rows(df[ARGOS_KEY_COLUMNS].to_numpy(dtype='float'))
+        df = df[unique_rows]
+        logger.info(f' Removed {len(unique_rows) - len(df)} duplicated transmissions after decoding')
 
     if sort:
         # df = df.sort_values(by=['Station', 'v_1', 'Year', 'Month', 'Day', 'Hours', 'Minutes', 'Seconds'],
@@ -126,6 +275,157 @@ def decode_argos(df, remove_duplicate=True, sort=True):
     return df
 
 
+def compact_argos_array(data):
+    """
+    Convert decoded rows to the compact dtype, half the memory of float64.
+    Timestamps and station IDs are integers and decoded words have at most 3 decimals and 13 significant bits,
+    `widen_argos_array` restores the float64 values exactly.
+    :param data: float numpy array with the decoded columns of ARGOS_COLUMNS_NAMES
+    :return: ARGOS_COMPACT_DTYPE numpy array
+    """
+    return data.astype(ARGOS_COMPACT_DTYPE)
+
+
+def widen_argos_array(data):
+    """
+    :param data: float numpy array with the decoded columns of ARGOS_COLUMNS_NAMES, compact or float64
+    :return: float64 numpy array with the values decoded by `decode_argos`, data itself if it is float64
+    """
+    if data.dtype == numpy.float64:
+        return data
+
+    # Decoded words are rounded back to the float64 value closest to their decimal value
+    wide = data.astype('float')
+    wide[:, 8:24] = numpy.round(wide[:, 8:24], ARGOS_WORD_DECIMALS)
+
+    return wide
+
+
+def get_row_hashes(data):
+    """
+    Hash each row of a float array to 64 bits, rows with equal values have the same hash
+    (all NaNs are equal, negative and positive zeros are equal).
+    :param data: 2d float numpy array, hashes of arrays of different dtypes are not comparable
+    :return: uint64 numpy array with one hash per row
+    """
+    data = numpy.asarray(data, dtype='float')
+
+    # Assign bits to the 64 bits of the values with a single representation of NaN and zero
+    bits = numpy.where(numpy.isnan(data), numpy.nan, data + 0.0).view('uint64')
+
+    hashes = numpy.zeros(len(data), dtype='uint64')
+    for column in bits.T:
+        hashes = (hashes ^ column) * ARGOS_HASH_MULTIPLIER
+        hashes ^= hashes >> numpy.uint64(29)
+
+    return hashes
+
+
+def get_unique_rows(data):
+    """
+    Find the first occurrence of each row with `get_row_hashes`, in one pass instead of sorting the rows.
+    Rows with the hash of a previous row but different values (hash collisions) are compared by value.
+    :param data: 2d float numpy array
+    :return: boolean numpy array, True for the first occurrence of each row
+    """
+    if len(data) == 0:
+        return numpy.ones(0, dtype=bool)
+
+    # Codes are numbered in the order of the first occurrence of each hash
+    codes = pandas.factorize(get_row_hashes(data))[0]
+    unique_rows = codes > numpy.maximum.accumulate(numpy.concatenate(([-1], codes[:-1])))
+    first_rows = numpy.flatnonzero(unique_rows)
+
+    # Compare duplicated rows with the first row of the same hash
+    duplicated_rows = numpy.flatnonzero(~unique_rows)
+    rows, first = data[duplicated_rows, :], data[first_rows[codes[duplicated_rows]], :]
+    equal = ((rows == first) | (numpy.isnan(rows) & numpy.isnan(first))).all(axis=1)
+
+    # Rows that only share the hash (very rare) are compared with each other by value
+    collision_rows = duplicated_rows[~equal]
+    if len(collision_rows) != 0:
+        unique_rows[collision_rows] = ~pandas.DataFrame(data[collision_rows, :]).duplicated().to_numpy()
+
+    return unique_rows
+
+
+def decode_argos_chunks(chunks, dedup_days=30, compact=False):
+    """
+    Decode chunks of parsed rows with `decode_argos`, transmissions already yielded in a previous chunk are removed
+    with `remove_seen_transmissions`.
+    :param chunks: iterable of float numpy arrays with the 24 columns of ARGOS_COLUMNS_NAMES, as `parse_argos_chunks`
+    :param dedup_days: number of days a transmission key is kept to remove duplicates of later chunks
+    :param compact: whether to convert the decoded chunks with `compact_argos_array`
+    :return: generator of float numpy arrays with the decoded 24 columns of ARGOS_COLUMNS_NAMES
+    """
+    decoded_chunks = (decode_argos(pandas.DataFrame(chunk, columns=ARGOS_COLUMNS_NAMES),
+                                   remove_duplicate=True, sort=True).to_numpy(dtype='float') for chunk in chunks)
+    if compact:
+        decoded_chunks = (compact_argos_array(chunk) for chunk in decoded_chunks)
+
+    return remove_seen_transmissions(decoded_chunks, dedup_days)
+
+
+def remove_seen_transmissions(chunks, dedup_days=30):
+    """
+    Remove the transmissions of each chunk that were already yielded in a previous chunk.
+    The 64-bit hashes of the yielded transmissions are kept for dedup_days days of satellite time after the latest
+    transmission, so the memory used does not grow with the number of chunks.
+    :param chunks: iterable of decoded float numpy arrays with the 24 columns of ARGOS_COLUMNS_NAMES, without
+        duplicates in the same chunk
+    :param dedup_days: number of days a transmission key is kept to remove duplicates of later chunks
+    :return: generator of float numpy arrays with the 24 columns of ARGOS_COLUMNS_NAMES
+    """
+
+    key_columns = [ARGOS_COLUMNS_NAMES.index(name) for name in ARGOS_KEY_COLUMNS]
+
+    # Assign seen_keys to keys of yielded transmissions and seen_days to lists of these keys by satellite day
+    seen_keys = set()
+    seen_days = {}
+    latest_day = -numpy.inf
+
+    for data in chunks:
+
+        # Assign keys to the 64-bit hashes of the key columns
+        keys = get_row_hashes(data[:, key_columns]).tolist()
+        days = get_satellite_time(data) // 86400
+        latest_day = numpy.nanmax(days, initial=latest_day)
+
+        new_rows = numpy.ones(len(data), dtype=bool)
+        for i, (key, day) in enumerate(zip(keys, days)):
+            if key in seen_keys:
+                new_rows[i] = False
+            else:
+                seen_keys.add(key)
+                seen_days.setdefault(latest_day if numpy.isnan(day) else day, []).append(key)
+
+        if not new_rows.all():
+            logger.info(f' Removed {len(data) - new_rows.sum()} transmissions already decoded in previous chunks')
+
+        # Forget the keys of transmissions older than dedup_days before the latest transmission
+        for day in [day for day in seen_days if day < latest_day - dedup_days]:
+            seen_keys.difference_update(seen_days.pop(day))
+
+        yield data[new_rows, :]
+
+
+def get_satellite_time(data):
+    """
+    :param data: float numpy array with the columns of ARGOS_COLUMNS_NAMES
+    :return: float numpy array of satellite timestamps in seconds since 1970, NaN if the timestamp is not valid
+    """
+    year, month, day, hours, minutes, seconds = [data[:, i] for i in range(6)]
+
+    valid = ~numpy.isnan(data[:, 0:6]).any(axis=1)
+    satellite_time = numpy.full(len(data), numpy.nan)
+
+    months = ((year[valid] - 1970) * 12 + month[valid] - 1).astype('int64').astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + (day[valid] - 1).astype('int64').astype('timedelta64[D]')
+    satellite_time[valid] = days.astype('int64') * 86400 + hours[valid] * 3600 + minutes[valid] * 60 + seconds[valid]
+
+    return satellite_time
+
+
 def correct_year(x, y):
     """
     Providing two arrays check where the year is not equal to the satelite year + 1
@@ -181,6 +481,53 @@ def f_argos_bit(x):
     return out
 
 
+def get_argos_lookup_table():
+    """
+    Build the lookup table with the decoded value of every possible 16-bit word.
+    Bit 1 is the sign, bits 2 and 3 the decimal scale and bits 4 to 16 the value, same as in `f_argos_bit`
+    :return: a numpy array of 65536 floats, indexed by the raw word
+    """
+    words = numpy.arange(2 ** 16, dtype='int64')
+
+    # Apply the sign on the integer value, so a negative zero is decoded to 0 as in `f_argos_bit`
+    value = words & 0x1FFF
+    value[(words & 0x8000) != 0] *= -1
+    table = value.astype('float')
+
+    # Scale the value by the decimal bits
+    scale = (words >> 13) & 0b11
+    table[scale == 1] = table[scale == 1] / 10
+    table[scale == 2] = table[scale == 2] / 100
+    table[scale == 3] = table[scale == 3] / 1000
+
+    return table
+
+
+ARGOS_LOOKUP_TABLE = get_argos_lookup_table()
+
+
+def decode_argos_words(x):
+    """
+    Decode an array of binary variables to the standard output, same results as `f_argos_bit` for each value.
+    :param x: a numpy array of values to be decoded, can contain NaNs
+    :return: a float numpy array with the same shape as x
+    """
+    x = numpy.asarray(x, dtype='float')
+
+    # Empty values are decoded to 0 by `f_argos_bit` as well
+    out = numpy.zeros(x.shape)
+
+    # Look up the valid 16-bit words in the table
+    words = (x >= 0) & (x < 2 ** 16) & (numpy.floor(x) == x)
+    out[words] = ARGOS_LOOKUP_TABLE[x[words].astype('int64')]
+
+    # Corrupted values (decimals, negative or larger than 16 bits) are rare, decode them one by one
+    corrupted = ~words & ~numpy.isnan(x)
+    out[corrupted] = [f_argos_bit(value) for value in x[corrupted]]
+
+    return out
+
+
 def write_csv(df, file):
     """
     Write a pandas dataframe to the csv file
@@ -191,28 +538,31 @@ def write_csv(df, file):
     df.to_csv(file)
 
 
-def get_search_strings_line_numbers(input_file, strings_to_search):
+def read_argos_fields(input_file, nrows=None, strings_to_skip=()):
     """
-        ASSUMPTION: Returned list of line numbers that are 0-indexed!!!!!!
-        :param input_file: path to the input file (raw ARGOS satellite data)
-        :param strings_to_search: list of search strings, if a row has one of these search strings then it will be
-            excluded in the Argos processing
-        :returns Searches for the strings_to_search in input file and
-            returns 0-indexed list of line numbers containing those strings
+    Read the Argos raw file line by line and yield the fixed-width fields of ARGOS_COLUMNS of each line.
+    Fields are stripped, empty fields are None and the four data columns are converted to integers.
+    :param input_file: path to the input file (raw ARGOS satellite data)
+    :param nrows: maximum number of lines to be returned, None returns all lines
+    :param strings_to_skip: list of search strings, if a line has one of these search strings then it will be
+        excluded in the Argos processing
+    :return: generator of lists with six fields for each line that is not blank or skipped
     """
 
-    line_number = -1
-    line_number_list = []
+    rows = 0
 
     with open(input_file, 'r') as r:
 
         for line in r:
 
-            line_number += 1
+            if nrows is not None and rows >= nrows:
+                break
 
-            for item in strings_to_search:
+            if not line.strip() or any(item in line for item in strings_to_skip):
+                continue
 
-                if item in line:
-                    line_number_list.append(line_number)
+            # The last column ends one character before the end of line, same as the (65, -1) column width
+            station, timestamp, *values = [line[start:end].strip() or None for start, end in ARGOS_COLUMNS]
 
-    return line_number_list
+            rows += 1
+            yield [station, timestamp] + [None if value is None else int(value) for value in values]
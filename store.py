@@ -0,0 +1,163 @@
+#
+# Persistent store of decoded ARGOS transmissions (SQLite database).
+#
+# A transmission is stored once per station and 16 decoded values, even if it was received several times or read
+# from several input files. Input files already added are recorded by the SHA-256 digest of their content so they
+# are not read again, and the cleaner only processes the transmissions added since the last cleaned transmission
+# (high-water mark) plus an overlap of older transmissions needed to pair tables and detect pressure jumps.
+
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy
+
+from process_argos import ARGOS_COLUMNS_NAMES, ARGOS_KEY_COLUMNS, get_satellite_time, widen_argos_array
+
+import logging
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+# Size of the chunks used to hash files
+CHUNK_SIZE = 65536
+
+# Columns of the transmissions table, same order as ARGOS_COLUMNS_NAMES
+COLUMNS = [name.lower() for name in ARGOS_COLUMNS_NAMES]
+
+# Columns identifying a transmission
+KEY_COLUMNS = [name.lower() for name in ARGOS_KEY_COLUMNS]
+
+# Order of the transmissions, same as the sort of `decode_argos` (empty values last)
+ORDER_COLUMNS = ['year', 'month', 'day', 'station', 'hours', 'minutes', 'seconds']
+
+
+def get_file_digest(file):
+    """
+    :param file: path to a file
+    :return: SHA-256 hexadecimal digest of the file content
+    """
+    sha256 = hashlib.sha256()
+
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+class TransmissionStore(object):
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # The connection is shared by the threads of the daemon stages, statements are serialized by self._lock
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._pending_rowid = None
+        self._create_tables()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _create_tables(self):
+        columns = ', '.join(f'{column} REAL' for column in COLUMNS)
+        with self.connection:
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS transmissions ({columns}, satellite_time REAL)')
+            self.connection.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS transmissions_key '
+                                    f'ON transmissions ({", ".join(KEY_COLUMNS)})')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS transmissions_satellite_time '
+                                    'ON transmissions (satellite_time)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS files (digest TEXT PRIMARY KEY)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value INTEGER)')
+
+    # Returns True if the input file with this content digest was already added
+    def has_file(self, digest):
+        with self._lock:
+            return self.connection.execute('SELECT 1 FROM files WHERE digest = ?', (digest,)).fetchone() is not None
+
+    # Records the digests of input files whose transmissions were added
+    def add_files(self, digests):
+        with self._lock:
+            with self.connection:
+                self.connection.executemany('INSERT OR IGNORE INTO files (digest) VALUES (?)',
+                                            [(digest,) for digest in digests])
+
+    # Adds decoded transmissions (float numpy array with the columns of ARGOS_COLUMNS_NAMES, compact or float64),
+    # transmissions already in the store are ignored, returns the number of new transmissions
+    def add(self, data):
+        data = widen_argos_array(data)
+        rows = numpy.column_stack((data, get_satellite_time(data))).astype(object)
+        rows[numpy.isnan(rows.astype(float))] = None
+
+        placeholders = ', '.join('?' * (len(COLUMNS) + 1))
+        with self._lock:
+            with self.connection:
+                before = self.connection.total_changes
+                self.connection.executemany(f'INSERT OR IGNORE INTO transmissions ({", ".join(COLUMNS)}, '
+                                            f'satellite_time) VALUES ({placeholders})', rows.tolist())
+                return self.connection.total_changes - before
+
+    # Returns transmissions added since the last call of set_cleaned() and the transmissions received up to
+    # overlap_days before the earliest of them, sorted as `decode_argos` sorts them
+    def get_pending(self, overlap_days):
+        chunks = list(self.iter_pending(overlap_days))
+
+        if not chunks:
+            return numpy.empty((0, len(COLUMNS)))
+
+        return numpy.concatenate(chunks)
+
+    # Yields the transmissions of get_pending() in chunks of at most chunk_rows rows, None yields a single chunk
+    def iter_pending(self, overlap_days, chunk_rows=None):
+        with self._lock:
+            cleaned_rowid = self._get_state('cleaned_rowid')
+            self._pending_rowid = self.connection.execute('SELECT MAX(rowid) FROM transmissions').fetchone()[0]
+
+            start_time = self.connection.execute('SELECT MIN(satellite_time) FROM transmissions WHERE rowid > ?',
+                                                 (cleaned_rowid,)).fetchone()[0]
+            if start_time is None:
+                start_time = numpy.inf
+            else:
+                start_time -= overlap_days * 86400
+
+            order = ', '.join(f'{column} IS NULL, {column}' for column in ORDER_COLUMNS)
+            cursor = self.connection.execute(f'SELECT {", ".join(COLUMNS)} FROM transmissions '
+                                             f'WHERE (rowid > ? AND rowid <= ?) OR satellite_time >= ? '
+                                             f'ORDER BY {order}, rowid',
+                                             (cleaned_rowid, self._pending_rowid or 0, start_time))
+
+        while True:
+            with self._lock:
+                rows = cursor.fetchall() if chunk_rows is None else cursor.fetchmany(chunk_rows)
+
+            if not rows:
+                break
+
+            yield numpy.array(rows, dtype='float').reshape(len(rows), len(COLUMNS))
+
+            if chunk_rows is None:
+                break
+
+    # Moves the high-water mark to the last transmission returned by get_pending()
+    def set_cleaned(self):
+        with self._lock:
+            if self._pending_rowid is not None:
+                self._set_state('cleaned_rowid', self._pending_rowid)
+
+    def _get_state(self, name):
+        row = self.connection.execute('SELECT value FROM state WHERE name = ?', (name,)).fetchone()
+        return 0 if row is None else row[0]
+
+    def _set_state(self, name, value):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO state (name, value) VALUES (?, ?)', (name, value))
@@ -0,0 +1,260 @@
+#
+# Purpose: Generate synthetic ARGOS raw files in the fixed-width format read by `parse_argos`, for benchmarks and tests.
+#
+# Each station transmits the two part table (16 words each) transmissions_per_day times a day. Transmissions are
+# received one or more times by the satellites (duplicates with other reception times), and the files contain
+# 'ARGOS READY' lines, invalid day lines and corrupt records (truncated or extra lines, words that are not 16-bit,
+# fractional julian days and unreadable timestamps) like the files of the FTP server.
+# Files generated with the same arguments and seed are identical.
+#
+# Example commands (make sure virtual environment is activated):
+#
+#   python synthetic_argos.py input/synthetic.raw --days 30
+#   python synthetic_argos.py input/synthetic_10y.raw --days 3650 --stations 107282,135797 --seed 2
+#
+
+import sys
+import argparse
+import configparser
+from datetime import date, timedelta
+
+import numpy
+
+from process_argos import ARGOS_SKIP_STRINGS
+
+import logging
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+# Decimal scale bits of a word, value is multiplied by the scale before encoding
+ARGOS_WORD_SCALES = {1: 0, 10: 1, 100: 2, 1000: 3}
+
+# Words 5 to 16 of the first table part (words 1 to 4 are 101, year, julian day and hours * 100) and the 16 words of
+# the second table part: (mean, daily amplitude, noise, scale), values follow a daily cycle with noise
+# Columns of the words in the cleaned station array are in `ArgosCleaner.get_station_array`
+TABLE_1_WORDS = [
+    (300, 300, 50, 1),  # swin
+    (200, 200, 40, 1),  # swout
+    (50, 100, 20, 1),  # swnet
+    (-25, 8, 1, 100),  # tc1
+    (-25, 8, 1, 100),  # tc2
+    (-25, 8, 1, 10),  # hmp1
+    (-25, 8, 1, 10),  # hmp2
+    (70, 15, 5, 10),  # rh1
+    (70, 15, 5, 10),  # rh2
+    (8, 3, 2, 100),  # ws1
+    (8, 3, 2, 100),  # ws2
+    (0, 0, 0, 1),
+]
+TABLE_2_WORDS = [
+    (1, 0, 0.5, 100),  # ws1std
+    (180, 0, 100, 10),  # wd1
+    (180, 0, 100, 10),  # wd2
+    (700, 2, 0.3, 10),  # pres
+    (1.5, 0, 0.02, 100),  # sh1
+    (1.5, 0, 0.02, 100),  # sh2
+    (400, 400, 50, 1),  # s_winmax
+    (250, 250, 40, 1),  # s_woutmax
+    (-22, 8, 1, 100),  # tc1max
+    (-22, 8, 1, 100),  # tc2max
+    (-28, 8, 1, 100),  # tc1min
+    (-28, 8, 1, 100),  # tc2min
+    (12, 4, 2, 100),  # ws1max
+    (12, 4, 2, 100),  # ws2max
+    (13, 0.5, 0.1, 100),  # volts
+    (-25, 2, 0.5, 100),  # tref
+]
+
+# Kinds of corrupt records, one is chosen at random for each corrupt transmission
+CORRUPT_KINDS = ['truncated', 'extra_line', 'invalid_word', 'fractional_day', 'invalid_timestamp']
+
+# Number of lines and words per line of a table part
+TABLE_LINES = 4
+LINE_WORDS = 4
+
+
+def get_parser():
+    parser = argparse.ArgumentParser("SyntheticArgos")
+    parser.add_argument('file', help='Path of the ARGOS raw file written')
+    parser.add_argument('--stations', help='Comma separated station IDs, default active stations of '
+                                           'config/stations.ini')
+    parser.add_argument('--startDate', default='2022-01-01', help='First day (YYYY-MM-DD), default 2022-01-01')
+    parser.add_argument('--days', type=int, default=1, help='Number of days, default 1')
+    parser.add_argument('--transmissionsPerDay', type=int, default=8,
+                        help='Transmissions per station and day, a divisor of 24, default 8')
+    parser.add_argument('--duplicateRate', type=float, default=0.3,
+                        help='Fraction of transmissions received more than once, default 0.3')
+    parser.add_argument('--readyRate', type=float, default=0.01,
+                        help="Fraction of transmissions followed by an 'ARGOS READY' line, default 0.01")
+    parser.add_argument('--corruptRate', type=float, default=0.01,
+                        help='Fraction of corrupt transmissions, default 0.01')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator, default 0')
+    return parser
+
+
+def encode_argos_word(value, scale=1):
+    """
+    Encode a value to a 16-bit ARGOS word, inverse of `f_argos_bit`.
+    Bit 1 is the sign, bits 2 and 3 the decimal scale and bits 4 to 16 the value multiplied by the scale.
+    :param value: a number, its absolute value multiplied by scale is rounded and clipped to 8191
+    :param scale: 1, 10, 100 or 1000
+    :return: an integer between 0 and 65535
+    """
+    magnitude = min(int(round(abs(value) * scale)), 0x1FFF)
+    sign = 1 if value < 0 and magnitude != 0 else 0
+
+    return (sign << 15) | (ARGOS_WORD_SCALES[scale] << 13) | magnitude
+
+
+def format_argos_table(timestamp, words):
+    """
+    :param timestamp: reception timestamp field, for example '2022-01-01 00:37:18  2'
+    :param words: list of 16 integers, words that are None are left empty
+    :return: list of the 4 lines of a table part in the fixed-width format of ARGOS_COLUMNS
+    """
+    lines = []
+
+    for i in range(TABLE_LINES):
+        head = f'      {timestamp:<22}' if i == 0 else ' ' * 28
+        line_words = ['' if word is None else str(word) for word in words[i * LINE_WORDS:(i + 1) * LINE_WORDS]]
+        lines.append(f'{head}{line_words[0]:>11}{line_words[1]:>13}{line_words[2]:>13}{line_words[3]:>13} ')
+
+    return lines
+
+
+def generate_argos_lines(stations, start_date='2022-01-01', days=1, transmissions_per_day=8, duplicate_rate=0.3,
+                         ready_rate=0.01, corrupt_rate=0.01, seed=0, corrupt_kinds=CORRUPT_KINDS):
+    """
+    Generate the lines of a synthetic ARGOS raw file, day by day, station by station.
+    :param stations: list of station IDs
+    :param start_date: first day, 'YYYY-MM-DD'
+    :param days: number of days
+    :param transmissions_per_day: transmissions per station and day, a divisor of 24
+    :param duplicate_rate: fraction of transmissions received two or three times
+    :param ready_rate: fraction of transmissions followed by an 'ARGOS READY' line
+    :param corrupt_rate: fraction of corrupt transmissions
+    :param seed: seed of the random generator
+    :param corrupt_kinds: kinds of corrupt transmissions among CORRUPT_KINDS
+    :return: generator of lines without line ends
+    """
+    if transmissions_per_day < 1 or 24 % transmissions_per_day != 0:
+        raise ValueError(f'transmissions_per_day must be a divisor of 24: {transmissions_per_day}')
+
+    random = numpy.random.default_rng(seed)
+    first_day = date.fromisoformat(start_date)
+    hours_step = 24 // transmissions_per_day
+
+    table_1_params, table_2_params = numpy.array(TABLE_1_WORDS), numpy.array(TABLE_2_WORDS)
+
+    for day_index in range(days):
+        day = first_day + timedelta(days=day_index)
+        julian_day = day.timetuple().tm_yday
+
+        for station in stations:
+            for hour in range(0, 24, hours_step):
+
+                # Values follow a daily cycle peaking at noon, with noise
+                cycle = numpy.cos((hour - 12) / 24 * 2 * numpy.pi)
+                values_1 = table_1_params[:, 0] + table_1_params[:, 1] * cycle + \
+                    table_1_params[:, 2] * random.standard_normal(len(table_1_params))
+                values_2 = table_2_params[:, 0] + table_2_params[:, 1] * cycle + \
+                    table_2_params[:, 2] * random.standard_normal(len(table_2_params))
+
+                table_1 = [encode_argos_word(101), encode_argos_word(day.year), encode_argos_word(julian_day),
+                           encode_argos_word(hour * 100)] + \
+                    [encode_argos_word(value, int(scale)) for value, scale in zip(values_1, table_1_params[:, 3])]
+                # Wind directions stay between 0 and 360 degrees, they identify the second table part
+                values_2[1:3] = numpy.mod(values_2[1:3], 360)
+                table_2 = [encode_argos_word(value, int(scale)) for value, scale in zip(values_2, table_2_params[:, 3])]
+
+                corrupt_kind = random.choice(corrupt_kinds) if random.random() < corrupt_rate else None
+                if corrupt_kind == 'invalid_word':
+                    table = table_1 if random.random() < 0.5 else table_2
+                    table[random.integers(4, 16)] = int(random.choice([-1, 70000, 131071]))
+                elif corrupt_kind == 'fractional_day':
+                    table_1[2] = encode_argos_word(julian_day + 0.5, 10)
+
+                receptions = 1
+                if random.random() < duplicate_rate:
+                    receptions = int(random.integers(2, 4))
+
+                for reception in range(receptions):
+                    yield f'04440 {station} 32 31 A 2'
+
+                    for table in (table_1, table_2):
+                        minutes, seconds = random.integers(0, 60, 2)
+                        timestamp = f'{day.isoformat()} {hour:02d}:{minutes:02d}:{seconds:02d}  ' \
+                                    f'{random.integers(1, 4)}'
+                        if corrupt_kind == 'invalid_timestamp' and table is table_1:
+                            timestamp = f'{day.isoformat()} xx:{minutes:02d}:{seconds:02d}  1'
+
+                        lines = format_argos_table(timestamp, table)
+                        if corrupt_kind == 'truncated' and table is table_2:
+                            lines = lines[:int(random.integers(1, TABLE_LINES))]
+                        elif corrupt_kind == 'extra_line' and table is table_2:
+                            lines.append(lines[-1])
+
+                        yield from lines
+
+                    if random.random() < ready_rate:
+                        yield ARGOS_SKIP_STRINGS[1]
+
+            if random.random() < ready_rate:
+                yield ARGOS_SKIP_STRINGS[0]
+
+
+def write_argos_file(file, stations, start_date='2022-01-01', days=1, transmissions_per_day=8, duplicate_rate=0.3,
+                     ready_rate=0.01, corrupt_rate=0.01, seed=0, corrupt_kinds=CORRUPT_KINDS):
+    """
+    Write a synthetic ARGOS raw file with the lines of `generate_argos_lines`.
+    :param file: path of the file
+    :return: number of lines written
+    """
+    lines_num = 0
+
+    with open(file, 'w') as f:
+        for line in generate_argos_lines(stations, start_date, days, transmissions_per_day, duplicate_rate,
+                                         ready_rate, corrupt_rate, seed, corrupt_kinds):
+            f.write(line + '\n')
+            lines_num += 1
+
+    return lines_num
+
+
+def get_active_stations(config_path='config/stations.ini'):
+    """
+    :param config_path: path of the stations config
+    :return: list of the IDs of the active stations
+    """
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    return [int(section) for section in config.sections() if config.get(section, 'active') == 'True']
+
+
+def main(args=None):
+    """
+    Main entry point for generating a synthetic ARGOS raw file.
+    """
+
+    # Access arguments passed in command line
+    parser = get_parser()
+    args = parser.parse_args(args)
+
+    if args.stations:
+        stations = [int(station) for station in args.stations.split(',')]
+    else:
+        stations = get_active_stations()
+
+    lines_num = write_argos_file(args.file, stations, args.startDate, args.days, args.transmissionsPerDay,
+                                 args.duplicateRate, args.readyRate, args.corruptRate, args.seed)
+    logger.info(f' Wrote {lines_num} lines for {len(stations)} stations and {args.days} days to {args.file}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,7 @@
+#
+# The modules of the project are flat modules in the parent directory of the tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
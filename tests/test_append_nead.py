@@ -0,0 +1,105 @@
+#
+# Tests of the NEAD files updated by ArgosCleaner.append_nead with the state kept between calls
+
+import numpy as np
+import pytest
+
+import cleaner
+from cleaner import ArgosCleaner
+
+
+# NEAD header of the test files
+NEAD_HEADER = '[METADATA]\nnodata = -999\n[FIELDS]\ndisplay_description = timestamp_iso,value'
+
+
+def get_records(hours):
+    """
+    :param hours: list of hours since 2022-01-01
+    :return: numpy datetime64 array of the timestamps and 2d float numpy array with the hour as single value
+    """
+    timestamps = np.datetime64('2022-01-01T00:00:00') + np.array(hours).astype('timedelta64[h]')
+    return timestamps, np.array(hours, dtype='float').reshape(-1, 1)
+
+
+def append(output_dir, hours, state):
+    timestamps, data = get_records(hours)
+    return ArgosCleaner.append_nead(timestamps, data, output_dir, 1, NEAD_HEADER, '-999', 999, state=state)
+
+
+def read_hours(filename):
+    header, rows = ArgosCleaner.read_nead_file(filename)
+    assert header == ArgosCleaner.format_nead_header(NEAD_HEADER)
+    return [int(float(line.split(',')[1])) for timestamp, line in rows]
+
+
+@pytest.fixture(params=[cleaner.NEAD_TAIL_BYTES, 100], ids=['tail', 'short_tail'])
+def tail_bytes(request, monkeypatch):
+    monkeypatch.setattr(cleaner, 'NEAD_TAIL_BYTES', request.param)
+    return request.param
+
+
+def test_append_and_merge(tmp_path, tail_bytes):
+    state = {}
+
+    append(tmp_path, [0, 1, 2], state)
+    append(tmp_path, [2, 3, 4], state)
+    filename = append(tmp_path, [5, 6], state)
+    assert read_hours(filename) == [0, 1, 2, 3, 4, 5, 6]
+    assert state['last_timestamp'] == '2022-01-01 06:00:00+00:00'
+
+    # Late records are merged in timestamp order, records already in the file are not written again
+    append(tmp_path, [1, 7, -1], state)
+    assert read_hours(filename) == [-1, 0, 1, 2, 3, 4, 5, 6, 7]
+
+    # A new state reads the tail of the file, same result
+    state = {}
+    append(tmp_path, [0, 8], state)
+    assert read_hours(filename) == [-1, 0, 1, 2, 3, 4, 5, 6, 7, 8]
+
+
+def test_appends_do_not_read_the_file(tmp_path, monkeypatch):
+    state = {}
+    filename = append(tmp_path, list(range(10)), state)
+
+    def read_nead_file(filename):
+        raise AssertionError('The whole NEAD file is read')
+
+    monkeypatch.setattr(ArgosCleaner, 'read_nead_file', staticmethod(read_nead_file))
+    append(tmp_path, [9, 10, 11], state)
+    append(tmp_path, [12], state)
+
+    monkeypatch.undo()
+    assert read_hours(filename) == list(range(13))
+
+
+def test_file_modified_by_another_writer(tmp_path):
+    state = {}
+    filename = append(tmp_path, [0, 1], state)
+
+    # Another writer appends a record, the state of the file is read again
+    append(tmp_path, [2], {})
+    append(tmp_path, [2, 3], state)
+    assert read_hours(filename) == [0, 1, 2, 3]
+
+
+def test_changed_header_starts_a_new_file(tmp_path):
+    state = {}
+    filename = append(tmp_path, [0, 1], state)
+    filename.write_text(ArgosCleaner.format_nead_header(NEAD_HEADER + '\nunits = time,m'))
+
+    append(tmp_path, [1, 2], state)
+    assert read_hours(filename) == [1, 2]
+    assert len(list(tmp_path.glob('1_NEAD_*.csv'))) == 1
+
+
+def test_recent_timestamps_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(cleaner, 'NEAD_RECENT_ROWS', 5)
+    state = {}
+
+    for hour in range(20):
+        filename = append(tmp_path, [hour], state)
+    assert len(state['timestamps']) <= 10
+
+    # Records older than the recent timestamps are checked against the whole file
+    append(tmp_path, [0, 20], state)
+    assert read_hours(filename) == list(range(21))
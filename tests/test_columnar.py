@@ -0,0 +1,63 @@
+#
+# Tests of the columnar files appended in part files and merged by columnar.compact_columnar
+
+import numpy as np
+
+from columnar import write_columnar, compact_columnar, read_columnar, get_part_paths
+
+# Column names and metadata of the test files
+NAMES = ['value']
+METADATA = {'nead_header': 'header'}
+
+
+def append(path, hours, metadata=METADATA):
+    timestamps = np.datetime64('2022-01-01T00:00:00') + np.array(hours).astype('timedelta64[h]')
+    return write_columnar(path, timestamps, np.array(hours, dtype='float').reshape(-1, 1), NAMES, metadata,
+                          append=True)
+
+
+def read_hours(path):
+    timestamps, columns, metadata = read_columnar(path)
+    assert (timestamps == np.datetime64('2022-01-01T00:00:00') + columns['value'].astype('timedelta64[h]')).all()
+    return columns['value'].astype(int).tolist()
+
+
+def test_appends_are_merged_once(tmp_path):
+    path = tmp_path / '1_NEAD.npz'
+
+    append(path, [0, 1, 2])
+    append(path, [2, 3])
+    append(path, [5, -1])
+    assert not path.exists()
+    assert len(get_part_paths(path)) == 3
+
+    # Records are merged in timestamp order, records of timestamps already written are not merged again
+    compact_columnar(path)
+    assert read_hours(path) == [-1, 0, 1, 2, 3, 5]
+    assert get_part_paths(path) == []
+
+    append(path, [4, 5, 6])
+    compact_columnar(path)
+    assert read_hours(path) == [-1, 0, 1, 2, 3, 4, 5, 6]
+
+
+def test_changed_metadata_starts_a_new_file(tmp_path):
+    path = tmp_path / '1_NEAD.npz'
+
+    append(path, [0, 1])
+    append(path, [2], {'nead_header': 'other header'})
+    compact_columnar(path)
+
+    assert read_hours(path) == [2]
+    assert read_columnar(path)[2] == {'nead_header': 'other header'}
+    renamed_paths = [file for file in tmp_path.glob('1_NEAD_*.npz')]
+    assert len(renamed_paths) == 1 and read_hours(renamed_paths[0]) == [0, 1]
+
+
+def test_replace_without_append(tmp_path):
+    path = tmp_path / '1_NEAD.npz'
+
+    timestamps = np.array(['2022-01-01T00:00:00', '2022-01-01T01:00:00'], dtype='datetime64[s]')
+    assert write_columnar(path, timestamps, np.array([[0.0], [999]]), NAMES, METADATA) == path
+    timestamps, columns, metadata = read_columnar(path)
+    assert np.isnan(columns['value'][1]) and metadata == METADATA
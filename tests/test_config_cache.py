@@ -0,0 +1,70 @@
+#
+# Tests of the cache of the files parsed by the processing (config_cache)
+
+import os
+
+from config_cache import FileCache, parse_config
+
+
+def write_file(path, text, modification_time):
+    path.write_text(text)
+    os.utime(path, (modification_time, modification_time))
+
+
+def test_parsed_again_when_changed(tmp_path):
+    cache = FileCache()
+    path = tmp_path / 'file.txt'
+    calls = []
+
+    def parse(parse_path):
+        calls.append(parse_path)
+        return {'text': parse_path.read_text()}
+
+    write_file(path, 'a', 1600000000)
+    value = cache.get(path, parse)
+    assert cache.get(path, parse) is value
+    assert len(calls) == 1
+
+    # Same size, other modification time
+    write_file(path, 'b', 1600000001)
+    assert cache.get(path, parse) == {'text': 'b'}
+    assert len(calls) == 2
+
+    path.unlink()
+    assert cache.get(path, parse) is None
+
+
+def test_parse_function_using_the_cache(tmp_path):
+    cache = FileCache()
+    config_path, other_path = tmp_path / 'config.ini', tmp_path / 'other.ini'
+    write_file(config_path, 'config', 1600000000)
+    write_file(other_path, 'other', 1600000000)
+
+    # Objects created from a file can read other files from the same cache, for example a cleaner and its config
+    def parse_with_other(path):
+        return path.read_text(), cache.get(other_path, lambda other: other.read_text())
+
+    assert cache.get(config_path, parse_with_other) == ('config', 'other')
+
+
+def test_configs_are_not_shared(tmp_path):
+    path = tmp_path / 'stations.ini'
+    write_file(path, '[DEFAULT]\nnead_mode = snapshot\n', 1600000000)
+
+    # Callers modify their config, for example parity.py
+    config = parse_config(path)
+    config.set('DEFAULT', 'nead_mode', 'append')
+    assert parse_config(path).get('DEFAULT', 'nead_mode') == 'snapshot'
+
+
+def test_cleaner_uses_parsed_config(monkeypatch):
+    import cleaner
+    from main import read_config, get_cleaner
+
+    config = read_config('config/stations.ini')
+    calls = []
+    monkeypatch.setattr(cleaner, 'parse_config', lambda path: calls.append(path))
+
+    # The config parsed by read_config is given to the cleaner, the file is parsed once
+    assert get_cleaner(config).stations_config is config
+    assert calls == []
@@ -0,0 +1,63 @@
+#
+# Exhaustive comparison of the lookup table decoder `decode_argos_words` with the original bit-loop decoder
+
+import numpy
+
+from process_argos import decode_argos_words
+
+
+def original_f_argos_bit(x):
+    """
+    Original decoder of a single ARGOS word (bit loop), frozen so the lookup table is always compared with it.
+    :param x: a value to be decoded
+    :return: a single real value
+    """
+    if x is None:
+        return None
+
+    out = 0
+    ins = [0] * 16
+
+    for k in range(1, 17):
+        if x >= 2 ** (16 - k):
+            x = x - 2 ** (16 - k)
+            ins[k - 1] = 1
+            if k >= 4:
+                out = out + 2 ** (16 - k)
+
+    if ins[0] == 1:
+        out = out * -1
+    if ins[1] == 0 and ins[2] == 1:
+        out = out / 10
+    if ins[1] == 1 and ins[2] == 0:
+        out = out / 100
+    if ins[1] == 1 and ins[2] == 1:
+        out = out / 1000
+
+    return out
+
+
+def assert_same_decoding(words):
+    # Empty values (NaN) are compared with the powers of 2 like any value and decode to 0
+    with numpy.errstate(invalid='ignore'):
+        expected = numpy.vectorize(original_f_argos_bit, otypes=['float'])(words)
+    decoded = decode_argos_words(words)
+
+    assert decoded.shape == expected.shape
+    assert numpy.array_equal(decoded, expected)
+    # Negative zeros would be written as '-0.0' in the NEAD files
+    assert numpy.array_equal(numpy.signbit(decoded), numpy.signbit(expected))
+
+
+def test_every_16_bit_word():
+    assert_same_decoding(numpy.arange(2 ** 16, dtype='float'))
+
+
+def test_empty_and_corrupt_values():
+    assert_same_decoding(numpy.array([numpy.nan, -1, -65535, 65536, 70000, 131071, 1.5, 32768.5, 1e6]))
+
+
+def test_2d_array():
+    words = numpy.arange(2 ** 16, dtype='float').reshape(-1, 16)
+    words[::7, 3] = numpy.nan
+    assert_same_decoding(words)
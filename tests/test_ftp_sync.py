@@ -0,0 +1,177 @@
+#
+# Tests of the FTP synchronization against a local FTP server (pyftpdlib), with and without MLSD support
+
+import os
+import threading
+from ftplib import error_perm, error_temp
+
+import pytest
+
+import ftp_sync
+from ftp_sync import FtpConnectionPool, list_ftp_files, get_latest_ftp_files, sync_ftp_files, read_manifest, \
+    run_with_retries, BLOBS_DIR
+
+pyftpdlib = pytest.importorskip('pyftpdlib')
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import ThreadedFTPServer
+
+
+# Modification times of the files on the FTP server, seconds since the epoch
+FILE_TIMES = {'argos_1.raw': 1641800000, 'argos_2.raw': 1641900000}
+
+
+class RecordingHandler(FTPHandler):
+
+    # Names of the files downloaded from the server
+    retrieved = []
+
+    # Number of downloads answered with a temporary error before the file is sent
+    failing_downloads = 0
+
+    # Records each download, answers with a temporary error while failing_downloads is positive
+    def ftp_RETR(self, file):
+        type(self).retrieved.append(os.path.basename(file))
+        if type(self).failing_downloads > 0:
+            type(self).failing_downloads -= 1
+            self.respond('451 Requested action aborted: local error in processing.')
+            return
+        return super().ftp_RETR(file)
+
+
+class NoMlsdHandler(RecordingHandler):
+
+    # Servers without MLSD reply with a permanent error
+    def ftp_MLSD(self, path):
+        self.respond('502 Command not implemented.')
+
+
+@pytest.fixture(params=[RecordingHandler, NoMlsdHandler], ids=['mlsd', 'nlst'])
+def ftp_server(request, tmp_path):
+    ftp_root = tmp_path / 'ftp'
+    ftp_root.mkdir()
+    for name, modification_time in FILE_TIMES.items():
+        write_ftp_file(ftp_root / name, f'{name}\n', modification_time)
+
+    authorizer = DummyAuthorizer()
+    authorizer.add_user('user', 'password', str(ftp_root), perm='elr')
+    handler = type(request.param.__name__, (request.param,), {'authorizer': authorizer, 'retrieved': [],
+                                                              'failing_downloads': 0})
+
+    server = ThreadedFTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'timeout': 0.1, 'handle_exit': False},
+                              daemon=True)
+    thread.start()
+
+    pool = FtpConnectionPool('127.0.0.1', 'user', 'password', port=server.address[1], size=2, timeout=10)
+
+    yield ftp_root, handler, pool
+
+    pool.close()
+    server.close_all()
+    thread.join(timeout=5)
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(ftp_sync.time, 'sleep', lambda seconds: None)
+
+
+def write_ftp_file(path, content, modification_time):
+    path.write_text(content)
+    os.utime(path, (modification_time, modification_time))
+
+
+def sync(pool, cache_dir):
+    """
+    :return: dictionary of the contents of the synchronized files, with the file names as keys
+    """
+    ftp_files = get_latest_ftp_files(list_ftp_files(pool, retries=1), len(FILE_TIMES))
+    return {ftp_files[index]['name']: path.read_text()
+            for index, path in sync_ftp_files(pool, ftp_files, cache_dir, retries=1)}
+
+
+def test_list_ftp_files(ftp_server):
+    ftp_root, handler, pool = ftp_server
+
+    ftp_list = list_ftp_files(pool, retries=1)
+
+    assert sorted(ftp_list, key=lambda ftp_file: ftp_file['name']) == [
+        {'name': 'argos_1.raw', 'size': 12, 'timestamp': '20220110073320'},
+        {'name': 'argos_2.raw', 'size': 12, 'timestamp': '20220111112000'}]
+    assert [ftp_file['name'] for ftp_file in get_latest_ftp_files(ftp_list, 1)] == ['argos_2.raw']
+
+
+def test_sync_downloads_new_and_changed_files(ftp_server, tmp_path):
+    ftp_root, handler, pool = ftp_server
+    cache_dir = tmp_path / 'cache'
+
+    # First synchronization downloads all files
+    assert sync(pool, cache_dir) == {'argos_1.raw': 'argos_1.raw\n', 'argos_2.raw': 'argos_2.raw\n'}
+    assert sorted(handler.retrieved) == ['argos_1.raw', 'argos_2.raw']
+    old_digest = read_manifest(cache_dir)['argos_1.raw']['digest']
+
+    # Only the changed file is downloaded again, the cached file of its old content is removed
+    handler.retrieved.clear()
+    write_ftp_file(ftp_root / 'argos_1.raw', 'argos_1.raw changed\n', FILE_TIMES['argos_1.raw'] + 3600)
+    assert sync(pool, cache_dir) == {'argos_1.raw': 'argos_1.raw changed\n', 'argos_2.raw': 'argos_2.raw\n'}
+    assert handler.retrieved == ['argos_1.raw']
+    assert not (cache_dir / BLOBS_DIR / old_digest).exists()
+
+    # Unchanged files are not downloaded
+    handler.retrieved.clear()
+    assert sync(pool, cache_dir) == {'argos_1.raw': 'argos_1.raw changed\n', 'argos_2.raw': 'argos_2.raw\n'}
+    assert handler.retrieved == []
+
+    manifest = read_manifest(cache_dir)
+    assert sorted(manifest) == ['argos_1.raw', 'argos_2.raw']
+    assert sorted(path.name for path in (cache_dir / BLOBS_DIR).iterdir()) == \
+        sorted(entry['digest'] for entry in manifest.values())
+
+
+def test_sync_prunes_removed_files(ftp_server, tmp_path):
+    ftp_root, handler, pool = ftp_server
+    cache_dir = tmp_path / 'cache'
+
+    sync(pool, cache_dir)
+    removed_digest = read_manifest(cache_dir)['argos_1.raw']['digest']
+
+    (ftp_root / 'argos_1.raw').unlink()
+    assert sync(pool, cache_dir) == {'argos_2.raw': 'argos_2.raw\n'}
+    assert sorted(read_manifest(cache_dir)) == ['argos_2.raw']
+    assert not (cache_dir / BLOBS_DIR / removed_digest).exists()
+
+
+def test_sync_retries_temporary_errors(ftp_server, tmp_path):
+    ftp_root, handler, pool = ftp_server
+    cache_dir = tmp_path / 'cache'
+
+    handler.failing_downloads = 1
+    assert sync(pool, cache_dir) == {'argos_1.raw': 'argos_1.raw\n', 'argos_2.raw': 'argos_2.raw\n'}
+    assert len(handler.retrieved) == 3
+    assert not list((cache_dir / BLOBS_DIR).glob('*.part'))
+
+
+def test_sync_gives_up_after_retries(ftp_server, tmp_path):
+    ftp_root, handler, pool = ftp_server
+    cache_dir = tmp_path / 'cache'
+
+    handler.failing_downloads = 4
+    with pytest.raises(error_temp):
+        sync(pool, cache_dir)
+
+    # The manifest is only written once all files are available, the next synchronization downloads all files
+    assert read_manifest(cache_dir) == {}
+
+
+def test_permanent_errors_are_not_retried(ftp_server):
+    ftp_root, handler, pool = ftp_server
+    calls = []
+
+    def missing_file(ftp_server):
+        calls.append(ftp_server)
+        return ftp_server.size('missing.raw')
+
+    with pytest.raises(error_perm):
+        run_with_retries(pool, missing_file, retries=3)
+    assert len(calls) == 1
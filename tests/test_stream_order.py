@@ -0,0 +1,26 @@
+#
+# Tests of the order of the input files processed by main.stream_data
+
+from main import order_oldest_first
+
+
+def test_files_ordered_oldest_first():
+    assert list(order_oldest_first(iter([(2, 'c'), (0, 'a'), (3, 'd'), (1, 'b')]))) == \
+        [(3, 'd'), (2, 'c'), (1, 'b'), (0, 'a')]
+
+
+def test_files_yielded_once_all_available():
+    yielded = []
+
+    def data():
+        for item in [(1, 'b'), (0, 'a'), (2, 'c')]:
+            yielded.append(item[0])
+            yield item
+
+    ordered = order_oldest_first(data())
+    assert next(ordered) == (2, 'c') and yielded == [1, 0, 2]
+    assert list(ordered) == [(1, 'b'), (0, 'a')]
+
+
+def test_missing_indexes():
+    assert list(order_oldest_first(iter([(3, 'd'), (1, 'b')]))) == [(3, 'd'), (1, 'b')]